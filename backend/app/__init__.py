@@ -1,5 +1,12 @@
-from .main import app
 from .models import Rule, User  # 暴露 models 里的类
 from .database import get_db    # 暴露数据库依赖
 
 __all__ = ["app", "Rule", "User", "get_db"]
+
+
+def __getattr__(name):
+    # FastAPI 应用按需加载：Celery worker、脚本导入 app.* 时无需构建整个 API
+    if name == "app":
+        from .main import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,79 @@
+import threading
+from typing import Optional
+
+from sqlmodel import Session, select
+
+from app import crud
+from app.models import Rule, RuleRead
+from app.utils.extraction import MultiPatternExtractor
+
+
+class RuleCatalog:
+    """进程内规则目录缓存
+
+    每个 worker 持有一份已序列化的规则快照，并记录其对应的目录版本号。
+    规则写操作在同一事务中递增 CatalogVersion，因此任何 worker 只需一次
+    主键查询即可判断快照是否过期，过期时整体重新加载。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version: Optional[int] = None
+        self.rules: dict[int, dict] = {}
+        self._extractor: Optional[tuple[int, MultiPatternExtractor]] = None
+
+    @property
+    def etag(self) -> str:
+        return f'W/"rules-{self.version}"'
+
+    def refresh(self, db: Session) -> "RuleCatalog":
+        """确保快照与数据库中的目录版本一致"""
+        current = crud.get_catalog_version(db)
+        if current != self.version:
+            with self._lock:
+                if current != self.version:
+                    # 先读版本再读规则：即使期间有新写入，下次请求也会因版本不同而重新加载
+                    rules = db.exec(select(Rule).order_by(Rule.id)).all()
+                    self.rules = {
+                        rule.id: RuleRead.model_validate(rule).model_dump(mode="json")
+                        for rule in rules
+                    }
+                    self.version = current
+        return self
+
+    def extractor(self) -> MultiPatternExtractor:
+        """以当前快照全部规则构建的提取器，快照版本变化后重建"""
+        cached = self._extractor
+        if cached is None or cached[0] != self.version:
+            cached = (self.version, MultiPatternExtractor.from_rules(self.rules.values()))
+            self._extractor = cached
+        return cached[1]
+
+    def get(self, rule_id: int) -> Optional[dict]:
+        return self.rules.get(rule_id)
+
+    def filter(self, region: Optional[str] = None, data_type: Optional[str] = None, limit: int = 100) -> list[dict]:
+        needle = data_type.lower() if data_type else None
+        results = []
+        for rule in self.rules.values():
+            if len(results) >= limit:
+                break
+            if region and rule["region"] != region:
+                continue
+            if needle and needle not in rule["data_type"].lower():
+                continue
+            results.append(rule)
+        return results
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """按弱比较规则判断 If-None-Match 是否命中当前 ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == current for tag in if_none_match.split(","))
+
+
+rule_catalog = RuleCatalog()
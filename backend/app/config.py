@@ -7,24 +7,76 @@ import os
 class Settings(BaseSettings):
     # 数据库配置（从云端环境变量获取）
     DATABASE_URL: str
+    DB_POOL_SIZE: int = 10  # 每个进程常驻连接数（同步、异步引擎各一个池）
+    DB_MAX_OVERFLOW: int = 20  # 高峰期允许额外创建的连接数
+    DB_POOL_TIMEOUT: int = 30  # 等待空闲连接的秒数
+    DB_POOL_RECYCLE: int = 1800  # 连接最长存活秒数，避免被云数据库/代理断开
+    DB_POOL_PRE_PING: bool = True  # 取出连接前先探活
 
     # 安全配置
     SECRET_KEY: str = "default-secret-key-for-testing"  # 测试环境默认值
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_CACHE_TTL_SECONDS: int = 60  # 已认证用户缓存时长，0 表示禁用
+    AUTH_CACHE_MAX_SIZE: int = 10000
+    PASSWORD_HASH_WORKERS: int = 4  # 登录时 bcrypt 校验的线程池大小
 
     # 任务队列配置
     CELERY_BROKER_URL: str = "redis://redis:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://redis:6379/0"
+    VALIDATION_INLINE_MAX_ROWS: int = 10000  # 少于该行数的文件在请求内直接校验
+    VALIDATION_BULK_MIN_ROWS: int = 200000  # 达到该行数的任务进入 bulk 通道
+    VALIDATION_BULK_MIN_BYTES: int = 20 * 1024 ** 2  # 达到该大小的上传不在 API 中解析，直接暂存并进入 bulk 通道
+    VALIDATION_MAX_QUEUE_DEPTH: int = 200  # interactive 队列积压上限，超过后返回 429
+    VALIDATION_MAX_BULK_QUEUE_DEPTH: int = 20  # bulk 队列积压上限
+    VALIDATION_MAX_INFLIGHT_PER_USER: int = 3  # 每个用户（匿名按 IP）同时排队或执行的任务数
+    VALIDATION_INFLIGHT_TTL_SECONDS: int = 3600  # 在途计数的过期时间，防止 worker 异常退出后计数泄漏
+    VALIDATION_RETRY_AFTER_SECONDS: int = 30  # 429 响应的 Retry-After
+    VALIDATION_STREAM_CHUNK_ROWS: int = 50000  # fail_fast / sample 模式逐块读取文件的行数
+    VALIDATION_SAMPLE_SIZE: int = 1000  # sample 模式的默认样本量
+    VALIDATION_SAMPLE_MAX_SIZE: int = 100000  # 单次请求允许的最大样本量
+    VALIDATION_SAMPLE_MAX_STRATA: int = 1000  # 分层抽样允许的最多层数
+    VALIDATION_BATCH_MAX_FILES: int = 500  # 批量校验单次最多的文件数（含压缩包成员）
+    VALIDATION_BATCH_MAX_BYTES: int = 10 * 1024 ** 3  # 批量校验解压后的总字节数上限
 
     # 存储配置（云端使用临时目录）
     UPLOAD_DIR: Path = Path("/tmp/bioregex-uploads")  # 云端临时目录
     MAX_UPLOAD_SIZE: int = 10485760  # 10MB
 
+    # 性能分析配置
+    PROFILE_DIR: Path = Path("/tmp/bioregex-profiles")  # 分析结果目录（多 worker 共享）
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5  # 管理员按需分析的采样间隔
+    PROFILE_SAMPLE_RATE: float = 0.0  # 全局采样比例，0 表示关闭
+    PROFILE_GLOBAL_INTERVAL_MS: float = 20  # 全局采样模式使用更粗的间隔以降低开销
+    PROFILE_KEEP_SLOWEST: int = 20  # 全局采样保留最慢的请求数
+
+    # 规则提交的离线性能分析（在 bulk worker 中执行）
+    SUBMISSION_PROFILING: bool = True  # 创建提交后自动投递分析任务
+    SUBMISSION_PROFILE_WORST_CASE_MS: float = 100  # 对抗输入的单次耗时超过该值即停止加长
+    SUBMISSION_PROFILE_TIMEOUT_SECONDS: float = 60  # 分析子进程的总时限
+    # 提交的重叠报告（同样在 bulk worker 中执行）
+    OVERLAP_MAX_CANDIDATES: int = 1000  # 参与样本互测的候选规则上限，超出时报告标记 truncated
+    OVERLAP_TIMEOUT_SECONDS: float = 30  # 样本互测子进程的总时限，超时报告标记 timed_out
+    OVERLAP_REFRESH: bool = True  # 审核列表发现规则目录已变更时投递重新计算
+
+    # 知识图谱导出目录（scripts/export_kg.py 的输出）
+    KG_DIR: Path = Path(__file__).resolve().parents[1] / "bioregex_kg"
+    KG_RELOAD_CHECK_SECONDS: float = 5  # 检查是否有新导出的最小间隔
+
     # 外部API配置
     FDA_GUIDANCE_URL: str | None = None
     EMA_GUIDANCE_URL: str | None = None
 
+    # 爬虫配置
+    CRAWL_CONCURRENCY: int = 8  # 同时进行的请求数（也是连接池大小）
+    CRAWL_PER_HOST_RATE: float = 2.0  # 每个站点每秒最多请求数，0 表示不限
+    CRAWL_MAX_RETRIES: int = 3  # 连接错误、429 和 5xx 的重试次数
+    CRAWL_BACKOFF_SECONDS: float = 1.0  # 指数退避的初始等待
+    CRAWL_TIMEOUT_SECONDS: float = 30
+    CRAWL_BATCH_SIZE: int = 200  # 每批处理的文档数，每批一次查重、一次提交
+    EXTRACTION_MAX_MATCH_LENGTH: int = 1024  # 分块扫描的重叠窗口上限，无上界模式的局限见 MultiPatternExtractor
+    EXTRACTION_MAX_OFFSETS: int = 100  # 每个模式最多记录的命中位置数，计数不受限
+
     model_config = ConfigDict(
         env_file=".env",
         case_sensitive=True,
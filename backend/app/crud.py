@@ -1,32 +1,27 @@
-from sqlmodel import Session, select
-from app.models import User, UserCreate, Rule, RuleCreate, RuleSubmission, RuleSubmissionCreate, RuleSubmissionUpdate
-from app.utils.security import get_password_hash
-from collections import defaultdict
-
-class RuleUnionFind:
-    def __init__(self):
-        self.parent = {}
-        self.rank = {}
-
-    def find(self, x):
-        if x not in self.parent:
-            self.parent[x] = x
-            self.rank[x] = 0
-        elif self.parent[x] != x:
-            self.parent[x] = self.find(self.parent[x])
-        return self.parent[x]
-
-    def union(self, x, y):
-        rootX = self.find(x)
-        rootY = self.find(y)
-        if rootX != rootY:
-            if self.rank[rootX] > self.rank[rootY]:
-                self.parent[rootY] = rootX
-            elif self.rank[rootX] < self.rank[rootY]:
-                self.parent[rootX] = rootY
-            else:
-                self.parent[rootY] = rootX
-                self.rank[rootX] += 1
+from sqlmodel import Session, select, update, delete, insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import or_, tuple_
+from sqlalchemy.orm import selectinload
+from typing import Iterable, Optional
+from datetime import datetime
+import base64
+import binascii
+from app.models import (
+    User, UserCreate, Rule, RuleBase, RuleCreate, RuleUpdate, RuleSubmission, RuleSubmissionCreate,
+    RuleSubmissionUpdate, SubmissionReviewItem, CatalogVersion, RuleGroupMember, RuleFingerprint, CrawlState,
+    check_engine_pattern
+)
+from app.utils.security import get_password_hash, invalidate_principal
+from app.config import settings
+from app.utils.patterns import (
+    pattern_fingerprint, pattern_width, edge_char_groups, literal_prefix, find_overlaps_isolated
+)
+
+# 重叠检查每批读取的候选规则数（按 id 翻页，直到取完候选或达到 OVERLAP_MAX_CANDIDATES）
+OVERLAP_CANDIDATE_BATCH = 500
+
+# IN (...) 查询单次携带的参数个数上限
+IN_CLAUSE_CHUNK_SIZE = 500
 
 def get_user_by_email(db: Session, email: str) -> User:
     return db.exec(select(User).where(User.email == email)).first()
@@ -42,30 +37,179 @@ def create_user(db: Session, user: UserCreate) -> User:
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_principal(db_user.email)
     return db_user
 
+def get_catalog_version(db: Session) -> int:
+    row = db.get(CatalogVersion, 1)
+    return row.version if row else 0
+
+def bump_catalog_version(db: Session) -> None:
+    """在当前事务中递增规则目录版本号，随规则变更一起提交"""
+    result = db.exec(
+        update(CatalogVersion)
+        .where(CatalogVersion.id == 1)
+        .values(version=CatalogVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.add(CatalogVersion(id=1, version=1))
+
+def rule_group_keys(rule: RuleBase) -> dict:
+    return {
+        "data_type": rule.data_type.strip().lower(),
+        "pattern": pattern_fingerprint(rule.pattern),
+        "region": rule.region.strip().upper(),
+    }
+
+def _index_rows(rule_id: int, rule: RuleBase):
+    keys = rule_group_keys(rule)
+    groups = [{"rule_id": rule_id, "kind": kind, "key": key} for kind, key in keys.items()]
+    min_length, max_length = pattern_width(rule.pattern)
+    first_chars, last_chars = edge_char_groups(rule.pattern)
+    fingerprint = {
+        "rule_id": rule_id,
+        "fingerprint": keys["pattern"],
+        "min_length": min_length,
+        "max_length": max_length,
+        "prefix": literal_prefix(rule.pattern),
+        "first_chars": first_chars,
+        "last_chars": last_chars
+    }
+    return groups, fingerprint
+
+def index_rule(db: Session, rule: Rule) -> None:
+    """重写单条规则的分组索引与模式指纹（不提交，随规则变更一起提交）"""
+    unindex_rule(db, rule.id)
+    groups, fingerprint = _index_rows(rule.id, rule)
+    db.add_all([RuleGroupMember(**row) for row in groups])
+    db.add(RuleFingerprint(**fingerprint))
+
+def unindex_rule(db: Session, rule_id: int) -> None:
+    db.exec(delete(RuleGroupMember).where(RuleGroupMember.rule_id == rule_id))
+    db.exec(delete(RuleFingerprint).where(RuleFingerprint.rule_id == rule_id))
+
+def rebuild_rule_indexes(db: Session) -> int:
+    """全量重建分组索引与模式指纹，用于初始化或修复历史数据"""
+    db.exec(delete(RuleGroupMember))
+    db.exec(delete(RuleFingerprint))
+    rules = db.exec(select(Rule)).all()
+    for rule in rules:
+        index_rule(db, rule)
+    db.commit()
+    return len(rules)
+
 def create_rule(db: Session, rule: RuleCreate) -> Rule:
-    db_rule = Rule(**rule.dict())
+    db_rule = Rule(**rule.model_dump())
     db.add(db_rule)
+    db.flush()
+    index_rule(db, db_rule)
+    bump_catalog_version(db)
     db.commit()
     db.refresh(db_rule)
     return db_rule
 
+def insert_rules(db: Session, rules: Iterable[RuleCreate], batch_size: int = 1000) -> list[int]:
+    """在当前事务中批量插入规则及其索引（不提交）
+
+    使用 executemany 风格的 INSERT ... RETURNING，避免逐条 add/commit/refresh 的往返。
+    """
+    rules = list(rules)
+    rule_ids = []
+    for start in range(0, len(rules), batch_size):
+        batch = rules[start:start + batch_size]
+        ids = db.scalars(
+            insert(Rule).returning(Rule.id, sort_by_parameter_order=True),
+            [rule.model_dump() for rule in batch]
+        ).all()
+        groups, fingerprints = [], []
+        for rule_id, rule in zip(ids, batch):
+            group_rows, fingerprint_row = _index_rows(rule_id, rule)
+            groups.extend(group_rows)
+            fingerprints.append(fingerprint_row)
+        db.execute(insert(RuleGroupMember), groups)
+        db.execute(insert(RuleFingerprint), fingerprints)
+        rule_ids.extend(ids)
+    if rule_ids:
+        bump_catalog_version(db)
+    return rule_ids
+
+def update_rule(db: Session, rule_id: int, rule: RuleUpdate):
+    db_rule = db.get(Rule, rule_id)
+    if not db_rule:
+        return None
+    changes = rule.model_dump(exclude_unset=True)
+    check_engine_pattern(changes.get("pattern", db_rule.pattern), changes.get("engine", db_rule.engine))
+    for key, value in changes.items():
+        setattr(db_rule, key, value)
+    db.add(db_rule)
+    index_rule(db, db_rule)
+    bump_catalog_version(db)
+    db.commit()
+    db.refresh(db_rule)
+    return db_rule
+
+def delete_rule(db: Session, rule_id: int) -> bool:
+    db_rule = db.get(Rule, rule_id)
+    if not db_rule:
+        return False
+    unindex_rule(db, rule_id)
+    db.delete(db_rule)
+    bump_catalog_version(db)
+    db.commit()
+    return True
+
 def create_submission(db: Session, submission: RuleSubmissionCreate) -> RuleSubmission:
-    db_submission = RuleSubmission(**submission.dict())
+    db_submission = RuleSubmission(**submission.model_dump(exclude_none=True))
     db.add(db_submission)
     db.commit()
     db.refresh(db_submission)
     return db_submission
 
-def get_submissions(db: Session, status: str = None, limit: int = 100):
-    query = select(RuleSubmission)
+# 列表查询一次性预加载提交人/审核人，避免逐行懒加载（N+1）
+SUBMISSION_LOAD_OPTIONS = (
+    selectinload(RuleSubmission.submitter),
+    selectinload(RuleSubmission.reviewer),
+)
+
+def encode_submission_cursor(submission: RuleSubmission) -> str:
+    raw = f"{submission.submitted_at.isoformat()}|{submission.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_submission_cursor(cursor: str) -> tuple[datetime, int]:
+    """解析分页游标，格式错误时抛出 ValueError"""
+    try:
+        submitted_at, submission_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(submitted_at), int(submission_id)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+async def create_submission_async(db: AsyncSession, submission: RuleSubmissionCreate) -> RuleSubmission:
+    db_submission = RuleSubmission(**submission.model_dump(exclude_none=True))
+    db.add(db_submission)
+    await db.commit()
+    # 异步会话不能懒加载关系，重新查询并预加载提交人/审核人
+    result = await db.exec(
+        select(RuleSubmission)
+        .where(RuleSubmission.id == db_submission.id)
+        .options(*SUBMISSION_LOAD_OPTIONS)
+    )
+    return result.one()
+
+def get_submissions(db: Session, status: str = None, limit: int = 100, cursor: Optional[str] = None):
+    """按 (submitted_at, id) 倒序的键集分页查询提交列表"""
+    query = select(RuleSubmission).options(*SUBMISSION_LOAD_OPTIONS)
     if status:
         query = query.where(RuleSubmission.status == status)
+    if cursor:
+        submitted_at, submission_id = decode_submission_cursor(cursor)
+        query = query.where(
+            tuple_(RuleSubmission.submitted_at, RuleSubmission.id) < tuple_(submitted_at, submission_id)
+        )
+    query = query.order_by(RuleSubmission.submitted_at.desc(), RuleSubmission.id.desc())
     return db.exec(query.limit(limit)).all()
 
 def get_submission(db: Session, submission_id: int):
-    return db.get(RuleSubmission, submission_id)
+    return db.get(RuleSubmission, submission_id, options=SUBMISSION_LOAD_OPTIONS)
 
 def update_submission(db: Session, submission_id: int, data: dict):
     submission = db.get(RuleSubmission, submission_id)
@@ -78,14 +222,186 @@ def update_submission(db: Session, submission_id: int, data: dict):
     db.refresh(submission)
     return submission
 
-def get_related_rules(db: Session, rule_id: int):
-    uf = RuleUnionFind()
-    rules = db.exec(select(Rule)).all()
-    type_groups = defaultdict(list)
-    for rule in rules:
-        type_groups[rule.data_type].append(rule.id)
-    for _, ids in type_groups.items():
-        for i in range(1, len(ids)):
-            uf.union(ids[0], ids[i])
-    root = uf.find(rule_id)
-    return [r for r in rules if uf.find(r.id) == root]
+def review_submissions(db: Session, items: list[SubmissionReviewItem], reviewer_id: int) -> list[dict]:
+    """在一个事务中批量批准/拒绝提交
+
+    批准的提交统一批量生成规则并回填 rule_id，全部处理完后只提交一次。
+    提交行以 SELECT ... FOR UPDATE 按 id 顺序加锁，并发审核同一提交时后到的事务等待前者提交，
+    读到最新状态后按 already_reviewed 处理，不会重复生成规则。
+    返回与 items 顺序一致的逐项结果。
+    """
+    ids = {item.id for item in items}
+    submissions = {
+        s.id: s for s in db.exec(
+            select(RuleSubmission)
+            .where(RuleSubmission.id.in_(ids))
+            .order_by(RuleSubmission.id)
+            .with_for_update()
+            # 会话中已加载的旧对象也用加锁后读到的行覆盖
+            .execution_options(populate_existing=True)
+        ).all()
+    }
+    reviewed_at = datetime.utcnow()
+    outcomes, to_approve, seen = [], [], set()
+    for item in items:
+        submission = submissions.get(item.id)
+        if submission is None:
+            outcomes.append({"id": item.id, "status": "not_found"})
+            continue
+        if item.id in seen:
+            outcomes.append({"id": item.id, "status": "already_reviewed", "detail": "duplicate item"})
+            continue
+        if submission.status != "pending":
+            outcomes.append({"id": item.id, "status": "already_reviewed", "detail": submission.status})
+            continue
+        seen.add(item.id)
+        if item.action == "approve":
+            try:
+                rule = RuleCreate(
+                    pattern=submission.pattern,
+                    description=submission.description,
+                    data_type=submission.data_type,
+                    region=submission.region,
+                    reference_url=submission.reference_path
+                )
+            except ValueError as e:
+                outcomes.append({"id": item.id, "status": "invalid", "detail": str(e)})
+                continue
+            outcome = {"id": item.id, "status": "approved"}
+            to_approve.append((submission, rule, item.notes, outcome))
+        else:
+            submission.status = "rejected"
+            submission.review_notes = item.notes
+            outcome = {"id": item.id, "status": "rejected"}
+        submission.reviewed_by_id = reviewer_id
+        submission.reviewed_at = reviewed_at
+        outcomes.append(outcome)
+
+    rule_ids = insert_rules(db, [rule for _, rule, _, _ in to_approve])
+    for (submission, _, notes, outcome), rule_id in zip(to_approve, rule_ids):
+        submission.status = "approved"
+        submission.rule_id = rule_id
+        submission.review_notes = notes
+        outcome["rule_id"] = rule_id
+    db.commit()
+    return outcomes
+
+def get_related_rules(db: Session, rule_id: int, kind: str = "data_type"):
+    """按分组维度查询关联规则，只读取同组的索引行，开销与组大小成正比"""
+    key = db.exec(
+        select(RuleGroupMember.key)
+        .where(RuleGroupMember.rule_id == rule_id, RuleGroupMember.kind == kind)
+    ).first()
+    if key is None:
+        # 尚未建立索引的历史规则，按需补建
+        rule = db.get(Rule, rule_id)
+        if not rule:
+            return []
+        index_rule(db, rule)
+        db.commit()
+        key = rule_group_keys(rule)[kind]
+    return db.exec(
+        select(Rule)
+        .join(RuleGroupMember, RuleGroupMember.rule_id == Rule.id)
+        .where(RuleGroupMember.kind == kind, RuleGroupMember.key == key)
+        .order_by(Rule.id)
+    ).all()
+
+def overlap_candidates(db: Session, pattern: str, fingerprint: str) -> tuple[list, bool]:
+    """可能与模式重叠的候选规则 [(rule_id, pattern)] 与是否因达到上限而截断
+
+    长度区间必须相交；字面量前缀必须互为前缀；首、末字符的分类必须相交。
+    无上界的宽泛模式（如 ``.*``）无法筛选，最多取 OVERLAP_MAX_CANDIDATES 条。
+    """
+    min_length, max_length = pattern_width(pattern)
+    prefix = literal_prefix(pattern)
+    first_chars, last_chars = edge_char_groups(pattern)
+    limit = settings.OVERLAP_MAX_CANDIDATES
+    candidates, last_id = [], 0
+    while len(candidates) < limit:
+        batch = db.exec(
+            select(Rule.id, Rule.pattern)
+            .join(RuleFingerprint, RuleFingerprint.rule_id == Rule.id)
+            .where(
+                Rule.id > last_id,
+                RuleFingerprint.fingerprint != fingerprint,
+                RuleFingerprint.min_length <= max_length,
+                RuleFingerprint.max_length >= min_length,
+                or_(
+                    RuleFingerprint.prefix.in_([prefix[:i] for i in range(len(prefix) + 1)]),
+                    RuleFingerprint.prefix.startswith(prefix, autoescape=True)
+                ),
+                RuleFingerprint.first_chars.op("&")(first_chars) != 0,
+                RuleFingerprint.last_chars.op("&")(last_chars) != 0
+            )
+            .order_by(Rule.id)
+            .limit(min(OVERLAP_CANDIDATE_BATCH, limit - len(candidates) + 1))
+        ).all()
+        candidates.extend(tuple(row) for row in batch)
+        if len(batch) < OVERLAP_CANDIDATE_BATCH:
+            break
+        last_id = batch[-1][0]
+    return candidates[:limit], len(candidates) > limit
+
+def get_overlap_report(db: Session, pattern: str) -> dict:
+    """检查新模式与已有规则的重复与重叠关系
+
+    先用指纹索引找完全等价的规则，再用长度、前缀和首末字符索引筛出可能重叠的候选规则
+    （见 overlap_candidates），最后只对候选规则做样本互测。
+    样本互测会执行提交者的正则，在子进程中进行，超过 OVERLAP_TIMEOUT_SECONDS 即终止并标记 timed_out。
+    """
+    catalog_version = get_catalog_version(db)
+    fingerprint = pattern_fingerprint(pattern)
+    duplicate_of = db.exec(
+        select(RuleFingerprint.rule_id)
+        .where(RuleFingerprint.fingerprint == fingerprint)
+        .order_by(RuleFingerprint.rule_id)
+    ).all()
+    candidates, truncated = overlap_candidates(db, pattern, fingerprint)
+    overlaps = []
+    if candidates:
+        overlaps = find_overlaps_isolated(pattern, candidates, settings.OVERLAP_TIMEOUT_SECONDS)
+    return {
+        "duplicate_of": list(duplicate_of),
+        "overlaps": overlaps or [],
+        "catalog_version": catalog_version,
+        "truncated": truncated,
+        "timed_out": overlaps is None
+    }
+
+def overlap_report_stale(report: Optional[dict], catalog_version: int) -> bool:
+    """报告计算后规则目录是否已变更（尚未计算的报告不算过期）"""
+    return report is not None and report.get("catalog_version", -1) < catalog_version
+
+def store_overlap_report(db: Session, submission_id: int) -> Optional[dict]:
+    """计算提交的重叠报告并写回提交记录；报告仍与当前规则目录一致时直接返回；提交不存在时返回 None"""
+    submission = db.get(RuleSubmission, submission_id)
+    if submission is None:
+        return None
+    if submission.overlap_report is not None and not overlap_report_stale(submission.overlap_report, get_catalog_version(db)):
+        return submission.overlap_report
+    submission.overlap_report = get_overlap_report(db, submission.pattern)
+    db.add(submission)
+    db.commit()
+    return submission.overlap_report
+
+
+def _chunks(values: list, size: int = IN_CLAUSE_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def get_crawl_states(db: Session, urls: Iterable[str]) -> dict[str, CrawlState]:
+    """按 URL 批量读取爬虫状态，每 IN_CLAUSE_CHUNK_SIZE 个 URL 一次查询"""
+    states = {}
+    for chunk in _chunks(list(set(urls))):
+        for state in db.exec(select(CrawlState).where(CrawlState.url.in_(chunk))):
+            states[state.url] = state
+    return states
+
+def get_existing_rule_keys(db: Session, urls: Iterable[str]) -> set[tuple[str, str]]:
+    """一批来源文档已生成过的 (reference_url, pattern)，用于集合去重"""
+    keys = set()
+    for chunk in _chunks(list(set(urls))):
+        rows = db.exec(select(Rule.reference_url, Rule.pattern).where(Rule.reference_url.in_(chunk)))
+        keys.update((url, pattern) for url, pattern in rows)
+    return keys
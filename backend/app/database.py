@@ -1,6 +1,36 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from app.config import settings
-from typing import Generator
+from typing import AsyncGenerator, Generator, Optional
+
+IS_SQLITE = settings.DATABASE_URL.startswith("sqlite")
+
+
+def _pool_kwargs() -> dict:
+    """连接池参数；SQLite 使用驱动默认池，仅保留线程检查开关"""
+    if IS_SQLITE:
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def async_database_url(url: str) -> str:
+    """将同步连接串转换为对应的异步驱动（asyncpg / aiosqlite）"""
+    scheme, _, rest = url.partition("://")
+    driver = {
+        "postgresql": "postgresql+asyncpg",
+        "postgresql+psycopg2": "postgresql+asyncpg",
+        "postgres": "postgresql+asyncpg",
+        "sqlite": "sqlite+aiosqlite",
+    }.get(scheme, scheme)
+    return f"{driver}://{rest}"
+
 
 # 云端环境适配：自动处理不同数据库类型的连接参数
 engine = create_engine(
@@ -9,15 +39,30 @@ engine = create_engine(
     connect_args={
         # 仅SQLite需要此参数，云端通常使用PostgreSQL
         "check_same_thread": False
-    } if settings.DATABASE_URL.startswith("sqlite") else {}
+    } if IS_SQLITE else {},
+    **_pool_kwargs()
 )
 
+# 异步引擎按需创建，未使用异步路由的进程（如 Celery worker）无需加载 asyncpg
+_async_engine: Optional[AsyncEngine] = None
+
 
 def get_engine():
     """提供引擎访问接口，供测试和迁移使用"""
     return engine
 
 
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            async_database_url(settings.DATABASE_URL),
+            echo=False,
+            **_pool_kwargs()
+        )
+    return _async_engine
+
+
 def get_db() -> Generator[Session, None, None]:
     """数据库会话依赖，自动管理连接生命周期（修复命名错误）"""
     with Session(engine) as session:
@@ -27,7 +72,29 @@ def get_db() -> Generator[Session, None, None]:
             session.close()  # 确保会话正确关闭，释放资源
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """异步数据库会话依赖，供 async def 路由使用，避免阻塞事件循环"""
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
+
+def _pool_status(pool) -> dict:
+    stats = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
+
+def pool_stats() -> dict:
+    """同步与异步连接池的当前使用情况"""
+    stats = {"sync": _pool_status(engine.pool)}
+    if _async_engine is not None:
+        stats["async"] = _pool_status(_async_engine.sync_engine.pool)
+    return stats
+
+
 def create_db_and_tables():
     """创建数据库表结构（显式导入所有模型）"""
     import app.models  # 强制加载所有模型，确保表结构正确生成
-SQLModel.metadata.create_all(engine)
+    SQLModel.metadata.create_all(engine)
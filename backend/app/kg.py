@@ -0,0 +1,238 @@
+import csv
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.config import settings
+from app.utils.term_matcher import normalize_term
+
+logger = logging.getLogger(__name__)
+
+# 导出目录中决定图内容的文件；任一文件变化即视为有新导出
+KG_FILES = ("manifest.json", "nodes.csv", "edges.csv")
+
+
+def kg_signature(kg_dir: Path) -> tuple:
+    """导出目录的版本标识：各文件的 (修改时间, 大小)，文件缺失记为 None"""
+    signature = []
+    for name in KG_FILES:
+        try:
+            stat = (Path(kg_dir) / name).stat()
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def _csr(count: int, pairs: list[tuple[int, int, int]]) -> tuple[array, array, array]:
+    """按起点计数排序为 CSR：offsets[i]:offsets[i+1] 为节点 i 的邻居区间"""
+    offsets = array("l", [0]) * (count + 1)
+    for head, _, _ in pairs:
+        offsets[head + 1] += 1
+    for i in range(count):
+        offsets[i + 1] += offsets[i]
+    cursor = array("l", offsets)
+    targets = array("l", [0]) * len(pairs)
+    relations = array("H", [0]) * len(pairs)
+    for head, tail, relation in pairs:
+        position = cursor[head]
+        targets[position] = tail
+        relations[position] = relation
+        cursor[head] += 1
+    return offsets, targets, relations
+
+
+class KnowledgeGraph:
+    """只读的内存知识图谱
+
+    节点以整数编号，属性存放在按编号索引的列表中；出边与入边各存为一组 CSR 数组，
+    一跳邻居查询只需切片。术语前缀查询在按规范化术语排序的列表上二分定位。
+    仅出现在边中的节点（如来源节点 ``fda_drug_names``）同样编号，source 为空。
+    """
+
+    def __init__(self, nodes: list[dict], edges: list[dict], signature: tuple = ()):
+        self.signature = signature
+        self.loaded_at = time.time()
+        self.ids: list[str] = []
+        self.labels: list[str] = []
+        self.sources: list[Optional[str]] = []
+        self.regexes: list[Optional[str]] = []
+        self.index: dict[str, int] = {}
+        for node in nodes:
+            self._add(node["id"], node.get("label") or node["id"], node.get("source") or None, node.get("regex") or None)
+
+        self.relation_names: list[str] = []
+        relation_index: dict[str, int] = {}
+        pairs = []
+        for edge in edges:
+            head = self._node(edge["source"])
+            tail = self._node(edge["target"])
+            relation = relation_index.get(edge["relation"])
+            if relation is None:
+                relation = relation_index[edge["relation"]] = len(self.relation_names)
+                self.relation_names.append(edge["relation"])
+            pairs.append((head, tail, relation))
+        self.edge_count = len(pairs)
+        count = len(self.ids)
+        self.out_offsets, self.out_targets, self.out_relations = _csr(count, pairs)
+        self.in_offsets, self.in_targets, self.in_relations = _csr(count, [(t, h, r) for h, t, r in pairs])
+
+        self.by_source: dict[str, array] = {}
+        for node_index, source in enumerate(self.sources):
+            if source is not None:
+                self.by_source.setdefault(source, array("l")).append(node_index)
+
+        keyed = sorted(
+            (normalize_term(label), node_index)
+            for node_index, (label, source) in enumerate(zip(self.labels, self.sources))
+            if source is not None
+        )
+        self._prefix_keys = [key for key, _ in keyed]
+        self._prefix_nodes = array("l", (node_index for _, node_index in keyed))
+
+    def _add(self, node_id: str, label: str, source: Optional[str], regex: Optional[str]) -> int:
+        node_index = self.index.get(node_id)
+        if node_index is not None:
+            return node_index
+        node_index = self.index[node_id] = len(self.ids)
+        self.ids.append(node_id)
+        self.labels.append(label)
+        self.sources.append(source)
+        self.regexes.append(regex)
+        return node_index
+
+    def _node(self, node_id: str) -> int:
+        return self._add(node_id, node_id, None, None)
+
+    @classmethod
+    def load(cls, kg_dir: Path) -> "KnowledgeGraph":
+        """从 export_kg.py 导出的 nodes.csv / edges.csv 加载"""
+        kg_dir = Path(kg_dir)
+        signature = kg_signature(kg_dir)
+        with open(kg_dir / "nodes.csv", newline="", encoding="utf-8") as f:
+            nodes = list(csv.DictReader(f))
+        with open(kg_dir / "edges.csv", newline="", encoding="utf-8") as f:
+            edges = list(csv.DictReader(f))
+        return cls(nodes, edges, signature)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def node(self, node_index: int) -> dict:
+        return {
+            "id": self.ids[node_index],
+            "label": self.labels[node_index],
+            "source": self.sources[node_index],
+            "regex": self.regexes[node_index],
+        }
+
+    def get(self, node_id: str) -> Optional[dict]:
+        node_index = self.index.get(node_id)
+        return None if node_index is None else self.node(node_index)
+
+    def neighbors(self, node_id: str, direction: str = "out", relation: Optional[str] = None,
+                  offset: int = 0, limit: int = 100) -> Optional[tuple[int, list[dict]]]:
+        """返回 (邻居总数, 当前页邻居)；节点不存在时返回 None"""
+        node_index = self.index.get(node_id)
+        if node_index is None:
+            return None
+        if direction == "in":
+            offsets, targets, relations = self.in_offsets, self.in_targets, self.in_relations
+        else:
+            offsets, targets, relations = self.out_offsets, self.out_targets, self.out_relations
+        start, end = offsets[node_index], offsets[node_index + 1]
+        if relation is not None:
+            if relation not in self.relation_names:
+                return 0, []
+            wanted = self.relation_names.index(relation)
+            positions = [p for p in range(start, end) if relations[p] == wanted]
+        else:
+            positions = range(start, end)
+        page = positions[offset:offset + limit]
+        return len(positions), [
+            {**self.node(targets[p]), "relation": self.relation_names[relations[p]]} for p in page
+        ]
+
+    def source_counts(self) -> dict[str, int]:
+        return {source: len(members) for source, members in self.by_source.items()}
+
+    def source_terms(self, source: str, offset: int = 0, limit: int = 100) -> Optional[tuple[int, list[dict]]]:
+        members = self.by_source.get(source)
+        if members is None:
+            return None
+        return len(members), [self.node(node_index) for node_index in members[offset:offset + limit]]
+
+    def _prefix_matches(self, prefix: str) -> Iterator[int]:
+        keys = self._prefix_keys
+        position = bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix):
+            yield self._prefix_nodes[position]
+            position += 1
+
+    def search_prefix(self, prefix: str, source: Optional[str] = None, limit: int = 20) -> list[dict]:
+        """按术语前缀查找（大小写、空白不敏感），结果按规范化术语排序"""
+        prefix = normalize_term(prefix)
+        results = []
+        for node_index in self._prefix_matches(prefix):
+            if len(results) >= limit:
+                break
+            if source is None or self.sources[node_index] == source:
+                results.append(self.node(node_index))
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "nodes": len(self.ids),
+            "edges": self.edge_count,
+            "relations": list(self.relation_names),
+            "sources": self.source_counts(),
+            "loaded_at": self.loaded_at,
+        }
+
+
+class KnowledgeGraphStore:
+    """进程内知识图谱的持有者
+
+    首次访问时加载；之后每隔 KG_RELOAD_CHECK_SECONDS 检查一次导出目录，
+    发现新导出时在锁内构建新图，构建完成后整体替换引用。
+    替换前已取得旧图的请求继续使用旧图，读路径无需加锁。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._graph: Optional[KnowledgeGraph] = None
+        self._checked_at = 0.0
+
+    def get(self) -> KnowledgeGraph:
+        graph = self._graph
+        now = time.monotonic()
+        if graph is not None and now - self._checked_at < settings.KG_RELOAD_CHECK_SECONDS:
+            return graph
+        self._checked_at = now
+        if graph is not None and kg_signature(settings.KG_DIR) == graph.signature:
+            return graph
+        try:
+            return self.reload(force=False)
+        except Exception as e:
+            if graph is None:
+                raise
+            # 导出写到一半或文件损坏时继续使用旧图，下次检查再重试
+            logger.warning(f"Knowledge graph reload failed, keeping previous graph: {e}")
+            return graph
+
+    def reload(self, force: bool = True) -> KnowledgeGraph:
+        """加载导出目录；force=False 时若已是最新导出则直接返回。文件缺失时抛出 FileNotFoundError"""
+        with self._lock:
+            graph = self._graph
+            if force or graph is None or kg_signature(settings.KG_DIR) != graph.signature:
+                graph = KnowledgeGraph.load(settings.KG_DIR)
+                self._graph = graph
+            self._checked_at = time.monotonic()
+            return graph
+
+
+kg_store = KnowledgeGraphStore()
@@ -1,22 +1,20 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import rules, submissions, auth, validation, admin
-from app.database import engine, get_db, create_db_and_tables
-from sqlmodel import Session
-from contextlib import asynccontextmanager
+from app.routers import rules, submissions, auth, validation, admin, kg
+from app.database import get_db, pool_stats
+from sqlmodel import Session, text
 from app.config import settings
-
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Create database tables on startup
-    create_db_and_tables()
-    yield
+from app.utils.metrics import PrometheusMiddleware, render_metrics
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.compression import CompressionMiddleware
 
 app = FastAPI(
     title="BioRegex-Hub API",
     description="API for BioRegex-Hub: Standard Regex Knowledge Base for Biostatistics and Actuarial Science",
     version="0.1.0",
-    lifespan=lifespan
+    # 表结构由 scripts/init_db.py 在部署时创建（见 Dockerfile / make migrate），服务进程启动不再建表
+    default_response_class=ORJSONResponse  # orjson 序列化大列表比标准库 json 快数倍
 )
 
 # CORS
@@ -28,12 +26,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(PrometheusMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(rules.router, prefix="/rules", tags=["Rules"])
 app.include_router(submissions.router, prefix="/submissions", tags=["Submissions"])
 app.include_router(validation.router, prefix="/validate", tags=["Validation"])
 app.include_router(admin.router, prefix="/admin", tags=["Admin"])
+app.include_router(kg.router, prefix="/kg", tags=["Knowledge Graph"])
 
 @app.get("/")
 def read_root():
@@ -42,7 +45,12 @@ def read_root():
 @app.get("/health")
 def health_check(db: Session = Depends(get_db)):
     try:
-        db.execute("SELECT 1")
-        return {"status": "healthy", "database": "connected"}
+        db.execute(text("SELECT 1"))
+        return {"status": "healthy", "database": "connected", "pool": pool_stats()}
     except Exception as e:
-        return {"status": "unhealthy", "error": str(e)}
+        return {"status": "unhealthy", "error": str(e), "pool": pool_stats()}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -1,11 +1,29 @@
 from sqlmodel import SQLModel, Field, Relationship, text
-from typing import Optional, List
+from sqlalchemy import JSON, Column, Index
+from typing import Optional, List, Literal
 from datetime import datetime
 from pydantic import field_validator, model_validator, ConfigDict
 import re
 import bcrypt
 
 
+def check_engine(v):
+    from app.utils.regex_engine import ENGINES
+
+    if v is not None and v not in ENGINES:
+        raise ValueError(f"engine must be one of: {', '.join(ENGINES)}")
+    return v
+
+
+def check_engine_pattern(pattern, engine):
+    """engine=re2 要求模式能对任意输入与 re 等价地改写为 RE2，否则拒绝而不是运行时回退到 re"""
+    from app.utils.regex_engine import translate_to_re2
+
+    if engine == "re2" and pattern is not None and translate_to_re2(pattern) is None:
+        raise ValueError("pattern cannot run on RE2 with identical results (Unicode \\d/\\w/\\s/\\b, "
+                         "ignore-case or unsupported syntax); use engine auto or re, or add (?a)")
+
+
 class RuleBase(SQLModel):
     model_config = ConfigDict(extra='forbid')
     
@@ -13,8 +31,13 @@ class RuleBase(SQLModel):
     description: str = Field(min_length=1, description="规则描述")
     data_type: str = Field(index=True, min_length=1, description="数据类型")
     region: str = Field(index=True, min_length=1, description="适用区域（FDA, EMA, HIPAA等）")
-    reference_url: Optional[str] = Field(default=None, max_length=2000, description="参考链接")
+    reference_url: Optional[str] = Field(default=None, index=True, max_length=2000, description="参考链接")
+    engine: str = Field(default="auto", max_length=8, description="匹配引擎（auto / re / re2）")
+
 
+    @field_validator("engine")
+    def validate_engine(cls, v):
+        return check_engine(v)
 
     @field_validator("pattern")
     def validate_pattern(cls, v):
@@ -98,7 +121,14 @@ class Rule(RuleBase, table=True):
 
 
 class RuleSubmission(RuleSubmissionBase, table=True):
+    # 列表查询按状态过滤、按提交时间排序
+    __table_args__ = (Index("ix_rulesubmission_status_submitted_at", "status", "submitted_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    # 提交后由后台任务写入的性能分析结果（见 app.utils.rule_profile）
+    perf_profile: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    # 提交后由后台任务写入的查重/重叠报告（见 crud.get_overlap_report），审核列表直接读取
+    overlap_report: Optional[dict] = Field(default=None, sa_column=Column(JSON))
     
     submitter: "User" = Relationship(
         back_populates="submissions",
@@ -113,9 +143,59 @@ class RuleSubmission(RuleSubmissionBase, table=True):
         sa_relationship_kwargs={"foreign_keys": "[RuleSubmission.rule_id]"}
     )
 
+    # RuleSubmissionRead 对外使用 submitted_by / reviewed_by 字段名
+    @property
+    def submitted_by(self) -> "User":
+        return self.submitter
+
+    @property
+    def reviewed_by(self) -> Optional["User"]:
+        return self.reviewer
+
+
+class CatalogVersion(SQLModel, table=True):
+    """规则目录版本计数器（单行表），规则每次变更时递增，供所有 worker 判断缓存是否过期"""
+    id: int = Field(default=1, primary_key=True)
+    version: int = Field(default=0, description="规则目录版本号")
+
+
+class RuleGroupMember(SQLModel, table=True):
+    """规则关联分组索引：每条规则在每种分组维度下各占一行，按 (kind, key) 查同组规则"""
+    __table_args__ = (Index("ix_rulegroupmember_kind_key", "kind", "key"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    rule_id: int = Field(foreign_key="rule.id", index=True)
+    kind: str = Field(max_length=20, description="分组维度（data_type, pattern, region）")
+    key: str = Field(max_length=255, description="分组键（规范化后的数据类型/区域，或模式指纹）")
+
+
+class RuleFingerprint(SQLModel, table=True):
+    """规则模式指纹索引：规范化模式的指纹与可匹配长度范围，用于快速查重和重叠检测"""
+    rule_id: int = Field(foreign_key="rule.id", primary_key=True)
+    fingerprint: str = Field(index=True, max_length=40, description="规范化模式的 SHA-1 指纹")
+    min_length: int = Field(index=True, description="可匹配的最短长度")
+    max_length: int = Field(description="可匹配的最长长度（无上界时取 2^31-1）")
+    prefix: str = Field(default="", index=True, max_length=32, description="共同的字面量前缀")
+    first_chars: int = Field(default=63, description="首字符分类位图（见 patterns.edge_char_groups）")
+    last_chars: int = Field(default=63, description="末字符分类位图")
+
+
+class CrawlState(SQLModel, table=True):
+    """爬虫增量状态：每个已抓取文档一行，记录条件请求所需的校验值和内容指纹"""
+    url: str = Field(primary_key=True, max_length=2000)
+    source: str = Field(index=True, max_length=50, description="来源站点（FDA, EMA 等）")
+    etag: Optional[str] = Field(default=None, max_length=255)
+    last_modified: Optional[str] = Field(default=None, max_length=64, description="服务器返回的 Last-Modified 原文")
+    content_hash: Optional[str] = Field(default=None, max_length=64, description="文档内容的 SHA-256")
+    last_seen: datetime = Field(default_factory=datetime.utcnow, description="最近一次在列表中出现的时间")
+    last_changed: Optional[datetime] = Field(default=None, description="最近一次内容变化的时间")
+
 
 class RuleCreate(RuleBase):
-    pass
+    @model_validator(mode="after")
+    def validate_engine_pattern(self):
+        check_engine_pattern(self.pattern, self.engine)
+        return self
 
 
 class RuleRead(RuleBase):
@@ -130,6 +210,17 @@ class RuleUpdate(SQLModel):
     data_type: Optional[str] = None
     region: Optional[str] = None
     reference_url: Optional[str] = None
+    engine: Optional[str] = None
+
+    @field_validator("engine")
+    def validate_engine(cls, v):
+        return check_engine(v)
+
+    @model_validator(mode="after")
+    def validate_engine_pattern(self):
+        # 只改其中一项时由 crud.update_rule 结合库中的另一项再检查
+        check_engine_pattern(self.pattern, self.engine)
+        return self
 
 
 # app/models.py
@@ -172,6 +263,44 @@ class RuleSubmissionRead(RuleSubmissionBase):
     id: int
     submitted_by: UserRead
     reviewed_by: Optional[UserRead] = None
+    perf_profile: Optional[dict] = None
+
+
+class PatternOverlap(SQLModel):
+    rule_id: int
+    relation: str  # subsumes / subsumed_by / overlaps
+
+
+class OverlapReport(SQLModel):
+    duplicate_of: List[int] = []
+    overlaps: List[PatternOverlap] = []
+    catalog_version: int = 0  # 计算时的规则目录版本
+    truncated: bool = False  # 候选规则超过 OVERLAP_MAX_CANDIDATES，只比较了前一部分
+    timed_out: bool = False  # 样本互测超时，overlaps 不完整
+    stale: bool = False  # 规则目录已变更，已投递重新计算
+
+
+class RuleSubmissionReviewRead(RuleSubmissionRead):
+    overlap_report: Optional[OverlapReport] = None  # 后台任务尚未完成时为空
+
+
+class SubmissionReviewItem(SQLModel):
+    model_config = ConfigDict(extra='forbid')
+    id: int
+    action: Literal["approve", "reject"]
+    notes: Optional[str] = None
+
+
+class SubmissionBatchReview(SQLModel):
+    model_config = ConfigDict(extra='forbid')
+    items: List[SubmissionReviewItem] = Field(min_length=1, max_length=5000)
+
+
+class SubmissionReviewOutcome(SQLModel):
+    id: int
+    status: str  # approved / rejected / not_found / already_reviewed / invalid
+    rule_id: Optional[int] = None
+    detail: Optional[str] = None
 
 
 class Token(SQLModel):
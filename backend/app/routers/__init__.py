@@ -1,2 +1,2 @@
 # backend/app/routers/__init__.py
-from . import rules, submissions, auth, validation, admin  # 添加 auth 导入
+from . import rules, submissions, auth, validation, admin, kg  # 添加 auth 导入
@@ -1,36 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse
+from typing import Optional
 from sqlmodel import Session
 from app.database import get_db
-from app.models import RuleSubmission, Rule, User, RuleSubmissionRead, RuleCreate
-from datetime import datetime
+from app.models import (
+    User, RuleSubmissionRead, RuleSubmissionReviewRead, SubmissionReviewItem,
+    SubmissionBatchReview, SubmissionReviewOutcome
+)
 from app.utils.security import get_current_admin
 from app import crud
+from app.routers.submissions import enqueue_overlap_refresh, paginate_submissions, submission_to_dict
+from app.utils.profiling import profile_store
 
 router = APIRouter()
 
+# 单条审核结果对应的 HTTP 错误
+REVIEW_ERRORS = {
+    "not_found": (404, "Submission not found"),
+    "already_reviewed": (409, "Submission already reviewed"),
+    "invalid": (400, "Submission is not a valid rule"),
+}
+
+
+def review_one(db: Session, item: SubmissionReviewItem, reviewer: User):
+    outcome = crud.review_submissions(db, [item], reviewer.id)[0]
+    if outcome["status"] in REVIEW_ERRORS:
+        status_code, detail = REVIEW_ERRORS[outcome["status"]]
+        raise HTTPException(status_code=status_code, detail=outcome.get("detail") or detail)
+    return crud.get_submission(db, item.id)
+
+
 @router.post("/submissions/{submission_id}/approve", response_model=RuleSubmissionRead)
 def approve_submission(
     submission_id: int,
     current_user: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    submission = crud.get_submission(db, submission_id)
-    if not submission:
-        raise HTTPException(status_code=404, detail="Submission not found")
-    rule_data = RuleCreate(
-        pattern=submission.pattern,
-        description=submission.description,
-        data_type=submission.data_type,
-        region=submission.region,
-        reference_url=submission.reference_path
-    )
-    rule = crud.create_rule(db, rule_data)
-    submission = crud.update_submission(
-        db,
-        submission_id,
-        {"status": "approved", "reviewed_by_id": current_user.id, "reviewed_at": datetime.utcnow()}
-    )
-    return submission
+    return review_one(db, SubmissionReviewItem(id=submission_id, action="approve"), current_user)
 
 @router.post("/submissions/{submission_id}/reject", response_model=RuleSubmissionRead)
 def reject_submission(
@@ -39,24 +45,49 @@ def reject_submission(
     current_user: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    submission = crud.get_submission(db, submission_id)
-    if not submission:
-        raise HTTPException(status_code=404, detail="Submission not found")
-    submission = crud.update_submission(
-        db,
-        submission_id,
-        {
-            "status": "rejected",
-            "reviewed_by_id": current_user.id,
-            "reviewed_at": datetime.utcnow(),
-            "review_notes": reason
-        }
-    )
-    return submission
+    return review_one(db, SubmissionReviewItem(id=submission_id, action="reject", notes=reason), current_user)
+
+@router.post("/submissions/review", response_model=list[SubmissionReviewOutcome])
+def review_submissions(
+    review: SubmissionBatchReview,
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    return crud.review_submissions(db, review.items, current_user.id)
 
-@router.get("/submissions/pending", response_model=list[RuleSubmissionRead])
+@router.get("/submissions/pending", response_model=list[RuleSubmissionReviewRead])
 def get_pending_submissions(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_admin)
 ):
-    return crud.get_submissions(db, status="pending")
+    submissions = paginate_submissions(db, response, "pending", limit, cursor)
+    # 重叠报告在提交时由后台任务算好并存入提交记录，列表只读取，不在请求内执行提交者的正则；
+    # 之后规则目录有变更的报告标记 stale 并投递重新计算
+    catalog_version = crud.get_catalog_version(db)
+    stale = [s.id for s in submissions if crud.overlap_report_stale(s.overlap_report, catalog_version)]
+    enqueue_overlap_refresh(stale)
+    return [
+        {
+            **submission_to_dict(submission),
+            "overlap_report": submission.overlap_report and {
+                **submission.overlap_report, "stale": submission.id in stale
+            }
+        }
+        for submission in submissions
+    ]
+
+@router.get("/profiles")
+def list_profiles(current_user: User = Depends(get_current_admin)):
+    """已保存的请求分析结果，按耗时倒序"""
+    return profile_store.list()
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def get_profile(profile_id: str, current_user: User = Depends(get_current_admin)):
+    """下载折叠栈格式的分析结果，可直接交给 flamegraph.pl 或 speedscope"""
+    folded = profile_store.get(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(folded, headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'})
@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Literal, Optional
+from app.kg import KnowledgeGraph, kg_store
+from app.models import User
+from app.utils.security import get_current_admin
+
+router = APIRouter()
+
+
+def get_graph() -> KnowledgeGraph:
+    try:
+        return kg_store.get()
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="Knowledge graph export not found")
+
+
+@router.get("/stats")
+def graph_stats(graph: KnowledgeGraph = Depends(get_graph)):
+    return graph.stats()
+
+
+@router.get("/terms")
+def search_terms(
+    prefix: str = Query(..., min_length=1),
+    source: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=200),
+    graph: KnowledgeGraph = Depends(get_graph)
+):
+    return graph.search_prefix(prefix, source=source, limit=limit)
+
+
+@router.get("/sources")
+def list_sources(graph: KnowledgeGraph = Depends(get_graph)):
+    return graph.source_counts()
+
+
+@router.get("/sources/{source}/terms")
+def list_source_terms(
+    source: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    graph: KnowledgeGraph = Depends(get_graph)
+):
+    result = graph.source_terms(source, offset=offset, limit=limit)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Source not found")
+    total, terms = result
+    return {"source": source, "total": total, "terms": terms}
+
+
+@router.get("/nodes/{node_id:path}/neighbors")
+def get_neighbors(
+    node_id: str,
+    direction: Literal["out", "in"] = "out",
+    relation: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    graph: KnowledgeGraph = Depends(get_graph)
+):
+    result = graph.neighbors(node_id, direction=direction, relation=relation, offset=offset, limit=limit)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    total, neighbors = result
+    return {"node": graph.get(node_id), "direction": direction, "total": total, "neighbors": neighbors}
+
+
+@router.get("/nodes/{node_id:path}")
+def get_node(node_id: str, graph: KnowledgeGraph = Depends(get_graph)):
+    node = graph.get(node_id)
+    if node is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    return node
+
+
+@router.post("/reload")
+def reload_graph(current_user: User = Depends(get_current_admin)):
+    """立即重新加载导出目录（不等待定期检查）"""
+    try:
+        return kg_store.reload().stats()
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="Knowledge graph export not found")
@@ -1,64 +1,193 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response, UploadFile, File
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlmodel import Session
 from app.database import get_db
-from app.models import Rule, RuleRead, RuleCreate, RuleUpdate
-from typing import List, Optional
+from app.models import RuleRead, RuleCreate, RuleUpdate, User
+from app.catalog import rule_catalog, etag_matches
+from app.utils.security import get_current_admin
+from app import crud
+from typing import Iterator, List, Literal, Optional
+from pathlib import Path
+import codecs
+import csv
+import io
+import json
+import orjson
+import re
 
 
 router = APIRouter()
 
+IMPORT_BATCH_SIZE = 1000
+EXPORT_FIELDS = ["id", "pattern", "description", "data_type", "region", "reference_url", "engine", "created_at"]
+
+
+def iter_import_records(file: UploadFile, fmt: str) -> Iterator[tuple[int, dict]]:
+    """逐行读取上传的 JSON Lines / CSV 文件，产出 (行号, 记录)"""
+    text = codecs.getreader("utf-8-sig")(file.file)
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, {k: (v if v != "" else None) for k, v in record.items()}
+    else:
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, e
+                continue
+            yield line_no, record
+
+
+def validate_import_record(record) -> RuleCreate:
+    if isinstance(record, Exception):
+        raise ValueError(f"Invalid JSON: {record}")
+    if not isinstance(record, dict):
+        raise ValueError("Each record must be an object")
+    # 允许直接导入 /rules/export 的输出
+    for key in ("id", "created_at"):
+        record.pop(key, None)
+    rule = RuleCreate.model_validate(record)
+    try:
+        re.compile(rule.pattern)
+    except re.error as e:
+        raise ValueError(f"Invalid regex: {e}")
+    return rule
+
+
+def batched(records, size: int):
+    batch = []
+    for item in records:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 
 @router.get("/", response_model=List[RuleRead])
 def list_rules(
     region: Optional[str] = Query(None, description="Filter by regulatory region (e.g., FDA, EMA)"),
     data_type: Optional[str] = Query(None, description="Filter by data type (e.g., Patient ID)"),
     limit: int = Query(100, description="Limit the number of results"),
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    query = select(Rule)
-    if region:
-        query = query.where(Rule.region == region)
-    if data_type:
-        query = query.where(Rule.data_type.ilike(f"%{data_type}%"))
-    return db.exec(query.limit(limit)).all()
+    catalog = rule_catalog.refresh(db)
+    headers = {"ETag": catalog.etag}
+    if etag_matches(if_none_match, catalog.etag):
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(catalog.filter(region, data_type, limit), headers=headers)
+
+
+@router.get("/export")
+def export_rules(
+    format: Literal["jsonl", "csv"] = Query("jsonl", description="Export format"),
+    db: Session = Depends(get_db)
+):
+    # 直接从内存目录快照流式输出，不在响应期间占用数据库会话
+    rules = list(rule_catalog.refresh(db).rules.values())
+
+    def jsonl():
+        for rule in rules:
+            yield orjson.dumps(rule) + b"\n"
+
+    def csv_rows():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for batch in batched(rules, IMPORT_BATCH_SIZE):
+            writer.writerows(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    media_type = "application/x-ndjson" if format == "jsonl" else "text/csv"
+    return StreamingResponse(
+        jsonl() if format == "jsonl" else csv_rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="rules.{format}"'}
+    )
+
+
+@router.post("/import")
+def import_rules(
+    file: UploadFile = File(...),
+    format: Optional[Literal["jsonl", "csv"]] = Query(None, description="Defaults to the file extension"),
+    dry_run: bool = Query(False, description="Validate only, do not write"),
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    fmt = format or ("csv" if Path(file.filename or "").suffix.lower() == ".csv" else "jsonl")
+    received, imported, errors = 0, 0, []
+    # 边读边写：每攒满一批就插入（不提交），内存只保留当前批次；全部写完后在同一事务内提交一次
+    for batch in batched(iter_import_records(file, fmt), IMPORT_BATCH_SIZE):
+        valid = []
+        for row, record in batch:
+            try:
+                valid.append(validate_import_record(record))
+            except (ValidationError, ValueError) as e:
+                errors.append({"row": row, "error": str(e)})
+        received += len(batch)
+        if valid and not dry_run:
+            imported += len(crud.insert_rules(db, valid, IMPORT_BATCH_SIZE))
+    if imported:
+        db.commit()
+    return {
+        "received": received,
+        "imported": imported,
+        "failed": len(errors),
+        "errors": errors
+    }
 
 
 @router.get("/{rule_id}", response_model=RuleRead)
-def get_rule(rule_id: int, db: Session = Depends(get_db)):
-    rule = db.get(Rule, rule_id)
+def get_rule(rule_id: int, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    catalog = rule_catalog.refresh(db)
+    rule = catalog.get(rule_id)
     if not rule:
         raise HTTPException(status_code=404, detail="Rule not found")
-    return rule
+    headers = {"ETag": catalog.etag}
+    if etag_matches(if_none_match, catalog.etag):
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(rule, headers=headers)
+
+
+@router.get("/{rule_id}/related", response_model=List[RuleRead])
+def get_related_rules(
+    rule_id: int,
+    kind: Literal["data_type", "pattern", "region"] = Query("data_type", description="Grouping dimension"),
+    db: Session = Depends(get_db)
+):
+    related = crud.get_related_rules(db, rule_id, kind)
+    if not related:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return related
 
 
 @router.post("/", response_model=RuleRead, status_code=201)  # 明确指定201状态码
 def create_rule(rule: RuleCreate, db: Session = Depends(get_db)):
-    db_rule = Rule(** rule.model_dump())  # 使用model_dump()替代deprecated的dict()
-    db.add(db_rule)
-    db.commit()
-    db.refresh(db_rule)
-    return db_rule
+    return crud.create_rule(db, rule)
 
 
 @router.put("/{rule_id}", response_model=RuleRead)
 def update_rule(rule_id: int, rule: RuleUpdate, db: Session = Depends(get_db)):
-    db_rule = db.get(Rule, rule_id)
+    try:
+        db_rule = crud.update_rule(db, rule_id, rule)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     if not db_rule:
         raise HTTPException(status_code=404, detail="Rule not found")
-    update_data = rule.model_dump(exclude_unset=True)  # 使用model_dump()
-    for key, value in update_data.items():
-        setattr(db_rule, key, value)
-    db.add(db_rule)
-    db.commit()
-    db.refresh(db_rule)
     return db_rule
 
 
 @router.delete("/{rule_id}")
 def delete_rule(rule_id: int, db: Session = Depends(get_db)):
-    rule = db.get(Rule, rule_id)
-    if not rule:
+    if not crud.delete_rule(db, rule_id):
         raise HTTPException(status_code=404, detail="Rule not found")
-    db.delete(rule)
-    db.commit()
     return {"message": "Rule deleted"}
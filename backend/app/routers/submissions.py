@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, Query, Response
 from sqlmodel import Session, select
-from app.database import get_db
-from app.models import RuleSubmission, RuleSubmissionRead, RuleSubmissionCreate, User
+from app.database import get_db, get_async_db
+from sqlmodel.ext.asyncio.session import AsyncSession
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
+from app.models import RuleSubmission, RuleSubmissionBase, RuleSubmissionRead, RuleSubmissionCreate, User
 from datetime import datetime
 import os
 from pathlib import Path
@@ -10,6 +13,9 @@ from app.config import settings
 from app.utils.security import get_current_user
 from app import crud
 from typing import List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -29,6 +35,31 @@ def save_upload_file(file: UploadFile) -> str:
     
     return str(file_path.relative_to(settings.BASE_DIR))
 
+def enqueue_submission_analysis(submission_id: int):
+    """投递提交后的后台分析：重叠报告始终计算，性能分析由 SUBMISSION_PROFILING 控制"""
+    from app.tasks import overlap_report_task, profile_submission_task
+
+    tasks = [overlap_report_task]
+    if settings.SUBMISSION_PROFILING:
+        tasks.append(profile_submission_task)
+    for task in tasks:
+        try:
+            task.apply_async((submission_id,), retry=False)
+        except Exception as e:
+            logger.warning(f"Could not enqueue {task.name} for submission {submission_id}: {e}")
+
+def enqueue_overlap_refresh(submission_ids: list[int]):
+    """规则目录变更后重新计算过期的重叠报告（由 OVERLAP_REFRESH 控制）；任务会跳过已是最新的报告，重复投递无副作用"""
+    if not settings.OVERLAP_REFRESH:
+        return
+    from app.tasks import overlap_report_task
+
+    for submission_id in submission_ids:
+        try:
+            overlap_report_task.apply_async((submission_id,), retry=False)
+        except Exception as e:
+            logger.warning(f"Could not enqueue overlap refresh for submission {submission_id}: {e}")
+
 @router.post("/", response_model=RuleSubmissionRead)
 async def create_submission(
     pattern: str = Form(...),
@@ -37,7 +68,7 @@ async def create_submission(
     region: str = Form(...),
     reference: UploadFile = File(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Save file if provided
     reference_path = None
@@ -53,16 +84,47 @@ async def create_submission(
         submitted_by_id=current_user.id
     )
     
-    submission = crud.create_submission(db, submission_data)
+    submission = await crud.create_submission_async(db, submission_data)
+    # 投递失败（如 broker 不可用）不影响提交本身，结果稍后由管理员在待审列表中查看
+    await run_in_threadpool(enqueue_submission_analysis, submission.id)
     return submission
 
+USER_FIELDS = ("id", "email", "full_name", "is_admin")
+
+def _user_dict(user: Optional[User]) -> Optional[dict]:
+    return None if user is None else {field: getattr(user, field) for field in USER_FIELDS}
+
+def submission_to_dict(submission: RuleSubmission) -> dict:
+    """直接从可信的数据库行构造响应字典，跳过 RuleSubmissionRead 的逐行校验"""
+    data = {field: getattr(submission, field) for field in RuleSubmissionBase.model_fields}
+    data["id"] = submission.id
+    data["perf_profile"] = submission.perf_profile
+    data["submitted_by"] = _user_dict(submission.submitter)
+    data["reviewed_by"] = _user_dict(submission.reviewer)
+    return data
+
+def paginate_submissions(db: Session, response: Response, status: Optional[str], limit: int, cursor: Optional[str]):
+    """查询一页提交，若可能还有下一页则通过 X-Next-Cursor 响应头返回游标"""
+    try:
+        submissions = crud.get_submissions(db, status=status, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if len(submissions) == limit:
+        response.headers["X-Next-Cursor"] = crud.encode_submission_cursor(submissions[-1])
+    return submissions
+
 @router.get("/", response_model=List[RuleSubmissionRead])
 def list_submissions(
+    response: Response,
     status: Optional[str] = Query(None, description="Filter by status (pending, approved, rejected)"),
-    limit: int = Query(100, description="Limit the number of results"),
+    limit: int = Query(100, ge=1, le=1000, description="Limit the number of results"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
     db: Session = Depends(get_db)
 ):
-    return crud.get_submissions(db, status=status, limit=limit)
+    submissions = paginate_submissions(db, response, status, limit, cursor)
+    # 直接返回 Response 时 FastAPI 不会合并注入的 response 头，需手动带上游标
+    headers = {k: v for k, v in response.headers.items() if k == "x-next-cursor"}
+    return ORJSONResponse([submission_to_dict(s) for s in submissions], headers=headers)
 
 @router.get("/{submission_id}", response_model=RuleSubmissionRead)
 def get_submission(submission_id: int, db: Session = Depends(get_db)):
@@ -1,58 +1,332 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import Session
-from app.database import get_db
-from app.models import Rule
-from app.tasks import validate_data_task
-from celery.result import AsyncResult
-from app.utils.file_parsers import parse_file
-import pandas as pd
-import json
+from app.database import get_async_db, get_db
+from app.catalog import rule_catalog
+from app.models import Rule, User
+from app.config import settings
+from app.utils import batch
+from app.utils.admission import BULK_QUEUE, INTERACTIVE_QUEUE, admit_validation, choose_queue, release_validation
+from app.utils.security import get_optional_user
+from app.utils.term_matcher import get_term_matcher
+from typing import List, Optional
+from sqlmodel import select
+import codecs
+import uuid
+from app.utils.file_parsers import iter_file_chunks, native_records, parse_file
+from app.utils.matching import ColumnMatcher
+from app.utils.metrics import PATTERN_CACHE_REQUESTS, observe_validation
 from collections import defaultdict
-import re
+import time
 
 router = APIRouter()
 
+# 校验模式：full 校验全部行（大文件进入队列），fail_fast 发现若干不合格值即停止，
+# sample 只校验随机或分层样本并估计不合格率；后两者流式读取文件，在请求内完成
+VALIDATION_MODES = ("full", "fail_fast", "sample")
+
 pattern_cache = defaultdict(dict)
 
-def get_compiled_pattern(pattern: str):
-    if pattern not in pattern_cache:
-        pattern_cache[pattern] = re.compile(pattern)
-    return pattern_cache[pattern]
+def get_compiled_pattern(pattern: str, engine: str = "auto"):
+    key = (pattern, engine)
+    if key not in pattern_cache:
+        PATTERN_CACHE_REQUESTS.labels(result="miss").inc()
+        pattern_cache[key] = ColumnMatcher(pattern, engine)
+    else:
+        PATTERN_CACHE_REQUESTS.labels(result="hit").inc()
+    return pattern_cache[key]
+
+def _owner(request: Request, current_user: User | None) -> str:
+    """在途名额的归属：登录用户按用户 ID，匿名请求按 IP"""
+    if current_user:
+        return f"user:{current_user.id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
 
 @router.post("/")
 async def validate_data(
+    request: Request,
     rule_id: int = Form(...),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    mode: str = Form("full"),
+    column: Optional[str] = Form(None),
+    max_violations: int = Form(1, ge=1),
+    sample_size: Optional[int] = Form(None, ge=1),
+    strata_column: Optional[str] = Form(None),
+    confidence: float = Form(0.95, gt=0, lt=1),
+    seed: Optional[int] = Form(None),
+    current_user: User | None = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    rule = db.get(Rule, rule_id)
+    if mode not in VALIDATION_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {mode}")
+    rule = await db.get(Rule, rule_id)
     if not rule:
         raise HTTPException(status_code=404, detail="Rule not found")
 
+    if mode != "full":
+        return await run_in_threadpool(
+            _validate_streaming, rule, file, mode, column, max_violations,
+            sample_size or settings.VALIDATION_SAMPLE_SIZE, strata_column, confidence, seed
+        )
+
+    # 按上传大小在解析前决定通道：大文件不在 API 中整表载入，直接暂存到磁盘由 bulk worker 流式校验
+    if batch.upload_size(file) >= settings.VALIDATION_BULK_MIN_BYTES:
+        return await _enqueue_staged(request, current_user, rule, file)
+
     try:
         df = await parse_file(file)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error parsing file: {str(e)}")
 
-    if len(df) < 10000:
+    if len(df) < settings.VALIDATION_INLINE_MAX_ROWS:
         col_name = df.columns[0]
-        compiled_pattern = get_compiled_pattern(rule.pattern)
-        mask = df[col_name].apply(lambda x: bool(compiled_pattern.fullmatch(str(x))))
+        matcher = get_compiled_pattern(rule.pattern, rule.engine)
+        start = time.perf_counter()
+        mask = matcher.match(df[col_name])
+        observe_validation("inline", matcher.engine, len(df), time.perf_counter() - start, rule.id)
         passed = mask.all()
-        return {
+        return ORJSONResponse({
             "passed": bool(passed),
             "invalid_count": int((~mask).sum()),
-            "invalid_samples": df[~mask].head(10).to_dict(orient="records")
-        }
+            # 单元格可能是 Timestamp / numpy 标量（SAS、Excel 等），orjson 无法直接序列化
+            "invalid_samples": native_records(df[~mask].head(10))
+        })
+    elif choose_queue(len(df)) == BULK_QUEUE:
+        # 字节数不大但行数多（如单列短值）：同样暂存文件，不把整表经 Redis 传给 worker
+        return await _enqueue_staged(request, current_user, rule, file)
     else:
-        data_json = df.to_json(orient="split")
-        task = validate_data_task.delay(rule.pattern, data_json)
-        return {"task_id": task.id}
+        from app.tasks import validate_data_task
+
+        owner = _owner(request, current_user)
+        queue = INTERACTIVE_QUEUE
+        # 准入检查访问 Redis，放到线程池避免阻塞事件循环
+        await run_in_threadpool(admit_validation, owner, queue)
+        try:
+            data_json = df.to_json(orient="split")
+            task = validate_data_task.apply_async(
+                (rule.pattern, data_json), {"rule_id": rule.id, "owner": owner, "engine": rule.engine}, queue=queue
+            )
+        except Exception:
+            await run_in_threadpool(release_validation, owner)
+            raise
+        return {"task_id": task.id, "queue": queue}
+
+async def _enqueue_staged(request: Request, current_user: User | None, rule: Rule, file: UploadFile):
+    """full 模式进入 bulk 通道：准入后把上传文件暂存到共享目录（与 /batch 相同），任务只携带路径"""
+    from app.tasks import validate_upload_task
+
+    owner = _owner(request, current_user)
+    await run_in_threadpool(admit_validation, owner, BULK_QUEUE)
+    job_id = uuid.uuid4().hex
+    try:
+        path = await run_in_threadpool(batch.stage_upload, file, batch.batch_dir(job_id))
+    except ValueError as e:
+        await run_in_threadpool(release_validation, owner)
+        raise HTTPException(status_code=400, detail=f"Error reading file: {str(e)}")
+    except Exception:
+        await run_in_threadpool(release_validation, owner)
+        raise
+    try:
+        task = validate_upload_task.apply_async(
+            (job_id, path, file.filename or "upload", rule.pattern),
+            {"rule_id": rule.id, "owner": owner, "engine": rule.engine}, queue=BULK_QUEUE
+        )
+    except Exception:
+        await run_in_threadpool(release_validation, owner)
+        batch.discard_batch(job_id)
+        raise
+    return {"task_id": task.id, "queue": BULK_QUEUE}
+
+def _validate_streaming(rule: Rule, file: UploadFile, mode: str, column: Optional[str], max_violations: int,
+                        sample_size: int, strata_column: Optional[str], confidence: float, seed: Optional[int]):
+    """fail_fast / sample 模式：逐块读取文件，只解析需要的列，无需整表载入内存"""
+    from app.utils.sampling import validate_fail_fast, validate_sample
+
+    if sample_size > settings.VALIDATION_SAMPLE_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"sample_size must not exceed {settings.VALIDATION_SAMPLE_MAX_SIZE}")
+    # 未指定 column 时校验首列，需读取全部列才能确定首列
+    columns = list(dict.fromkeys(c for c in (column, strata_column) if c is not None)) if column else None
+    matcher = get_compiled_pattern(rule.pattern, rule.engine)
+    chunks = iter_file_chunks(file, settings.VALIDATION_STREAM_CHUNK_ROWS, columns)
+    try:
+        if mode == "fail_fast":
+            result, rows, seconds = validate_fail_fast(chunks, matcher, column, max_violations)
+        else:
+            result, rows, seconds = validate_sample(
+                chunks, matcher, column, sample_size, strata_column, confidence,
+                settings.VALIDATION_SAMPLE_MAX_STRATA, seed
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Error parsing file: {str(e)}")
+    finally:
+        chunks.close()
+    observe_validation(mode, matcher.engine, rows, seconds, rule.id)
+    return ORJSONResponse(result)
+
+@router.post("/batch")
+async def validate_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    profile: str = Form(...),
+    current_user: User | None = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """批量校验多个文件或 ZIP / tar 压缩包：按 profile 为每个文件分配规则，每个文件一条任务并行校验
+
+    返回批次的 job_id，通过 GET /validate/batch/{job_id} 查询进度与汇总报告。
+    """
+    from celery import group
+    from app.tasks import validate_file_task
+
+    try:
+        entries = batch.parse_profile(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rule_ids = batch.profile_rule_ids(entries)
+    rules = {rule.id: rule for rule in (await db.exec(select(Rule).where(Rule.id.in_(rule_ids)))).all()}
+    missing = sorted(rule_ids - rules.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Rules not found: {missing}")
+
+    owner = _owner(request, current_user)
+    await run_in_threadpool(admit_validation, owner, BULK_QUEUE)
+    job_id = uuid.uuid4().hex
+    job_dir = batch.batch_dir(job_id)
+    try:
+        # 解压与落盘是阻塞 I/O，放到线程池
+        staged, skipped = await run_in_threadpool(batch.stage_batch, files, entries, job_dir)
+    except ValueError as e:
+        await run_in_threadpool(release_validation, owner)
+        raise HTTPException(status_code=400, detail=f"Error reading files: {str(e)}")
+    except Exception:
+        await run_in_threadpool(release_validation, owner)
+        raise
+    if not staged:
+        await run_in_threadpool(release_validation, owner)
+        batch.discard_batch(job_id)
+        raise HTTPException(status_code=400, detail="No files matched the profile")
+
+    try:
+        batch.register_batch(job_id, len(staged), skipped)
+        signatures = [
+            validate_file_task.si(job_id, item["path"], item["name"], [
+                {**check, "pattern": rules[check["rule_id"]].pattern, "engine": rules[check["rule_id"]].engine}
+                for check in item["checks"]
+            ], owner).set(queue=BULK_QUEUE)
+            for item in staged
+        ]
+        result = group(signatures).apply_async(task_id=job_id)
+        # 保存组结果，之后可仅凭 job_id 恢复
+        result.save()
+    except Exception:
+        await run_in_threadpool(release_validation, owner)
+        batch.discard_batch(job_id)
+        raise
+    return {"job_id": job_id, "files": len(staged), "skipped": skipped, "queue": BULK_QUEUE}
+
+@router.get("/batch/{job_id}")
+def get_batch_result(job_id: str):
+    from celery.result import GroupResult
+    from app.tasks import validate_file_task
+
+    result = GroupResult.restore(job_id, app=validate_file_task.app)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if not result.ready():
+        return {"status": "pending", "completed": result.completed_count(), "total": len(result.results)}
+    results = []
+    for child in result.results:
+        value = child.get(propagate=False)
+        results.append({"error": str(value)} if isinstance(value, BaseException) else value)
+    metadata = batch.batch_metadata(job_id) or {}
+    report = batch.summarize(results, metadata.get("skipped", []))
+    # 与单文件结果一样只取回一次
+    result.forget()
+    batch.forget_batch(job_id)
+    return ORJSONResponse({"status": "completed", "job_id": job_id, "report": report})
 
 @router.get("/result/{task_id}")
 def get_validation_result(task_id: str):
-    task = AsyncResult(task_id)
+    from app.tasks import validate_data_task
+
+    task = validate_data_task.AsyncResult(task_id)
     if not task.ready():
         return {"status": "pending"}
-    result = task.get()
+    result = task.get(propagate=False)
+    # 结果只需取回一次，取回后立即从结果后端删除，避免 Redis 内存随请求量增长
+    task.forget()
     return {"status": "completed", "result": result}
+
+# 文档提取时每次读取的字节数
+EXTRACT_CHUNK_SIZE = 1 << 20
+
+def _read_text_chunks(file: UploadFile):
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while chunk := file.file.read(EXTRACT_CHUNK_SIZE):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+@router.post("/extract")
+def extract_patterns(
+    file: UploadFile = File(...),
+    source: str = Form("catalog"),
+    db: Session = Depends(get_db)
+):
+    """单遍扫描整篇文档：source 为 FDA / EMA 时使用对应区域的模式，为 catalog 时使用全部规则"""
+    from app.utils.crawlers import REGION_EXTRACTORS
+
+    if source == "catalog":
+        extractor = rule_catalog.refresh(db).extractor()
+    elif source in REGION_EXTRACTORS:
+        extractor = REGION_EXTRACTORS[source]
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown source: {source}")
+
+    result = extractor.extract_stream(_read_text_chunks(file))
+    return ORJSONResponse({
+        "source": source,
+        "characters": result.characters,
+        "matches": [
+            {"name": name, "count": result.counts[name], "offsets": result.offsets[name]}
+            for name in result.found()
+        ]
+    })
+
+@router.post("/terms")
+async def tag_terms(
+    file: UploadFile = File(...),
+    column: Optional[str] = Form(None),
+    sources: Optional[str] = Form(None),
+    top: int = Form(50, ge=1, le=1000)
+):
+    """用知识图谱词典标注自由文本列（如 AE 原始描述），sources 为逗号分隔的来源过滤"""
+    try:
+        df = await parse_file(file)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error parsing file: {str(e)}")
+    column = column or df.columns[0]
+    if column not in df.columns:
+        raise HTTPException(status_code=400, detail=f"Unknown column: {column}")
+
+    source_list = [s.strip() for s in sources.split(",") if s.strip()] if sources else None
+    try:
+        matcher = await run_in_threadpool(get_term_matcher, source_list)
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="Knowledge graph export not found")
+
+    series = df[column]
+    values = series.astype(object).where(series.notna(), None).tolist()
+    # 百万行级别的标注耗时数秒，放到线程池避免阻塞事件循环
+    summary = await run_in_threadpool(matcher.tag_values, values)
+    return ORJSONResponse({
+        "column": column,
+        "rows": summary.rows,
+        "tagged_rows": summary.tagged_rows,
+        "terms": [
+            {"term": term, "count": count, "labels": matcher.labels.get(term, [])}
+            for term, count in summary.term_counts.most_common(top)
+        ],
+        "samples": summary.samples
+    })
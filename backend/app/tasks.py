@@ -1,17 +1,41 @@
-from celery import shared_task
+from celery.signals import task_prerun, task_postrun
 import logging
-from app.utils.crawlers import crawl_fda, crawl_ema
+import time
 from app.database import get_db
 from sqlmodel import Session, select, create_engine
 from app.config import settings
-import pandas as pd
 import json
 import re
+from app.utils.metrics import TASK_DURATION, observe_validation
+from app.utils.admission import release_validation
+from app.utils.matching import get_column_matcher
+from celery_app import celery as celery_app  # 确保 API 端投递任务时使用同一份序列化与结果配置
 
 logger = logging.getLogger(__name__)
 
-@shared_task
-def validate_data_task(pattern: str, data_json: str):
+# 任务开始时间，按 task_id 记录，供 task_postrun 计算耗时
+_task_started_at = {}
+
+@task_prerun.connect
+def record_task_start(task_id=None, **kwargs):
+    _task_started_at[task_id] = time.perf_counter()
+
+@task_postrun.connect
+def record_task_runtime(task_id=None, task=None, state=None, **kwargs):
+    started_at = _task_started_at.pop(task_id, None)
+    if started_at is not None and task is not None:
+        TASK_DURATION.labels(task=task.name, state=state or "UNKNOWN").observe(time.perf_counter() - started_at)
+
+@task_postrun.connect
+def release_validation_slot(task=None, kwargs=None, **extra):
+    """校验任务结束后归还提交者的在途名额"""
+    if task is not None and task.name == validate_data_task.name:
+        release_validation((kwargs or {}).get("owner"))
+
+@celery_app.task
+def validate_data_task(pattern: str, data_json: str, rule_id: int = None, owner: str = None, engine: str = "auto"):
+    import pandas as pd
+
     try:
         # Convert JSON back to DataFrame
         data = json.loads(data_json)
@@ -19,7 +43,11 @@ def validate_data_task(pattern: str, data_json: str):
         
         # Perform validation on first column
         col_name = df.columns[0]
-        mask = df[col_name].astype(str).str.match(pattern)
+        matcher = get_column_matcher(pattern, engine)
+        start = time.perf_counter()
+        # 与同步路径相同的 fullmatch 语义
+        mask = matcher.match(df[col_name])
+        observe_validation("async", matcher.engine, len(df), time.perf_counter() - start, rule_id)
         passed = mask.all()
         
         return {
@@ -31,8 +59,102 @@ def validate_data_task(pattern: str, data_json: str):
         logger.exception("Validation task failed")
         return {"error": str(e)}
 
-@shared_task
+@celery_app.task
+def validate_file_task(job_id: str, path: str, name: str, checks: list, owner: str = None):
+    """批量校验中的单个文件：校验暂存文件并删除；批次最后一个文件结束时归还在途名额"""
+    from app.utils.batch import finish_batch_file, validate_staged_file
+
+    try:
+        result, timings = validate_staged_file(path, name, checks, settings.VALIDATION_STREAM_CHUNK_ROWS)
+        for check, (engine, elapsed) in zip(checks, timings):
+            observe_validation("batch", engine, result["rows"], elapsed, check["rule_id"])
+        return result
+    except FileNotFoundError:
+        # 暂存文件由 API 写入，worker 看不到说明两者没有共享 UPLOAD_DIR
+        logger.error(f"Staged file {path} not found, UPLOAD_DIR must be shared between the API and bulk workers")
+        return {"file": name, "error": "Staged file not found on the worker"}
+    except Exception as e:
+        logger.exception(f"Batch validation failed for {name}")
+        return {"file": name, "error": str(e)}
+    finally:
+        finish_batch_file(job_id, path, owner)
+
+@celery_app.task
+def validate_upload_task(job_id: str, path: str, name: str, pattern: str, rule_id: int = None, owner: str = None,
+                         engine: str = "auto"):
+    """full 模式的大文件：流式校验 API 暂存的文件（首列），结束后删除暂存目录并归还在途名额"""
+    from app.utils.batch import discard_batch, validate_staged_file
+
+    check = {"rule_id": rule_id, "pattern": pattern, "engine": engine, "column": None}
+    try:
+        result, [(matcher_engine, elapsed)] = validate_staged_file(
+            path, name, [check], settings.VALIDATION_STREAM_CHUNK_ROWS
+        )
+        observe_validation("async", matcher_engine, result["rows"], elapsed, rule_id)
+        state = result["checks"][0]
+        # 与 validate_data_task 的结果字段一致；不合格样例为 {"row", "value"}
+        return {
+            "passed": state["passed"],
+            "invalid_count": state["invalid_count"],
+            "invalid_samples": state["invalid_samples"],
+            "rows": result["rows"],
+        }
+    except FileNotFoundError:
+        logger.error(f"Staged file {path} not found, UPLOAD_DIR must be shared between the API and bulk workers")
+        return {"error": "Staged file not found on the worker"}
+    except Exception as e:
+        logger.exception("Validation task failed")
+        return {"error": str(e)}
+    finally:
+        discard_batch(job_id)
+        release_validation(owner)
+
+@celery_app.task
+def overlap_report_task(submission_id: int):
+    """计算新提交与已有规则的查重/重叠报告并写回提交记录，审核列表直接读取；报告未过期时不重复计算"""
+    from app.crud import store_overlap_report
+    from app.database import engine
+
+    with Session(engine) as db:
+        report = store_overlap_report(db, submission_id)
+    if report is None:
+        logger.warning(f"Submission {submission_id} not found, skipping overlap report")
+        return None
+    return {
+        "submission_id": submission_id,
+        "duplicates": len(report["duplicate_of"]),
+        "overlaps": len(report["overlaps"]),
+        "timed_out": report.get("timed_out", False)
+    }
+
+@celery_app.task
+def profile_submission_task(submission_id: int):
+    """对新提交的模式做性能分析并写回提交记录，供管理员审核时参考"""
+    from app.database import engine
+    from app.models import RuleSubmission
+    from app.utils.rule_profile import profile_pattern_isolated
+
+    with Session(engine) as db:
+        submission = db.get(RuleSubmission, submission_id)
+        if submission is None:
+            logger.warning(f"Submission {submission_id} not found, skipping profiling")
+            return None
+        pattern = submission.pattern
+
+    profile = profile_pattern_isolated(pattern)
+    with Session(engine) as db:
+        submission = db.get(RuleSubmission, submission_id)
+        if submission is None:
+            return None
+        submission.perf_profile = profile
+        db.add(submission)
+        db.commit()
+    return {"submission_id": submission_id, "worst_case_ms": (profile.get("worst_case") or {}).get("ms")}
+
+@celery_app.task
 def run_weekly_crawl():
+    from app.utils.crawlers import crawl_fda, crawl_ema
+
     logger.info("Running weekly regulatory crawl")
     engine = create_engine(settings.DATABASE_URL)
     
@@ -0,0 +1,78 @@
+import logging
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+from app.utils.metrics import queue_depths
+
+logger = logging.getLogger(__name__)
+
+# 校验任务的两条通道：小任务走 interactive，大文件走 bulk，由不同的 worker 消费
+INTERACTIVE_QUEUE = "validation-queue"
+BULK_QUEUE = "validation-bulk-queue"
+
+INFLIGHT_KEY = "bioregex:validation:inflight:{owner}"
+
+_redis_client = None
+
+
+def get_redis():
+    global _redis_client
+    if _redis_client is None:
+        import redis
+
+        _redis_client = redis.Redis.from_url(
+            settings.CELERY_BROKER_URL, socket_timeout=0.5, socket_connect_timeout=0.5
+        )
+    return _redis_client
+
+
+def choose_queue(rows: int) -> str:
+    return BULK_QUEUE if rows >= settings.VALIDATION_BULK_MIN_ROWS else INTERACTIVE_QUEUE
+
+
+def _too_many_requests(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(settings.VALIDATION_RETRY_AFTER_SECONDS)},
+    )
+
+
+def admit_validation(owner: str, queue: str) -> None:
+    """投递前的准入检查：队列积压超限或用户在途任务过多时返回 429
+
+    通过后占用一个在途名额，任务结束（或投递失败）时须调用 release_validation 归还。
+    Redis 不可用时放行，由后续投递本身报错。
+    """
+    limit = settings.VALIDATION_MAX_BULK_QUEUE_DEPTH if queue == BULK_QUEUE else settings.VALIDATION_MAX_QUEUE_DEPTH
+    try:
+        depth = queue_depths((queue,))[queue]
+    except Exception as e:
+        logger.warning(f"Could not read depth of {queue}, admitting without backpressure: {e}")
+        return
+    if depth >= limit:
+        raise _too_many_requests(f"Validation queue is full ({depth} jobs waiting), retry later")
+
+    key = INFLIGHT_KEY.format(owner=owner)
+    client = get_redis()
+    with client.pipeline() as pipe:
+        pipe.incr(key)
+        pipe.expire(key, settings.VALIDATION_INFLIGHT_TTL_SECONDS)
+        inflight, _ = pipe.execute()
+    if inflight > settings.VALIDATION_MAX_INFLIGHT_PER_USER:
+        client.decr(key)
+        raise _too_many_requests(
+            f"Too many validation jobs in progress (limit {settings.VALIDATION_MAX_INFLIGHT_PER_USER}), retry later"
+        )
+
+
+def release_validation(owner: str | None) -> None:
+    if not owner:
+        return
+    try:
+        key = INFLIGHT_KEY.format(owner=owner)
+        if get_redis().decr(key) <= 0:
+            get_redis().delete(key)
+    except Exception as e:
+        logger.warning(f"Could not release validation slot for {owner}: {e}")
@@ -0,0 +1,280 @@
+import fnmatch
+import json
+import logging
+import shutil
+import tarfile
+import time
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Iterator, Optional
+
+from fastapi import UploadFile
+
+from app.config import settings
+from app.utils.admission import get_redis, release_validation
+
+logger = logging.getLogger(__name__)
+
+# 批量校验的元数据（跳过的文件等）与未完成文件计数，过期时间同在途计数
+BATCH_KEY = "bioregex:validation:batch:{job_id}"
+REMAINING_KEY = "bioregex:validation:batch:{job_id}:remaining"
+
+ZIP_SUFFIXES = (".zip",)
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# 每个文件返回的不合格样例条数，与单文件校验一致
+MAX_INVALID_SAMPLES = 10
+
+
+def parse_profile(text: str) -> list[tuple[str, list[dict]]]:
+    """解析按文件名分配规则的 profile
+
+    JSON 对象，键为文件名通配符（不区分大小写，匹配压缩包内的文件名，不含目录），值为规则列表；
+    规则可写作规则 ID，或 ``{"rule_id": 1, "column": "usubjid"}`` 指定校验的列（默认首列）::
+
+        {"dm*": [{"rule_id": 1, "column": "usubjid"}], "*.csv": [3]}
+    """
+    try:
+        profile = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Profile is not valid JSON: {e}") from e
+    if not isinstance(profile, dict) or not profile:
+        raise ValueError("Profile must be a non-empty object mapping file patterns to rules")
+    entries = []
+    for glob, rules in profile.items():
+        if not isinstance(rules, list):
+            raise ValueError(f"Rules for {glob!r} must be a list")
+        checks = []
+        for rule in rules:
+            if isinstance(rule, dict):
+                rule_id, column = rule.get("rule_id"), rule.get("column")
+            else:
+                rule_id, column = rule, None
+            if not isinstance(rule_id, int) or isinstance(rule_id, bool) or not (column is None or isinstance(column, str)):
+                raise ValueError(f"Invalid rule entry for {glob!r}: {rule!r}")
+            checks.append({"rule_id": rule_id, "column": column})
+        entries.append((glob.lower(), checks))
+    return entries
+
+
+def profile_rule_ids(profile: list[tuple[str, list[dict]]]) -> set[int]:
+    return {check["rule_id"] for _, checks in profile for check in checks}
+
+
+def checks_for(name: str, profile: list[tuple[str, list[dict]]]) -> list[dict]:
+    """文件命中的全部规则（按 rule_id 与列去重）"""
+    basename = PurePosixPath(name).name.lower()
+    checks = {}
+    for glob, entry_checks in profile:
+        if fnmatch.fnmatchcase(basename, glob):
+            for check in entry_checks:
+                checks.setdefault((check["rule_id"], check["column"]), check)
+    return list(checks.values())
+
+
+def _hidden(name: str) -> bool:
+    path = PurePosixPath(name)
+    return path.parts[:1] == ("__MACOSX",) or path.name.startswith(".")
+
+
+def iter_members(file: UploadFile) -> Iterator[tuple[str, BinaryIO]]:
+    """逐个给出上传内容中的 (文件名, 数据流)：ZIP / tar 按成员流式读取，其他文件即自身
+
+    tar 以流模式打开，成员按顺序解压，不会整体载入内存或落盘；ZIP 依赖中央目录，
+    在已落盘的上传文件上按成员随机读取。
+    """
+    filename = file.filename or "upload"
+    lower = filename.lower()
+    if lower.endswith(ZIP_SUFFIXES):
+        with zipfile.ZipFile(file.file) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or _hidden(info.filename):
+                    continue
+                with archive.open(info) as member:
+                    yield f"{filename}/{info.filename}", member
+    elif lower.endswith(TAR_SUFFIXES):
+        with tarfile.open(fileobj=file.file, mode="r|*") as archive:
+            for info in archive:
+                if not info.isfile() or _hidden(info.name):
+                    continue
+                yield f"{filename}/{info.name}", archive.extractfile(info)
+    else:
+        yield filename, file.file
+
+
+def _copy_limited(source: BinaryIO, target: Path, budget: int) -> int:
+    """复制到暂存文件，超过剩余字节预算时报错（防止压缩炸弹）"""
+    written = 0
+    with open(target, "wb") as out:
+        while chunk := source.read(1 << 20):
+            written += len(chunk)
+            if written > budget:
+                raise ValueError(f"Batch exceeds {settings.VALIDATION_BATCH_MAX_BYTES} bytes after decompression")
+            out.write(chunk)
+    return written
+
+
+def batch_dir(job_id: str) -> Path:
+    return settings.UPLOAD_DIR / "batches" / job_id
+
+
+def stage_batch(files: list[UploadFile], profile: list[tuple[str, list[dict]]], job_dir: Path) -> tuple[list[dict], list[str]]:
+    """把命中 profile 的文件逐个复制到暂存目录（API 与 worker 共享），返回 (待校验文件, 跳过的文件名)
+
+    未命中任何规则的文件不落盘。超过文件数或解压后总字节数上限时报错并清理暂存目录。
+    """
+    job_dir.mkdir(parents=True, exist_ok=True)
+    staged, skipped = [], []
+    budget = settings.VALIDATION_BATCH_MAX_BYTES
+    try:
+        for file in files:
+            for name, stream in iter_members(file):
+                checks = checks_for(name, profile)
+                if not checks:
+                    skipped.append(name)
+                    continue
+                if len(staged) >= settings.VALIDATION_BATCH_MAX_FILES:
+                    raise ValueError(f"Batch exceeds {settings.VALIDATION_BATCH_MAX_FILES} files")
+                # 暂存文件名只取成员的文件名部分并加序号，避免重名与路径穿越
+                path = job_dir / f"{len(staged):04d}_{PurePosixPath(name).name}"
+                budget -= _copy_limited(stream, path, budget)
+                staged.append({"name": name, "path": str(path), "checks": checks})
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise ValueError(f"Invalid archive: {e}") from e
+    except Exception:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+    return staged, skipped
+
+
+def upload_size(file: UploadFile) -> int:
+    """上传文件的字节数，无需解析内容"""
+    if file.size is not None:
+        return file.size
+    position = file.file.tell()
+    file.file.seek(0, 2)
+    size = file.file.tell()
+    file.file.seek(position)
+    return size
+
+
+def stage_upload(file: UploadFile, job_dir: Path) -> str:
+    """把 full 模式的大文件原样复制到暂存目录（API 与 bulk worker 共享），返回暂存路径"""
+    job_dir.mkdir(parents=True, exist_ok=True)
+    # 与 stage_batch 相同加序号前缀，避免文件名为空或 .. 等
+    path = job_dir / f"0000_{PurePosixPath(file.filename or 'upload').name}"
+    try:
+        file.file.seek(0)
+        _copy_limited(file.file, path, settings.VALIDATION_BATCH_MAX_BYTES)
+    except Exception:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+    return str(path)
+
+
+def discard_batch(job_id: str) -> None:
+    shutil.rmtree(batch_dir(job_id), ignore_errors=True)
+
+
+def validate_staged_file(path: str, name: str, checks: list[dict], chunk_rows: int) -> tuple[dict, list[tuple[str, float]]]:
+    """流式读取暂存文件，一次遍历完成全部规则的校验
+
+    checks 中每项含 rule_id、pattern、engine、column；返回 (文件结果, 各规则的 (实际引擎, 匹配耗时))。
+    """
+    from app.utils.file_parsers import iter_file_chunks, native_value
+    from app.utils.matching import get_column_matcher
+
+    columns = None
+    if all(check["column"] for check in checks):
+        columns = list(dict.fromkeys(check["column"] for check in checks))
+    matchers = [get_column_matcher(check["pattern"], check["engine"]) for check in checks]
+    states = [{"rule_id": check["rule_id"], "column": check["column"], "invalid_count": 0, "invalid_samples": []}
+              for check in checks]
+    seconds = [0.0] * len(checks)
+    rows = 0
+    with open(path, "rb") as f:
+        upload = UploadFile(f, filename=PurePosixPath(name).name)
+        for chunk in iter_file_chunks(upload, chunk_rows, columns):
+            for index, (state, matcher) in enumerate(zip(states, matchers)):
+                column = state["column"] = state["column"] or chunk.columns[0]
+                if column not in chunk.columns:
+                    raise ValueError(f"Unknown column: {column}")
+                start = time.perf_counter()
+                mask = matcher.match(chunk[column])
+                seconds[index] += time.perf_counter() - start
+                invalid = (~mask).nonzero()[0]
+                state["invalid_count"] += len(invalid)
+                for position in invalid[:MAX_INVALID_SAMPLES - len(state["invalid_samples"])]:
+                    # 结果经 msgpack 存入 Celery 后端，numpy 标量与 Timestamp 需转为原生类型
+                    state["invalid_samples"].append({"row": rows + int(position),
+                                                     "value": native_value(chunk[column].iloc[position])})
+            rows += len(chunk)
+    for state in states:
+        state["passed"] = state["invalid_count"] == 0
+    return {
+        "file": name,
+        "rows": rows,
+        "passed": all(state["passed"] for state in states),
+        "checks": states,
+    }, [(matcher.engine, elapsed) for matcher, elapsed in zip(matchers, seconds)]
+
+
+def register_batch(job_id: str, files: int, skipped: list[str]) -> None:
+    """记录批次元数据与未完成文件数；Redis 不可用时只记录警告，报告中缺少跳过的文件"""
+    ttl = settings.VALIDATION_INFLIGHT_TTL_SECONDS
+    try:
+        with get_redis().pipeline() as pipe:
+            pipe.set(BATCH_KEY.format(job_id=job_id), json.dumps({"skipped": skipped}), ex=ttl)
+            pipe.set(REMAINING_KEY.format(job_id=job_id), files, ex=ttl)
+            pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not register batch {job_id}: {e}")
+
+
+def batch_metadata(job_id: str) -> Optional[dict]:
+    try:
+        raw = get_redis().get(BATCH_KEY.format(job_id=job_id))
+    except Exception as e:
+        logger.warning(f"Could not read batch {job_id}: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+
+def forget_batch(job_id: str) -> None:
+    try:
+        get_redis().delete(BATCH_KEY.format(job_id=job_id))
+    except Exception as e:
+        logger.warning(f"Could not delete batch {job_id}: {e}")
+
+
+def finish_batch_file(job_id: str, path: str, owner: Optional[str]) -> None:
+    """单个文件校验结束：删除暂存文件；批次最后一个文件结束时归还提交者的在途名额并删除暂存目录"""
+    Path(path).unlink(missing_ok=True)
+    key = REMAINING_KEY.format(job_id=job_id)
+    try:
+        remaining = get_redis().decr(key)
+        if remaining <= 0:
+            get_redis().delete(key)
+    except Exception as e:
+        logger.warning(f"Could not update batch {job_id}: {e}")
+        return
+    # 小于 0 说明批次未登记成功，无法判断其他文件是否结束；各文件已自行删除，只会留下空目录
+    if remaining == 0:
+        release_validation(owner)
+        discard_batch(job_id)
+
+
+def summarize(results: list[dict], skipped: list[str]) -> dict:
+    """汇总各文件结果为批次报告"""
+    errors = [r for r in results if "error" in r]
+    checked = [r for r in results if "error" not in r]
+    return {
+        "files": len(results),
+        "passed": sum(r["passed"] for r in checked),
+        "failed": sum(not r["passed"] for r in checked),
+        "errors": len(errors),
+        "rows": sum(r["rows"] for r in checked),
+        "invalid_count": sum(c["invalid_count"] for r in checked for c in r["checks"]),
+        "results": results,
+        "skipped": skipped,
+    }
@@ -0,0 +1,121 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，缺失时只提供 gzip
+    brotli = None
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """按 Accept-Encoding 协商压缩算法，同等权重下优先 br"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best = max(candidates, key=lambda c: (weights.get(c, weights.get("*", 0.0)), c == "br"))
+    return best if weights.get(best, weights.get("*", 0.0)) > 0 else None
+
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        # wbits=31 输出带 gzip 头的数据流
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """按客户端协商结果对响应做 gzip / brotli 压缩，支持流式响应
+
+    小于 minimum_size 的单块响应和已设置 Content-Encoding 的响应保持原样。
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = dict(scope.get("headers") or []).get(b"accept-encoding", b"").decode("latin-1")
+        encoding = choose_encoding(accept) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = [(k, v) for k, v in start_message.get("headers", [])]
+                names = {k.lower() for k, _ in headers}
+                if b"content-encoding" in names or (not more_body and len(body) < self.minimum_size):
+                    await send(start_message)
+                    start_message = None
+                    await send(message)
+                    return
+                compressor = (
+                    _BrotliCompressor(self.brotli_quality) if encoding == "br"
+                    else _GzipCompressor(self.gzip_level)
+                )
+                headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+                headers.append((b"content-encoding", encoding.encode()))
+                headers.append((b"vary", b"Accept-Encoding"))
+                chunk = compressor.compress(body)
+                if not more_body:
+                    chunk += compressor.flush()
+                    headers.append((b"content-length", str(len(chunk)).encode()))
+                await send({**start_message, "headers": headers})
+                start_message = None
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                return
+
+            if compressor is None:
+                await send(message)
+                return
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.flush()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+        if start_message is not None:
+            # 无响应体的响应（如 304）
+            await send(start_message)
@@ -1,16 +1,31 @@
+import asyncio
+import hashlib
 import httpx
 from selectolax.parser import HTMLParser
 import json
+import random
+import time
+from dataclasses import dataclass
 from datetime import datetime
-from sqlmodel import Session, select
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterable, Awaitable, Callable, Optional
+from urllib.parse import urljoin, urlsplit
+from sqlmodel import Session
 from app.database import engine
-from app.models import Rule
-import re
+from app.models import CrawlState, RuleCreate
+from app import crud
 import logging
 from app.config import settings
+from app.utils.extraction import ExtractionResult, MultiPatternExtractor
 
 logger = logging.getLogger(__name__)
 
+# 流式读取响应体的回调：接收文本块的异步迭代器
+Consumer = Callable[[AsyncIterable[str]], Awaitable[Any]]
+
+USER_AGENT = "BioRegex-Hub crawler (+https://github.com/Francis-Li20250603/BioRegex-Hub)"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
 # FDA-specific regex patterns
 FDA_PATTERNS = {
     "PATIENT_ID": r"\b[A-Z]{3}\d{5}\b",
@@ -25,91 +40,316 @@ EMA_PATTERNS = {
     "PRODUCT_CODE": r"\bEMEA/\d{5}/\d{4}\b"
 }
 
+REGION_PATTERNS = {"FDA": FDA_PATTERNS, "EMA": EMA_PATTERNS}
+REGION_EXTRACTORS = {region: MultiPatternExtractor(patterns) for region, patterns in REGION_PATTERNS.items()}
+
+def _region(region: str) -> str:
+    return "FDA" if region == "FDA" else "EMA"
+
+def matched_patterns(result: ExtractionResult, region: str) -> list:
+    patterns = REGION_PATTERNS[_region(region)]
+    return [
+        {
+            "pattern": patterns[data_type],
+            "data_type": data_type,
+            "region": region,
+            "count": result.counts[data_type],
+            "offsets": result.offsets[data_type],
+        }
+        for data_type in result.found()
+    ]
+
 def extract_regex_from_text(text: str, region: str) -> list:
-    patterns = FDA_PATTERNS if region == "FDA" else EMA_PATTERNS
-    found_patterns = []
-    
-    for data_type, pattern in patterns.items():
-        if re.search(pattern, text):
-            found_patterns.append({
-                "pattern": pattern,
-                "data_type": data_type,
-                "region": region
-            })
-    
-    return found_patterns
+    return matched_patterns(REGION_EXTRACTORS[_region(region)].extract(text), region)
 
-def crawl_fda():
-    logger.info("Starting FDA crawl")
-    try:
-        response = httpx.get(settings.FDA_GUIDANCE_URL, timeout=30)
-        if response.status_code != 200:
-            logger.error(f"FDA site returned {response.status_code}")
+@dataclass
+class DocumentDigest:
+    content_hash: str
+    extraction: ExtractionResult
+
+async def digest_document(chunks: AsyncIterable[str], extractor: MultiPatternExtractor) -> DocumentDigest:
+    """单遍读取文档流：同时计算内容指纹并提取所有模式，不在内存中保留全文"""
+    sha = hashlib.sha256()
+    scanner = extractor.scanner()
+    async for chunk in chunks:
+        sha.update(chunk.encode("utf-8"))
+        scanner.feed(chunk)
+    return DocumentDigest(sha.hexdigest(), scanner.finish())
+
+@dataclass
+class FetchResult:
+    url: str
+    status_code: int
+    text: str = ""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    data: Any = None  # 流式读取时 consume 的返回值
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+
+class ValidatorCache:
+    """按 URL 记录上次响应的 ETag / Last-Modified，用于条件请求"""
+
+    def __init__(self):
+        self._validators: dict[str, tuple[Optional[str], Optional[str]]] = {}
+
+    @classmethod
+    def from_states(cls, states: dict[str, CrawlState]) -> "ValidatorCache":
+        cache = cls()
+        for url, state in states.items():
+            cache.update(url, state.etag, state.last_modified)
+        return cache
+
+    def get(self, url: str) -> tuple[Optional[str], Optional[str]]:
+        return self._validators.get(url, (None, None))
+
+    def update(self, url: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        if etag or last_modified:
+            self._validators[url] = (etag, last_modified)
+
+
+class HostRateLimiter:
+    """每个站点的请求间隔不小于 1 / rate 秒"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_slot: dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, host: str) -> None:
+        if not self.interval:
             return
-        
-        tree = HTMLParser(response.text)
-        documents = []
-        
-        # Extract document links - example selector
-        for item in tree.css('.fda-guidance-list-item'):
-            title = item.css_first('h3 a').text().strip()
-            link = "https://www.fda.gov" + item.css_first('h3 a').attrs['href']
-            date_str = item.css_first('.date').text().strip()
-            pub_date = datetime.strptime(date_str, '%B %d, %Y').date()
-            documents.append({"title": title, "url": link, "date": pub_date})
-        
-        # Process each document
-        new_rules = []
-        with Session(engine) as db:
-            for doc in documents[:5]:  # Limit for demo
-                # Skip if already exists
-                existing = db.exec(
-                    select(Rule).where(Rule.reference_url == doc['url'])
-                ).first()
-                if existing:
-                    continue
-                
-                # Download document content
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncCrawler:
+    """共享连接池的异步抓取器：并发上限、按站点限速、指数退避重试与条件 GET
+
+    用法::
+
+        async with AsyncCrawler() as crawler:
+            results = await crawler.fetch_all(urls)
+    """
+
+    def __init__(
+        self,
+        cache: ValidatorCache | None = None,
+        concurrency: int | None = None,
+        per_host_rate: float | None = None,
+        max_retries: int | None = None,
+        backoff: float | None = None,
+        timeout: float | None = None,
+    ):
+        self.cache = cache if cache is not None else ValidatorCache()
+        self.concurrency = concurrency or settings.CRAWL_CONCURRENCY
+        self.max_retries = settings.CRAWL_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = settings.CRAWL_BACKOFF_SECONDS if backoff is None else backoff
+        self.timeout = timeout or settings.CRAWL_TIMEOUT_SECONDS
+        self.rate_limiter = HostRateLimiter(settings.CRAWL_PER_HOST_RATE if per_host_rate is None else per_host_rate)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._client: httpx.AsyncClient | None = None
+
+    async def __aenter__(self) -> "AsyncCrawler":
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._client.aclose()
+        self._client = None
+
+    async def fetch(
+        self, url: str, conditional: bool = True, consume: Consumer | None = None
+    ) -> FetchResult | None:
+        """获取单个 URL；未变化时返回 304 结果，重试耗尽后返回 None
+
+        指定 consume 时以流式方式读取响应体：consume 接收文本块的异步迭代器，
+        其返回值存入 FetchResult.data，全文不会整体载入内存。
+        """
+        headers = {}
+        if conditional:
+            etag, last_modified = self.cache.get(url)
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        host = urlsplit(url).netloc
+        for attempt in range(self.max_retries + 1):
+            delay = self.backoff * 2 ** attempt * (1 + random.random() / 2)
+            async with self._semaphore:
+                await self.rate_limiter.wait(host)
                 try:
-                    doc_resp = httpx.get(doc['url'], timeout=30)
-                    if doc_resp.status_code == 200:
-                        doc_text = doc_resp.text[:10000]  # First 10k chars
-                        patterns = extract_regex_from_text(doc_text, "FDA")
-                        
-                        for pattern in patterns:
-                            rule = Rule(
-                                pattern=pattern["pattern"],
-                                description=f"Auto-generated from FDA guidance: {doc['title']}",
-                                data_type=pattern["data_type"],
-                                region="FDA",
-                                reference_url=doc['url']
-                            )
-                            new_rules.append(rule)
-                except Exception as e:
-                    logger.error(f"Error processing FDA doc {doc['url']}: {str(e)}")
-            
-            # Add new rules to database
-            for rule in new_rules:
-                db.add(rule)
+                    async with self._client.stream("GET", url, headers=headers) as response:
+                        if response.status_code not in RETRY_STATUSES:
+                            return await self._result(url, response, consume)
+                        logger.warning(f"{url} returned {response.status_code} (attempt {attempt + 1})")
+                        delay = _retry_after(response) or delay
+                except httpx.TransportError as e:
+                    logger.warning(f"Fetching {url} failed (attempt {attempt + 1}): {e}")
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+        logger.error(f"Giving up on {url} after {self.max_retries + 1} attempts")
+        return None
+
+    async def fetch_all(
+        self, urls: list[str], conditional: bool = True, consume: Consumer | None = None
+    ) -> list[FetchResult | None]:
+        return await asyncio.gather(*(self.fetch(url, conditional, consume) for url in urls))
+
+    async def _result(self, url: str, response: httpx.Response, consume: Consumer | None) -> FetchResult:
+        result = FetchResult(
+            url=url,
+            status_code=response.status_code,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        if response.status_code == 200:
+            if consume is not None:
+                result.data = await consume(response.aiter_text())
+            else:
+                await response.aread()
+                result.text = response.text
+            self.cache.update(url, result.etag, result.last_modified)
+        return result
+
+def parse_fda_listing(html: str, base_url: str) -> list[dict]:
+    tree = HTMLParser(html)
+    documents = []
+    # Extract document links - example selector
+    for item in tree.css('.fda-guidance-list-item'):
+        title = item.css_first('h3 a').text().strip()
+        link = urljoin(base_url, item.css_first('h3 a').attrs['href'])
+        date_str = item.css_first('.date').text().strip()
+        pub_date = datetime.strptime(date_str, '%B %d, %Y').date()
+        documents.append({"title": title, "url": link, "date": pub_date})
+    return documents
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+async def crawl_documents(crawler: AsyncCrawler, documents: list[dict], source: str) -> list:
+    """增量处理文档列表：按批读取爬虫状态与已有规则（各一次集合查询）
+
+    文档以流式方式完整扫描（不再截取前 10k 字符），条件请求返回 304 或内容指纹未变的文档只更新 last_seen，其余文档提取规则后与状态一起提交。
+    """
+    extractor = REGION_EXTRACTORS[_region(source)]
+    new_rules = []
+    stats = {"documents": len(documents), "not_modified": 0, "unchanged": 0, "changed": 0, "failed": 0}
+    batch_size = settings.CRAWL_BATCH_SIZE
+    with Session(engine) as db:
+        for start in range(0, len(documents), batch_size):
+            batch = list({doc['url']: doc for doc in documents[start:start + batch_size]}.values())
+            urls = [doc['url'] for doc in batch]
+            states = crud.get_crawl_states(db, urls)
+            existing = crud.get_existing_rule_keys(db, urls)
+
+            crawler.cache = ValidatorCache.from_states(states)
+            results = await crawler.fetch_all(urls, consume=lambda chunks: digest_document(chunks, extractor))
+
+            now = datetime.utcnow()
+            batch_rules = []
+            for doc, result in zip(batch, results):
+                state = states.get(doc['url'])
+                if state is None:
+                    state = CrawlState(url=doc['url'], source=source)
+                    db.add(state)
+                state.last_seen = now
+                if result is None or (result.status_code != 200 and not result.not_modified):
+                    stats["failed"] += 1
+                    continue
+                if result.not_modified:
+                    stats["not_modified"] += 1
+                    continue
+
+                state.etag, state.last_modified = result.etag, result.last_modified
+                digest: DocumentDigest = result.data
+                if digest.content_hash == state.content_hash:
+                    stats["unchanged"] += 1
+                    continue
+                stats["changed"] += 1
+                state.content_hash = digest.content_hash
+                state.last_changed = now
+
+                for pattern in matched_patterns(digest.extraction, source):
+                    key = (doc['url'], pattern["pattern"])
+                    if key in existing:
+                        continue
+                    existing.add(key)
+                    batch_rules.append(RuleCreate(
+                        pattern=pattern["pattern"],
+                        description=f"Auto-generated from {source} guidance: {doc['title']}",
+                        data_type=pattern["data_type"],
+                        region=source,
+                        reference_url=doc['url']
+                    ))
+
+            # 规则与爬虫状态在同一事务中提交，中断后下次从未提交的批次继续
+            crud.insert_rules(db, batch_rules)
             db.commit()
-            
-        logger.info(f"Found {len(new_rules)} new rules from FDA")
-        return new_rules
+            new_rules.extend(batch_rules)
+
+    logger.info(f"{source} crawl: {stats}, {len(new_rules)} new rules")
+    return new_rules
+
+async def crawl_fda_async(crawler: AsyncCrawler) -> list:
+    listing = await crawler.fetch(settings.FDA_GUIDANCE_URL, conditional=False)
+    if listing is None or listing.status_code != 200:
+        logger.error(f"FDA site returned {listing.status_code if listing else 'no response'}")
+        return []
+    documents = parse_fda_listing(listing.text, settings.FDA_GUIDANCE_URL)
+    return await crawl_documents(crawler, documents, "FDA")
+
+async def _crawl_with(crawl) -> list:
+    async with AsyncCrawler() as crawler:
+        return await crawl(crawler)
+
+def crawl_fda():
+    logger.info("Starting FDA crawl")
+    try:
+        return asyncio.run(_crawl_with(crawl_fda_async))
     except Exception as e:
         logger.exception("Error in FDA crawl")
         return []
 
+async def crawl_ema_async(crawler: AsyncCrawler) -> list:
+    response = await crawler.fetch(settings.EMA_GUIDANCE_URL, conditional=False)
+    if response is None or response.status_code != 200:
+        logger.error(f"EMA site returned {response.status_code if response else 'no response'}")
+        return []
+
+    # EMA site parsing would be implemented similarly
+    # Placeholder implementation
+    return []
+
 def crawl_ema():
     logger.info("Starting EMA crawl")
     try:
-        response = httpx.get(settings.EMA_GUIDANCE_URL, timeout=30)
-        if response.status_code != 200:
-            logger.error(f"EMA site returned {response.status_code}")
-            return
-        
-        # EMA site parsing would be implemented similarly
-        # Placeholder implementation
-        return []
+        return asyncio.run(_crawl_with(crawl_ema_async))
     except Exception as e:
         logger.exception("Error in EMA crawl")
         return []
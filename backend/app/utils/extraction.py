@@ -0,0 +1,183 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import AsyncIterable, Iterable
+
+from app.config import settings
+from app.utils.patterns import C, pattern_width, sre_parse
+
+logger = logging.getLogger(__name__)
+
+# 目录规则面向单元格取值（fullmatch），在整篇文档中查找时去掉首尾锚点
+_LEADING_ANCHOR = re.compile(r"^(\^|\\A)+")
+_TRAILING_ANCHOR = re.compile(r"(?<!\\)(\$|\\Z)+$")
+
+
+def strip_anchors(pattern: str) -> str:
+    return _TRAILING_ANCHOR.sub("", _LEADING_ANCHOR.sub("", pattern))
+
+
+def _has_backref(items) -> bool:
+    for op, av in items:
+        if op in (C.GROUPREF, C.GROUPREF_EXISTS):
+            return True
+        children = av if isinstance(av, (list, tuple)) else ()
+        for child in children:
+            nested = child if isinstance(child, list) else [child]
+            if any(isinstance(c, sre_parse.SubPattern) and _has_backref(c) for c in nested):
+                return True
+    return False
+
+
+def _combinable(pattern: str) -> bool:
+    """含命名组、反向引用或全局内联标志的模式放入交替后会出错或改变语义，需单独扫描"""
+    try:
+        parsed = sre_parse.parse(pattern)
+        re.compile(f"(?:{pattern})")
+    except re.error:
+        return False
+    return not parsed.state.groupdict and not _has_backref(parsed)
+
+
+@dataclass
+class ExtractionResult:
+    """每个模式的命中次数与（最多 max_offsets 个）命中位置 (start, end)"""
+    counts: dict[str, int]
+    offsets: dict[str, list[tuple[int, int]]]
+    characters: int = 0
+
+    def found(self) -> list[str]:
+        return [name for name, count in self.counts.items() if count]
+
+
+@dataclass
+class _Scan:
+    regex: re.Pattern
+    groups: dict[str, str] = field(default_factory=dict)  # 合并扫描：组名 -> 模式名
+    name: str | None = None  # 单独扫描的模式名
+
+    def pattern_name(self, match: re.Match) -> str:
+        return self.groups[match.lastgroup] if self.groups else self.name
+
+
+class MultiPatternExtractor:
+    """将一组模式合并为一个带命名组的交替正则，对文本做单遍扫描
+
+    命中语义与 ``finditer`` 相同：从左到右、互不重叠，同一位置按声明顺序取第一个命中的模式。
+    independent=True 时每个模式各自扫描（仍只读一遍输入），计数与逐个 ``finditer`` 一致，
+    适用于模式之间大量重叠、需要各自统计的场景（如全目录扫描）。
+    输入可以是完整字符串，也可以是文本块的（异步）迭代器；分块扫描时保留
+    “最长可能命中 + 1” 个字符的重叠窗口，命中延伸到窗口内（可能随后续输入变长）时
+    从其起点保留到下一块再判定，因此 ``\\d+`` 这类连续命中不会在块边界被拆开，
+    内存占用取决于最长命中而非文档大小。
+    无上界模式的窗口按 max_match_length 截断：命中需要看到起点之后超过该长度的文本才能成立时
+    （如 ``\\d+x`` 中很长的数字串之后才出现 x），分块扫描可能只报告其后半段。
+    """
+
+    def __init__(self, patterns: dict[str, str], flags: int = 0, independent: bool = False,
+                 max_offsets: int | None = None, max_match_length: int | None = None):
+        self.names = list(patterns)
+        self.max_offsets = settings.EXTRACTION_MAX_OFFSETS if max_offsets is None else max_offsets
+        limit = max_match_length or settings.EXTRACTION_MAX_MATCH_LENGTH
+        # 无上界模式（如 \d+）的窗口按 limit 截断，见类说明
+        self.window = min(max((pattern_width(p)[1] for p in patterns.values()), default=0), limit) + 1
+
+        combined, separate = {}, []
+        for index, (name, pattern) in enumerate(patterns.items()):
+            if not independent and _combinable(pattern):
+                combined[f"p{index}"] = (name, pattern)
+                continue
+            try:
+                separate.append(_Scan(re.compile(pattern, flags), name=name))
+            except re.error as e:
+                logger.warning(f"Skipping invalid pattern {name}: {e}")
+        self.scans = separate
+        if combined:
+            regex = re.compile(
+                "|".join(f"(?P<{group}>{pattern})" for group, (_, pattern) in combined.items()), flags
+            )
+            self.scans.insert(0, _Scan(regex, groups={group: name for group, (name, _) in combined.items()}))
+
+    @classmethod
+    def from_rules(cls, rules: Iterable[dict], **kwargs) -> "MultiPatternExtractor":
+        """以规则目录构建，模式名为 ``rule:<id>``，各规则独立计数"""
+        patterns = {f"rule:{rule['id']}": strip_anchors(rule["pattern"]) for rule in rules}
+        return cls(patterns, independent=True, **kwargs)
+
+    def scanner(self) -> "PatternScanner":
+        return PatternScanner(self)
+
+    def extract(self, text: str) -> ExtractionResult:
+        scanner = self.scanner()
+        scanner.feed(text)
+        return scanner.finish()
+
+    def extract_stream(self, chunks: Iterable[str]) -> ExtractionResult:
+        scanner = self.scanner()
+        for chunk in chunks:
+            scanner.feed(chunk)
+        return scanner.finish()
+
+    async def extract_async(self, chunks: AsyncIterable[str]) -> ExtractionResult:
+        scanner = self.scanner()
+        async for chunk in chunks:
+            scanner.feed(chunk)
+        return scanner.finish()
+
+
+class PatternScanner:
+    """增量扫描状态：feed() 逐块输入，finish() 返回结果"""
+
+    def __init__(self, extractor: MultiPatternExtractor):
+        self.extractor = extractor
+        self.counts = {name: 0 for name in extractor.names}
+        self.offsets = {name: [] for name in extractor.names}
+        # 每个扫描各自保留尾部缓冲：buffer[context:] 为待扫描文本，前 context 个字符仅供 \b、后行断言参考
+        self._buffers = [("", 0) for _ in extractor.scans]
+        self._bases = [0 for _ in extractor.scans]  # 各缓冲区起点在文档中的偏移
+        self.characters = 0
+
+    def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+        self.characters += len(chunk)
+        for index in range(len(self.extractor.scans)):
+            self._scan(index, chunk, final=False)
+
+    def finish(self) -> ExtractionResult:
+        for index in range(len(self.extractor.scans)):
+            self._scan(index, "", final=True)
+        return ExtractionResult(self.counts, self.offsets, self.characters)
+
+    def _scan(self, index: int, chunk: str, final: bool) -> None:
+        scan = self.extractor.scans[index]
+        window = self.extractor.window
+        buffer, context = self._buffers[index]
+        buffer += chunk
+        base = self._bases[index]
+        # 起点在 safe 之前、终点之后还有 window 个字符的命中不会因后续输入而改变；
+        # 终点落在末尾窗口内的命中（如 \d+ 读到块末尾）可能继续延伸，从其起点留到下一块
+        safe = len(buffer) if final else len(buffer) - window
+        resume = context
+        pending = None
+        for match in scan.regex.finditer(buffer, context):
+            start, end = match.span()
+            if start >= safe:
+                break
+            if not final and end > safe:
+                pending = start
+                break
+            resume = end
+            if start == end:
+                continue
+            name = scan.pattern_name(match)
+            self.counts[name] += 1
+            if len(self.offsets[name]) < self.extractor.max_offsets:
+                self.offsets[name].append((base + start, base + end))
+        if final:
+            self._buffers[index] = ("", 0)
+            return
+        cut = pending if pending is not None else max(resume, safe, context)
+        keep = min(cut, window)
+        self._buffers[index] = (buffer[cut - keep:], keep)
+        self._bases[index] = base + cut - keep
@@ -1,15 +1,53 @@
-import pandas as pd
+from __future__ import annotations
+
 from pathlib import Path
-import pyreadstat
-from lxml import etree
+from typing import TYPE_CHECKING, Iterator, Optional
 from fastapi import UploadFile
+import datetime
 import io
-import magic
 import logging
+import shutil
+import tempfile
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+def normalize_column(name) -> str:
+    return str(name).strip().lower().replace(' ', '_')
+
+def native_value(value):
+    """单元格取值转为 JSON / msgpack 可直接序列化的 Python 原生类型
+
+    缺失值（NaN / NaT）为 None，日期时间转 ISO 字符串，numpy 标量取 .item()，其他类型转字符串。
+    """
+    import numpy as np
+    import pandas as pd
+
+    if value is None or value is pd.NaT or (isinstance(value, (float, np.floating)) and np.isnan(value)):
+        return None
+    if isinstance(value, np.datetime64):
+        value = pd.Timestamp(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, pd.Timedelta):
+        return str(value)
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+def native_records(df: pd.DataFrame) -> list[dict]:
+    """DataFrame 转为记录列表，键与值均为原生类型（供 ORJSONResponse 与任务结果使用）"""
+    return [{str(key): native_value(value) for key, value in record.items()} for record in df.to_dict(orient="records")]
+
 async def parse_file(file: UploadFile) -> pd.DataFrame:
+    # 解析依赖较重（pandas / pyreadstat / lxml / libmagic），首次上传时才加载，加快进程启动
+    import magic
+    import pandas as pd
+
     suffix = Path(file.filename).suffix.lower()
     file_content = await file.read()
     file_io = io.BytesIO(file_content)
@@ -19,6 +57,8 @@ async def parse_file(file: UploadFile) -> pd.DataFrame:
     
     try:
         if 'sas' in file_type or suffix == '.sas7bdat':
+            import pyreadstat
+
             df, _ = pyreadstat.read_sas7bdat(file_io)
         elif 'csv' in file_type or suffix == '.csv':
             df = pd.read_csv(file_io)
@@ -26,6 +66,8 @@ async def parse_file(file: UploadFile) -> pd.DataFrame:
             df = pd.read_excel(file_io)
         elif 'xml' in file_type or suffix == '.xml':
             # For SDTM XML
+            from lxml import etree
+
             tree = etree.parse(file_io)
             root = tree.getroot()
             
@@ -43,9 +85,100 @@ async def parse_file(file: UploadFile) -> pd.DataFrame:
         
         # Basic data cleaning
         df = df.dropna(how='all', axis=1)  # Remove empty columns
-        df = df.rename(columns=lambda x: x.strip().lower().replace(' ', '_'))
+        df = df.rename(columns=normalize_column)
         
         return df
     except Exception as e:
         logger.error(f"Error parsing file: {str(e)}")
         raise ValueError(f"Failed to parse file: {file.filename} ({file_type})") from e
+
+def detect_file_kind(file: UploadFile) -> str:
+    """按文件头与后缀判断格式：sas / csv / excel / xml"""
+    import magic
+
+    suffix = Path(file.filename or "").suffix.lower()
+    head = file.file.read(1024)
+    file.file.seek(0)
+    file_type = magic.from_buffer(head, mime=True)
+    if 'sas' in file_type or suffix == '.sas7bdat':
+        return "sas"
+    if 'csv' in file_type or suffix == '.csv':
+        return "csv"
+    if 'excel' in file_type or suffix in ['.xls', '.xlsx']:
+        return "excel"
+    if 'xml' in file_type or suffix == '.xml':
+        return "xml"
+    raise ValueError(f"Unsupported file type: {file_type}")
+
+def _select(df: pd.DataFrame, columns: Optional[list[str]]) -> pd.DataFrame:
+    df = df.rename(columns=normalize_column)
+    if columns is None:
+        return df
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Unknown column: {missing[0]}")
+    return df[columns]
+
+def _csv_chunks(stream, chunk_rows: int, columns: Optional[list[str]]) -> Iterator[pd.DataFrame]:
+    import pandas as pd
+
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = lambda name: normalize_column(name) in wanted
+    # 按原始文本校验：各块单独推断类型时同一列可能得到不同结果（如 "007" 与 7）
+    reader = pd.read_csv(stream, chunksize=chunk_rows, usecols=usecols, dtype=str)
+    for chunk in reader:
+        yield _select(chunk, columns)
+
+def _sas_chunks(stream, chunk_rows: int, columns: Optional[list[str]]) -> Iterator[pd.DataFrame]:
+    import pyreadstat
+
+    # pyreadstat 只能按路径分块读取，先把上传内容顺序拷贝到临时文件
+    with tempfile.NamedTemporaryFile(suffix=".sas7bdat") as tmp:
+        shutil.copyfileobj(stream, tmp)
+        tmp.flush()
+        for chunk, _ in pyreadstat.read_file_in_chunks(pyreadstat.read_sas7bdat, tmp.name, chunksize=chunk_rows):
+            yield _select(chunk, columns)
+
+def _xml_chunks(stream, chunk_rows: int, columns: Optional[list[str]]) -> Iterator[pd.DataFrame]:
+    import pandas as pd
+    from lxml import etree
+
+    records = []
+    for _, item in etree.iterparse(stream, tag="ItemData"):
+        records.append({child.tag: child.text for child in item})
+        # 处理完的元素及其已解析的前驱立即释放，内存只与块大小有关
+        item.clear()
+        while item.getprevious() is not None:
+            del item.getparent()[0]
+        if len(records) >= chunk_rows:
+            yield _select(pd.DataFrame(records), columns)
+            records = []
+    if records:
+        yield _select(pd.DataFrame(records), columns)
+
+def _excel_chunks(stream, chunk_rows: int, columns: Optional[list[str]]) -> Iterator[pd.DataFrame]:
+    import pandas as pd
+
+    # Excel 无法流式读取，整表读入后按块切分
+    df = _select(pd.read_excel(stream), columns)
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+_CHUNK_READERS = {"csv": _csv_chunks, "sas": _sas_chunks, "xml": _xml_chunks, "excel": _excel_chunks}
+
+def iter_file_chunks(file: UploadFile, chunk_rows: int, columns: Optional[list[str]] = None) -> Iterator[pd.DataFrame]:
+    """逐块读取上传文件（同步生成器，应在线程池中消费），每块最多 chunk_rows 行
+
+    列名与 parse_file 一样规范化；columns 为规范化后的列名，只读取这些列。
+    调用方可随时停止迭代，剩余内容不会被解析。
+    """
+    kind = detect_file_kind(file)
+    try:
+        yield from _CHUNK_READERS[kind](file.file, chunk_rows, columns)
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error(f"Error parsing file: {str(e)}")
+        raise ValueError(f"Failed to parse file: {file.filename} ({kind})") from e
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from itertools import compress
+from typing import TYPE_CHECKING, Iterable
+
+from app.utils.patterns import fixed_width_tables
+from app.utils.regex_engine import compile_rule
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 定宽快速路径每批处理的行数，限制 (行数 × 宽度) 字节矩阵的内存占用
+FIXED_WIDTH_CHUNK_ROWS = 65536
+
+
+def as_strings(values: Iterable) -> list[str]:
+    """与 ``str(x)`` / ``astype(str)`` 一致的字符串化（缺失值为 "nan" / "None"）"""
+    return [value if isinstance(value, str) else str(value) for value in values]
+
+
+class ColumnMatcher:
+    """对一整列取值做 ``fullmatch``，返回布尔掩码
+
+    定宽字符类序列模式（如 ``^\\d{4}-\\d{2}-\\d{2}$``）走向量化路径：先按长度筛选，
+    再把等长的 ASCII 取值拼成定宽字节矩阵，逐位置查取值表。含非 ASCII 字符的行以及
+    其他模式按规则的 engine 由 re 或 RE2 逐个判定（见 regex_engine），结果与 ``re.fullmatch`` 完全一致。
+    """
+
+    def __init__(self, pattern: str, engine: str = "auto"):
+        self.pattern = pattern
+        self.rule = compile_rule(pattern, engine)
+        self.regex = self.rule.regex
+        self.tables = fixed_width_tables(pattern)
+        self._lookup = None
+
+    @property
+    def fixed_width(self) -> bool:
+        return self.tables is not None
+
+    @property
+    def engine(self) -> str:
+        """实际使用的匹配方式：numpy（定宽快速路径）、re2 或 re"""
+        return "numpy" if self.tables is not None else self.rule.engine
+
+    def match(self, values: Iterable) -> "np.ndarray":
+        import numpy as np
+
+        if hasattr(values, "tolist"):
+            values = values.tolist()
+        strings = as_strings(values)
+        if self.tables is None:
+            if self.rule.engine == "re":
+                fullmatch = self.regex.fullmatch
+                return np.fromiter((fullmatch(s) is not None for s in strings), dtype=bool, count=len(strings))
+            return np.fromiter(map(self.rule.fullmatch, strings), dtype=bool, count=len(strings))
+        mask = np.empty(len(strings), dtype=bool)
+        for start in range(0, len(strings), FIXED_WIDTH_CHUNK_ROWS):
+            chunk = strings[start:start + FIXED_WIDTH_CHUNK_ROWS]
+            mask[start:start + len(chunk)] = self._match_fixed_width(chunk)
+        return mask
+
+    def _match_fixed_width(self, strings: list[str]) -> "np.ndarray":
+        import numpy as np
+
+        width = len(self.tables)
+        # 长度不符的取值直接判为不匹配
+        ok = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings)) == width
+        if width == 0 or not ok.any():
+            return ok
+        candidates = strings if ok.all() else list(compress(strings, ok))
+        ascii_rows = np.fromiter(map(str.isascii, candidates), dtype=bool, count=len(candidates))
+        result = np.zeros(len(candidates), dtype=bool)
+        if ascii_rows.all():
+            result[:] = self._match_ascii(candidates)
+        else:
+            result[ascii_rows] = self._match_ascii(list(compress(candidates, ascii_rows)))
+            fullmatch = self.regex.fullmatch
+            for index in np.flatnonzero(~ascii_rows):
+                result[index] = fullmatch(candidates[index]) is not None
+        ok[ok] = result
+        return ok
+
+    def _match_ascii(self, strings: list[str]) -> "np.ndarray":
+        """等长 ASCII 取值拼接为 (行数, 宽度) 的字节矩阵，逐位置查表"""
+        import numpy as np
+
+        if self._lookup is None:
+            self._lookup = [np.frombuffer(table, dtype=bool) for table in self.tables]
+        codes = np.frombuffer("".join(strings).encode("ascii"), dtype=np.uint8).reshape(len(strings), len(self.tables))
+        ok = np.ones(len(strings), dtype=bool)
+        for position, table in enumerate(self._lookup):
+            ok &= table[codes[:, position]]
+        return ok
+
+
+@lru_cache(maxsize=256)
+def get_column_matcher(pattern: str, engine: str = "auto") -> ColumnMatcher:
+    return ColumnMatcher(pattern, engine)
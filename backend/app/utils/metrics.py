@@ -0,0 +1,152 @@
+import logging
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+)
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# 多进程部署（多个 uvicorn worker / Celery 子进程）时设置 PROMETHEUS_MULTIPROC_DIR 汇总各进程指标
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# 需要统计积压深度的 Celery 队列
+CELERY_QUEUES = ("validation-queue", "validation-bulk-queue", "crawl-queue")
+
+REQUEST_LATENCY = Histogram(
+    "bioregex_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+VALIDATION_ROWS = Counter(
+    "bioregex_validation_rows_total",
+    "Rows checked by the validation engine",
+    ["mode"],
+)
+VALIDATION_SECONDS = Counter(
+    "bioregex_validation_seconds_total",
+    "Time spent matching rows; rows/sec = rate(rows_total) / rate(seconds_total)",
+    ["mode"],
+)
+# 只按校验方式与实际引擎打标签，规则数不设上限，逐规则耗时写日志而不作为标签
+RULE_MATCH_SECONDS = Histogram(
+    "bioregex_rule_match_seconds",
+    "Time to match one column against a rule",
+    ["mode", "engine"],
+)
+PATTERN_CACHE_REQUESTS = Counter(
+    "bioregex_pattern_cache_requests_total",
+    "Compiled pattern cache lookups",
+    ["result"],
+)
+TASK_DURATION = Histogram(
+    "bioregex_celery_task_duration_seconds",
+    "Celery task runtime",
+    ["task", "state"],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, float("inf")),
+)
+
+
+def observe_validation(mode: str, engine: str, rows: int, seconds: float, rule_id=None) -> None:
+    VALIDATION_ROWS.labels(mode=mode).inc(rows)
+    VALIDATION_SECONDS.labels(mode=mode).inc(seconds)
+    RULE_MATCH_SECONDS.labels(mode=mode, engine=engine).observe(seconds)
+    logger.debug(f"Rule {rule_id} matched {rows} rows in {seconds:.4f}s (mode={mode}, engine={engine})")
+
+
+class DatabasePoolCollector:
+    """抓取时读取连接池状态"""
+
+    def collect(self):
+        from app.database import pool_stats
+
+        gauge = GaugeMetricFamily(
+            "bioregex_db_pool_connections", "Database pool connections by state", labels=["engine", "state"]
+        )
+        for engine_name, stats in pool_stats().items():
+            for state in ("size", "checkedin", "checkedout", "overflow"):
+                if state in stats:
+                    gauge.add_metric([engine_name, state], stats[state])
+        yield gauge
+
+
+class CeleryQueueCollector:
+    """抓取时通过 Redis LLEN 读取队列积压，broker 不可用时跳过"""
+
+    def collect(self):
+        gauge = GaugeMetricFamily(
+            "bioregex_celery_queue_depth", "Messages waiting in a Celery queue", labels=["queue"]
+        )
+        try:
+            for queue, depth in queue_depths().items():
+                gauge.add_metric([queue], depth)
+        except Exception as e:
+            logger.debug(f"Could not read Celery queue depth: {e}")
+        yield gauge
+
+
+def queue_depths(queues=CELERY_QUEUES) -> dict:
+    import redis
+    from app.config import settings
+
+    client = redis.Redis.from_url(settings.CELERY_BROKER_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+    with client.pipeline() as pipe:
+        for queue in queues:
+            pipe.llen(queue)
+        return dict(zip(queues, pipe.execute()))
+
+
+def build_registry() -> CollectorRegistry:
+    """构建导出用的 registry：多进程模式下汇总各进程文件，否则使用默认 registry"""
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(DatabasePoolCollector())
+        registry.register(CeleryQueueCollector())
+        return registry
+    return REGISTRY
+
+
+# 单进程模式下运行时指标直接挂到默认 registry
+if not MULTIPROC_DIR:
+    REGISTRY.register(DatabasePoolCollector())
+    REGISTRY.register(CeleryQueueCollector())
+
+
+def render_metrics() -> tuple[bytes, str]:
+    return generate_latest(build_registry()), CONTENT_TYPE_LATEST
+
+
+class PrometheusMiddleware:
+    """记录每个请求的耗时，按路由模板（而非实际路径）打标签以控制基数"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code),
+            ).observe(time.perf_counter() - start)
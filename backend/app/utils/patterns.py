@@ -0,0 +1,518 @@
+import hashlib
+import json
+import random
+import re
+import subprocess
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants, _compiler as sre_compile
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+    import sre_compile
+
+C = sre_constants
+
+# 字符类别的 ASCII 区间：re.ASCII 下与类别等价，用于该标志下的规范化；生成样本时作为近似
+_CATEGORY_RANGES = {
+    C.CATEGORY_DIGIT: [(48, 57)],
+    C.CATEGORY_WORD: [(48, 57), (65, 90), (95, 95), (97, 122)],
+    C.CATEGORY_SPACE: [(9, 13), (32, 32)],
+}
+_NEGATED_CATEGORIES = {
+    C.CATEGORY_NOT_DIGIT: C.CATEGORY_DIGIT,
+    C.CATEGORY_NOT_WORD: C.CATEGORY_WORD,
+    C.CATEGORY_NOT_SPACE: C.CATEGORY_SPACE,
+}
+# Unicode 语义下 \d、\w、\s 还匹配非 ASCII 字符（如 '١'），规范化时保留类别本身
+_CATEGORY_ESCAPES = {
+    C.CATEGORY_DIGIT: r"\d", C.CATEGORY_NOT_DIGIT: r"\D",
+    C.CATEGORY_WORD: r"\w", C.CATEGORY_NOT_WORD: r"\W",
+    C.CATEGORY_SPACE: r"\s", C.CATEGORY_NOT_SPACE: r"\S",
+}
+_COMPLEMENT_ESCAPES = {
+    r"\d": r"\D", r"\D": r"\d", r"\w": r"\W", r"\W": r"\w", r"\s": r"\S", r"\S": r"\s",
+}
+_LEADING_ANCHORS = (C.AT_BEGINNING, C.AT_BEGINNING_STRING)
+_TRAILING_ANCHORS = (C.AT_END, C.AT_END_STRING)
+
+
+def parse_pattern(pattern: str):
+    """解析正则表达式并去掉首尾锚点（校验统一使用 fullmatch，锚点不影响语义）"""
+    items = list(sre_parse.parse(pattern))
+    while items and items[0][0] is C.AT and items[0][1] in _LEADING_ANCHORS:
+        items.pop(0)
+    while items and items[-1][0] is C.AT and items[-1][1] in _TRAILING_ANCHORS:
+        items.pop()
+    return items
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def _class_ranges(items):
+    """将字符集合展开为排序后的区间列表，无法展开时返回 None"""
+    negate = False
+    ranges = []
+    for op, av in items:
+        if op is C.NEGATE:
+            negate = True
+        elif op is C.LITERAL:
+            ranges.append((av, av))
+        elif op is C.RANGE:
+            ranges.append(av)
+        elif op is C.CATEGORY and av in _CATEGORY_RANGES:
+            ranges.extend(_CATEGORY_RANGES[av])
+        elif op is C.CATEGORY and av in _NEGATED_CATEGORIES and len(items) == 1:
+            return True, list(_CATEGORY_RANGES[_NEGATED_CATEGORIES[av]])
+        else:
+            return None
+    return negate, _merge_ranges(ranges)
+
+
+def class_parts(items, ascii: bool):
+    """规范化用的字符集合：(取反, 区间, 类别)；re.ASCII 下类别展开为区间，否则保留，无法处理时返回 None"""
+    if ascii:
+        ranges = _class_ranges(items)
+        return None if ranges is None else (*ranges, ())
+    negate = False
+    ranges, categories = [], set()
+    for op, av in items:
+        if op is C.NEGATE:
+            negate = True
+        elif op is C.LITERAL:
+            ranges.append((av, av))
+        elif op is C.RANGE:
+            ranges.append(av)
+        elif op is C.CATEGORY and av in _CATEGORY_ESCAPES:
+            categories.add(_CATEGORY_ESCAPES[av])
+        else:
+            return None
+    return negate, _merge_ranges(ranges), tuple(sorted(categories))
+
+
+def _emit_char(code: int) -> str:
+    return re.escape(chr(code))
+
+
+def _emit_class(negate: bool, ranges, categories=()) -> str:
+    if not categories and not negate and len(ranges) == 1 and ranges[0][0] == ranges[0][1]:
+        return _emit_char(ranges[0][0])
+    if not ranges and len(categories) == 1:
+        # \d、[\d] 与 [^\D] 等价
+        return _COMPLEMENT_ESCAPES[categories[0]] if negate else categories[0]
+    body = "".join(
+        _emit_char(lo) if lo == hi else f"{_emit_char(lo)}-{_emit_char(hi)}"
+        for lo, hi in ranges
+    ) + "".join(categories)
+    return f"[{'^' if negate else ''}{body}]"
+
+
+def _emit_repeat(lo: int, hi: int) -> str:
+    if (lo, hi) == (0, C.MAXREPEAT):
+        return "*"
+    if (lo, hi) == (1, C.MAXREPEAT):
+        return "+"
+    if (lo, hi) == (0, 1):
+        return "?"
+    if hi == C.MAXREPEAT:
+        return f"{{{lo},}}"
+    if lo == hi:
+        return f"{{{lo}}}"
+    return f"{{{lo},{hi}}}"
+
+
+# 计入规范化结果的内联标志；VERBOSE 虽只影响书写方式，也保守地计入，只把写法完全相同的模式视为等价
+_INLINE_FLAGS = (
+    (re.IGNORECASE, "i"), (re.LOCALE, "L"), (re.MULTILINE, "m"), (re.DOTALL, "s"), (re.ASCII, "a"),
+    (re.VERBOSE, "x"),
+)
+
+
+def _emit_flags(flags: int) -> str:
+    return "".join(letter for flag, letter in _INLINE_FLAGS if flags & flag)
+
+
+def _scoped(av) -> bool:
+    """带局部标志的分组，如 ``(?i:abc)``"""
+    group, add_flags, del_flags, body = av
+    return bool(_emit_flags(add_flags) or _emit_flags(del_flags))
+
+
+def _flatten(items):
+    """展开分组：拼接满足结合律，分组边界不影响匹配的语言；带局部标志的分组保留"""
+    for op, av in items:
+        if op is C.SUBPATTERN and not _scoped(av):
+            yield from _flatten(av[-1])
+        else:
+            yield op, av
+
+
+_ATOMS = (C.LITERAL, C.NOT_LITERAL, C.IN, C.CATEGORY, C.ANY, C.BRANCH, C.SUBPATTERN)
+REPEATS = tuple(op for op in (
+    C.MAX_REPEAT, C.MIN_REPEAT, getattr(C, "POSSESSIVE_REPEAT", None)
+) if op is not None)
+
+
+def _emit_atom(op, av, ascii: bool) -> str:
+    if op is C.LITERAL:
+        return _emit_char(av)
+    if op is C.NOT_LITERAL:
+        return _emit_class(True, [(av, av)])
+    if op in (C.IN, C.CATEGORY):
+        parts = class_parts(av if op is C.IN else [(op, av)], ascii)
+        return _emit_class(*parts) if parts else f"[{av!r}]"
+    if op is C.ANY:
+        return "."
+    if op is C.BRANCH:
+        alternatives = sorted({_emit(branch, ascii) for branch in av[1]})
+        return f"(?:{'|'.join(alternatives)})"
+    if op is C.SUBPATTERN:
+        group, add_flags, del_flags, body = av
+        removed = _emit_flags(del_flags)
+        inner = _emit(body, ascii or bool(add_flags & re.ASCII))
+        return f"(?{_emit_flags(add_flags)}{'-' + removed if removed else ''}:{inner})"
+    if op is C.AT:
+        return {C.AT_BOUNDARY: r"\b", C.AT_NON_BOUNDARY: r"\B"}.get(av, f"<{av}>")
+    return f"<{op}:{av!r}>"
+
+
+def _emit(items, ascii: bool = False) -> str:
+    # 每个单元记为 [文本, 最少次数, 最多次数]，相邻相同单元合并（\d\d 与 \d{2} 等价）
+    units = []
+    for op, av in _flatten(items):
+        if op in REPEATS:
+            lo, hi, body = av
+            body_items = list(_flatten(body))
+            text = _emit(body_items, ascii)
+            if len(body_items) != 1 or body_items[0][0] not in _ATOMS:
+                text = f"(?:{text})"
+        else:
+            lo, hi, text = 1, 1, _emit_atom(op, av, ascii)
+        if units and units[-1][0] == text and op is not C.AT:
+            units[-1][1] += lo
+            units[-1][2] = C.MAXREPEAT if C.MAXREPEAT in (hi, units[-1][2]) else units[-1][2] + hi
+        else:
+            units.append([text, lo, hi])
+    return "".join(
+        text if (lo, hi) == (1, 1) else text + _emit_repeat(lo, hi)
+        for text, lo, hi in units
+    )
+
+
+def normalize_pattern(pattern: str) -> str:
+    """将正则表达式规范化为等价的标准写法
+
+    例如 ``^\\d{4}-\\d{2}$``、``[\\d]{4}-\\d\\d`` 与 ``^(\\d{4})-(\\d\\d)$`` 得到相同结果。
+    全局与局部的内联标志（``(?i)``、``(?s:...)`` 等）保留在结果中，标志不同的模式不会被视为等价。
+    ``\\d``、``\\w``、``\\s`` 在 Unicode 语义下还匹配非 ASCII 字符，只在 re.ASCII 标志下才与对应的 ASCII 区间等价。
+    无法解析的模式原样返回。
+    """
+    try:
+        state_flags = sre_parse.parse(pattern).state.flags
+        flags = _emit_flags(state_flags)
+        return (f"(?{flags})" if flags else "") + _emit(parse_pattern(pattern), bool(state_flags & re.ASCII))
+    except (re.error, TypeError, ValueError, OverflowError):
+        return pattern
+
+
+def pattern_fingerprint(pattern: str) -> str:
+    """规范化模式的 SHA-1 指纹，等价模式的指纹相同"""
+    return hashlib.sha1(normalize_pattern(pattern).encode("utf-8")).hexdigest()
+
+
+# 无上界模式的长度上限记为该值，便于存入整数列并做区间比较
+UNBOUNDED_LENGTH = 2 ** 31 - 1
+
+
+def pattern_width(pattern: str) -> tuple[int, int]:
+    """模式可匹配字符串的长度范围 (最短, 最长)"""
+    try:
+        lo, hi = sre_parse.parse(pattern).getwidth()
+    except (re.error, OverflowError):
+        return 0, UNBOUNDED_LENGTH
+    return lo, min(hi, UNBOUNDED_LENGTH)
+
+
+class _UnsupportedPattern(Exception):
+    pass
+
+
+# 定宽快速路径只处理 ASCII 字符，逐位置查表
+ASCII_SIZE = 128
+_SINGLE_CHAR_ATOMS = (C.LITERAL, C.NOT_LITERAL, C.IN, C.ANY)
+
+
+def _position_atoms(items, scopes, state, max_width: int, out: list) -> None:
+    """把定宽模式展开为逐位置的单字符原子，scopes 为外层 (?i:...) 等局部标志"""
+    for op, av in items:
+        if op in _SINGLE_CHAR_ATOMS:
+            out.append((op, av, scopes))
+        elif op is C.SUBPATTERN:
+            group, add_flags, del_flags, body = av
+            inner = scopes + ((add_flags, del_flags),) if add_flags or del_flags else scopes
+            _position_atoms(body, inner, state, max_width, out)
+        elif op in REPEATS and av[0] == av[1]:
+            for _ in range(av[0]):
+                _position_atoms(av[2], scopes, state, max_width, out)
+        else:
+            # 分支、变长重复、断言、反向引用等不是逐位置独立的字符集合
+            raise _UnsupportedPattern
+        if len(out) > max_width:
+            raise _UnsupportedPattern
+
+
+def ascii_table(op, av, scopes, state) -> bytes:
+    """单字符原子在 ASCII 范围内的取值表：用 re 自身编译该原子逐字符判定，标志与大小写语义与原模式一致"""
+    node = [(op, av)]
+    for add_flags, del_flags in reversed(scopes):
+        node = [(C.SUBPATTERN, (None, add_flags, del_flags, sre_parse.SubPattern(state, node)))]
+    compiled = sre_compile.compile(sre_parse.SubPattern(state, node))
+    return bytes(compiled.fullmatch(chr(code)) is not None for code in range(ASCII_SIZE))
+
+
+@lru_cache(maxsize=4096)
+def fixed_width_tables(pattern: str, max_width: int = 64) -> tuple[bytes, ...] | None:
+    """定宽字符类序列（如 ``^[A-Z]{3}\\d{5}$``）的逐位置 ASCII 取值表，其他模式返回 None
+
+    第 i 个表的第 c 个字节为 1 表示 ASCII 字符 c 可出现在第 i 位；
+    配合 fullmatch 语义，首尾锚点可忽略。
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+        atoms = []
+        _position_atoms(parse_pattern(pattern), (), parsed.state, max_width, atoms)
+        return tuple(ascii_table(op, av, scopes, parsed.state) for op, av, scopes in atoms)
+    except (re.error, _UnsupportedPattern, OverflowError, TypeError):
+        return None
+
+
+# 首/末字符的粗分类位图：数字、大写、小写、空白与控制字符、其他 ASCII、非 ASCII；
+# 两个模式的首字符（或末字符）分类不相交时不可能匹配同一字符串，用于重叠检测时筛选候选规则
+DIGIT_CHARS, UPPER_CHARS, LOWER_CHARS, SPACE_CHARS, PUNCT_CHARS, NON_ASCII_CHARS = 1, 2, 4, 8, 16, 32
+ALL_CHARS = 63
+_ASCII_GROUPS = [
+    DIGIT_CHARS if chr(c).isdigit() else UPPER_CHARS if chr(c).isupper() else LOWER_CHARS if chr(c).islower()
+    else SPACE_CHARS if c <= 32 or c == 127 else PUNCT_CHARS
+    for c in range(ASCII_SIZE)
+]
+# 字面量前缀的最大长度（与 RuleFingerprint.prefix 列宽一致）
+PREFIX_LENGTH = 32
+
+
+def _scoped_flags(flags: int, scopes) -> int:
+    for add_flags, del_flags in scopes:
+        flags = (flags | add_flags) & ~del_flags
+    return flags
+
+
+def _atom_groups(op, av, scopes, state) -> int:
+    table = ascii_table(op, av, scopes, state)
+    mask = 0
+    for code in range(ASCII_SIZE):
+        if table[code]:
+            mask |= _ASCII_GROUPS[code]
+    # 只有不忽略大小写的 ASCII 字面量与 ASCII 区间集合确定不含非 ASCII 字符（忽略大小写时 k 还匹配开尔文符号）
+    items = [(op, av)] if op is C.LITERAL else av if op is C.IN else None
+    ascii_only = (
+        items is not None and not _scoped_flags(state.flags, scopes) & re.IGNORECASE
+        and all(o is C.LITERAL and a < ASCII_SIZE or o is C.RANGE and a[1] < ASCII_SIZE for o, a in items)
+    )
+    return mask if ascii_only else mask | NON_ASCII_CHARS
+
+
+def _edge_groups(items, scopes, state, last: bool) -> tuple[int, bool]:
+    """(首字符或末字符可能的分类, 能否匹配空串)"""
+    mask = 0
+    for op, av in (reversed(items) if last else items):
+        if op in _SINGLE_CHAR_ATOMS:
+            item_mask, nullable = _atom_groups(op, av, scopes, state), False
+        elif op is C.SUBPATTERN:
+            group, add_flags, del_flags, body = av
+            inner = scopes + ((add_flags, del_flags),) if add_flags or del_flags else scopes
+            item_mask, nullable = _edge_groups(body, inner, state, last)
+        elif op is C.BRANCH:
+            edges = [_edge_groups(branch, scopes, state, last) for branch in av[1]]
+            item_mask, nullable = 0, False
+            for branch_mask, branch_nullable in edges:
+                item_mask |= branch_mask
+                nullable = nullable or branch_nullable
+        elif op in REPEATS:
+            lo, hi, body = av
+            item_mask, nullable = _edge_groups(body, scopes, state, last)
+            nullable = nullable or lo == 0
+        elif op is C.AT:
+            item_mask, nullable = 0, True
+        else:
+            raise _UnsupportedPattern
+        mask |= item_mask
+        if not nullable:
+            return mask, False
+    return mask, True
+
+
+@lru_cache(maxsize=4096)
+def edge_char_groups(pattern: str) -> tuple[int, int]:
+    """模式所匹配字符串首字符与末字符的分类位图，无法分析或可匹配空串时返回 ALL_CHARS"""
+    try:
+        state = sre_parse.parse(pattern).state
+        items = parse_pattern(pattern)
+        first, nullable = _edge_groups(items, (), state, last=False)
+        last, _ = _edge_groups(items, (), state, last=True)
+    except (re.error, _UnsupportedPattern, OverflowError, TypeError):
+        return ALL_CHARS, ALL_CHARS
+    return (ALL_CHARS, ALL_CHARS) if nullable else (first, last)
+
+
+def literal_prefix(pattern: str) -> str:
+    """模式所匹配字符串共同的字面量前缀（最多 PREFIX_LENGTH 个字符），忽略大小写或无法解析时为空串"""
+    try:
+        parsed = sre_parse.parse(pattern)
+        items = parse_pattern(pattern)
+    except (re.error, OverflowError, TypeError):
+        return ""
+    if parsed.state.flags & re.IGNORECASE:
+        return ""
+    prefix = []
+    for op, av in items:
+        if op is not C.LITERAL or len(prefix) >= PREFIX_LENGTH:
+            break
+        prefix.append(chr(av))
+    return "".join(prefix)
+
+
+def _sample_class(items, rng) -> str:
+    ranges = _class_ranges(items)
+    if ranges is None:
+        raise _UnsupportedPattern
+    negate, spans = ranges
+    if negate:
+        # 取可打印 ASCII 中不在集合内的字符
+        allowed = [c for c in range(32, 127) if not any(lo <= c <= hi for lo, hi in spans)]
+        if not allowed:
+            raise _UnsupportedPattern
+        return chr(rng.choice(allowed))
+    lo, hi = rng.choice(spans)
+    return chr(rng.randint(lo, hi))
+
+
+def _sample(items, rng, max_extra: int) -> str:
+    out = []
+    for op, av in items:
+        if op is C.LITERAL:
+            out.append(chr(av))
+        elif op is C.NOT_LITERAL:
+            out.append(_sample_class([(C.NEGATE, None), (C.LITERAL, av)], rng))
+        elif op is C.IN:
+            out.append(_sample_class(av, rng))
+        elif op is C.CATEGORY:
+            out.append(_sample_class([(op, av)], rng))
+        elif op is C.ANY:
+            out.append(chr(rng.randint(33, 126)))
+        elif op in REPEATS:
+            lo, hi, body = av
+            times = rng.randint(lo, min(hi, lo + max_extra))
+            out.extend(_sample(body, rng, max_extra) for _ in range(times))
+        elif op is C.SUBPATTERN:
+            out.append(_sample(av[-1], rng, max_extra))
+        elif op is C.BRANCH:
+            out.append(_sample(rng.choice(av[1]), rng, max_extra))
+        elif op is C.AT:
+            continue
+        else:
+            raise _UnsupportedPattern
+    return "".join(out)
+
+
+def generate_samples(pattern: str, count: int = 20, seed: int = 0, max_extra: int = 3) -> list[str]:
+    """随机生成满足模式的示例字符串
+
+    仅支持常规语法（字符集、重复、分组、分支），含反向引用或断言的模式返回空列表。
+    生成结果会再用 ``re.fullmatch`` 过滤，保证每个样本确实匹配。
+    """
+    rng = random.Random(seed)
+    try:
+        items = parse_pattern(pattern)
+        compiled = re.compile(pattern)
+        samples = {_sample(items, rng, max_extra) for _ in range(count)}
+    except (re.error, _UnsupportedPattern, OverflowError):
+        return []
+    return sorted(s for s in samples if compiled.fullmatch(s))
+
+
+@lru_cache(maxsize=4096)
+def _compiled(pattern: str):
+    try:
+        return re.compile(pattern)
+    except re.error:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _samples(pattern: str, count: int) -> tuple:
+    return tuple(generate_samples(pattern, count))
+
+
+def find_overlaps(pattern: str, candidates, sample_count: int = 20) -> list[dict]:
+    """用样本互测判断模式与候选规则的包含/重叠关系
+
+    ``candidates`` 为 ``(rule_id, pattern)`` 序列。新模式的全部样本都被某规则匹配时记为
+    ``subsumed_by``，反之记为 ``subsumes``，仅部分样本互相匹配时记为 ``overlaps``。
+    基于抽样，结果是近似判断，供审核人员参考。
+    """
+    compiled = _compiled(pattern)
+    samples = _samples(pattern, sample_count)
+    if compiled is None or not samples:
+        return []
+    results = []
+    for rule_id, other in candidates:
+        other_compiled = _compiled(other)
+        other_samples = _samples(other, sample_count)
+        if other_compiled is None or not other_samples:
+            continue
+        ours_matched = sum(1 for s in samples if other_compiled.fullmatch(s))
+        theirs_matched = sum(1 for s in other_samples if compiled.fullmatch(s))
+        if ours_matched == len(samples):
+            relation = "subsumed_by"
+        elif theirs_matched == len(other_samples):
+            relation = "subsumes"
+        elif ours_matched or theirs_matched:
+            relation = "overlaps"
+        else:
+            continue
+        results.append({"rule_id": rule_id, "relation": relation})
+    return results
+
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
+def find_overlaps_isolated(pattern: str, candidates, timeout: float) -> list[dict] | None:
+    """在子进程中执行 find_overlaps，超过 timeout 秒即终止并返回 None
+
+    样本互测会用提交者的正则匹配已有规则的样本（反之亦然），回溯中的 re 无法被中断。
+    """
+    payload = json.dumps({"pattern": pattern, "candidates": [list(candidate) for candidate in candidates]})
+    try:
+        completed = subprocess.run(
+            [sys.executable, "-m", "app.utils.patterns"],
+            input=payload, cwd=BACKEND_DIR, capture_output=True, text=True, timeout=timeout, check=True
+        )
+    except subprocess.TimeoutExpired:
+        return None
+    return json.loads(completed.stdout)
+
+
+if __name__ == "__main__":
+    request = json.load(sys.stdin)
+    print(json.dumps(find_overlaps(request["pattern"], request["candidates"])))
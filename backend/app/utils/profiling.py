@@ -0,0 +1,244 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import Context, ContextVar
+from pathlib import Path
+from urllib.parse import parse_qs
+from uuid import uuid4
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 线程空闲时停留的函数，采样时跳过，避免火焰图被等待栈淹没
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+
+# 正在分析的请求，由中间件在请求的上下文中设置；线程池中的任务会复制该上下文
+current_profiler: ContextVar["SamplingProfiler | None"] = ContextVar("current_profiler", default=None)
+
+# 线程池分发任务的帧（如 anyio WorkerThread.run）在线程栈底部附近，只检查这几层
+DISPATCH_DEPTH = 6
+
+
+class SamplingProfiler:
+    """基于 sys._current_frames() 的采样分析器
+
+    后台线程按固定间隔抓取调用栈，结果为 flamegraph.pl / speedscope
+    可直接读取的折叠栈格式（``线程;模块:函数;... 次数``）。
+
+    只采样属于本请求的栈：事件循环线程仅在当前任务是发起分析的任务时采样；
+    其他线程仅在其栈底的分发帧持有的 contextvars 上下文中 current_profiler 为本分析器时采样，
+    即由本请求（通过 run_in_threadpool 等）派发到线程池的工作。
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._request_thread: int | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> "SamplingProfiler":
+        """在请求所在的线程（及协程）中调用"""
+        self._request_thread = threading.get_ident()
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.current_task()
+        except RuntimeError:
+            self._loop = self._task = None
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _owns(self, thread_id: int, frame) -> bool:
+        if thread_id == self._request_thread:
+            return self._task is None or asyncio.current_task(self._loop) is self._task
+        roots = []
+        while frame is not None:
+            roots.append(frame)
+            frame = frame.f_back
+        for dispatch in roots[-DISPATCH_DEPTH:]:
+            for value in dispatch.f_locals.values():
+                if isinstance(value, Context) and value.get(current_profiler) is self:
+                    return True
+        return False
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+                if leaf in IDLE_FRAMES or not self._owns(thread_id, frame):
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """将分析结果写入 PROFILE_DIR（.folded 栈 + .json 元数据），多 worker 共享同一目录"""
+
+    def __init__(self, directory: Path, keep_slowest: int):
+        self.directory = directory
+        self.keep_slowest = keep_slowest
+        self._slowest: list[tuple[float, str]] = []  # 本进程全局采样保留的最慢请求（小顶堆）
+        self._lock = threading.Lock()
+
+    def save(self, profile_id: str, meta: dict, profiler: SamplingProfiler) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{profile_id}.folded").write_text(profiler.folded())
+        meta = {**meta, "id": profile_id, "samples": profiler.samples}
+        (self.directory / f"{profile_id}.json").write_text(json.dumps(meta))
+
+    def offer_slowest(self, profile_id: str, meta: dict, profiler: SamplingProfiler) -> None:
+        """全局采样模式：只保留耗时最长的 N 个请求"""
+        duration = meta["duration_ms"]
+        with self._lock:
+            if len(self._slowest) >= self.keep_slowest:
+                if duration <= self._slowest[0][0]:
+                    return
+                _, evicted = heapq.heapreplace(self._slowest, (duration, profile_id))
+                self.delete(evicted)
+            else:
+                heapq.heappush(self._slowest, (duration, profile_id))
+        self.save(profile_id, meta, profiler)
+
+    def delete(self, profile_id: str) -> None:
+        for suffix in (".folded", ".json"):
+            (self.directory / f"{profile_id}{suffix}").unlink(missing_ok=True)
+
+    def list(self) -> list[dict]:
+        if not self.directory.exists():
+            return []
+        profiles = []
+        for path in self.directory.glob("*.json"):
+            try:
+                profiles.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda p: p["duration_ms"], reverse=True)
+
+    def get(self, profile_id: str) -> str | None:
+        path = self.directory / f"{Path(profile_id).name}.folded"
+        return path.read_text() if path.exists() else None
+
+
+profile_store = ProfileStore(settings.PROFILE_DIR, settings.PROFILE_KEEP_SLOWEST)
+
+
+def _profile_requested(scope) -> bool:
+    headers = dict(scope.get("headers") or [])
+    if headers.get(b"x-profile", b"").lower() in (b"1", b"true"):
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode())
+    return query.get("_profile", [""])[0].lower() in ("1", "true")
+
+
+def _bearer_token(scope) -> str | None:
+    authorization = dict(scope.get("headers") or []).get(b"authorization", b"").decode()
+    scheme, _, token = authorization.partition(" ")
+    return token if scheme.lower() == "bearer" and token else None
+
+
+class ProfilingMiddleware:
+    """按需分析单个请求，或以 PROFILE_SAMPLE_RATE 的比例全局采样并保留最慢的请求
+
+    按需分析通过 ``X-Profile: 1`` 请求头或 ``?_profile=1`` 触发，仅对管理员生效，
+    响应头 ``X-Profile-Id`` 给出结果编号，可在 ``/admin/profiles/{id}`` 下载。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        explicit = _profile_requested(scope) and await self._is_admin(scope)
+        sampled = not explicit and settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+        if not (explicit or sampled):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid4().hex
+        interval = settings.PROFILE_SAMPLE_INTERVAL_MS if explicit else settings.PROFILE_GLOBAL_INTERVAL_MS
+        profiler = SamplingProfiler(interval / 1000).start()
+        token = current_profiler.set(profiler)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if explicit:
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profiler.reset(token)
+            meta = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                "mode": "explicit" if explicit else "sampled",
+                "created_at": time.time(),
+            }
+            # 等待采样线程结束与写文件都会阻塞，放到线程池
+            await run_in_threadpool(self._finish, profile_id, meta, profiler, explicit)
+
+    @staticmethod
+    def _finish(profile_id: str, meta: dict, profiler: SamplingProfiler, explicit: bool) -> None:
+        profiler.stop()
+        try:
+            if explicit:
+                profile_store.save(profile_id, meta, profiler)
+            else:
+                profile_store.offer_slowest(profile_id, meta, profiler)
+        except OSError as e:
+            logger.error(f"Failed to store profile {profile_id}: {e}")
+
+    @staticmethod
+    async def _is_admin(scope) -> bool:
+        from app.utils.security import get_principal_async
+
+        token = _bearer_token(scope)
+        user = await get_principal_async(token) if token else None
+        return bool(user and user.is_admin)
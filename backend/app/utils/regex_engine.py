@@ -0,0 +1,182 @@
+import logging
+import re
+from functools import lru_cache
+
+from app.utils.patterns import C, REPEATS, class_parts, parse_pattern, sre_parse
+
+try:
+    import re2
+except ImportError:  # google-re2 为可选依赖，缺失时全部使用 re
+    re2 = None
+
+logger = logging.getLogger(__name__)
+
+# 规则可选的匹配引擎：auto 仅对有灾难性回溯风险的模式使用 re2（RE2 的 Python 封装单次调用开销
+# 明显高于 re，常规模式用 re 更快），re2 对所有受支持的模式使用 re2，re 始终使用 re
+ENGINES = ("auto", "re", "re2")
+
+# RE2 的重复次数上限
+_RE2_MAX_REPEAT = 1000
+_BOUNDARIES = {C.AT_BOUNDARY: r"\b", C.AT_NON_BOUNDARY: r"\B"}
+# Python 字符串可含单个代理项，RE2 只接受合法 UTF-8：匹配前把代理项换成 U+10FFFF，
+# 并拒绝字面量或区间涉及这两类码点的模式，保证替换前后结果不变
+_SURROGATES = re.compile("[\ud800-\udfff]")
+_SURROGATE_STAND_IN = 0x10FFFF
+_RESERVED = ((0xD800, 0xDFFF), (_SURROGATE_STAND_IN, _SURROGATE_STAND_IN))
+
+
+class UnsupportedSyntax(Exception):
+    pass
+
+
+def _re2_char(code: int) -> str:
+    return f"\\x{{{code:x}}}"
+
+
+def _re2_class(negate: bool, ranges) -> str:
+    """把区间列表写成 RE2 的显式字符类，对任意 Unicode 输入与 re 等价"""
+    if any(lo <= r_hi and r_lo <= hi for lo, hi in ranges for r_lo, r_hi in _RESERVED):
+        raise UnsupportedSyntax("surrogate")
+    if not ranges:
+        return r"[\x00-\x{10ffff}]" if negate else r"[^\x00-\x{10ffff}]"
+    body = "".join(_re2_char(lo) if lo == hi else f"{_re2_char(lo)}-{_re2_char(hi)}" for lo, hi in ranges)
+    return f"[{'^' if negate else ''}{body}]"
+
+
+def _re2_repeat(lo: int, hi: int, lazy: bool) -> str:
+    if lo > _RE2_MAX_REPEAT or (hi != C.MAXREPEAT and hi > _RE2_MAX_REPEAT):
+        raise UnsupportedSyntax("repeat count")
+    if hi == C.MAXREPEAT:
+        quantifier = {0: "*", 1: "+"}.get(lo, f"{{{lo},}}")
+    elif lo == hi:
+        quantifier = f"{{{lo}}}"
+    else:
+        quantifier = f"{{{lo},{hi}}}"
+    return quantifier + ("?" if lazy else "")
+
+
+def _translate_atom(op, av, flags: int) -> str:
+    if flags & re.IGNORECASE:
+        # Unicode 大小写折叠（İ、ſ、开尔文符号等）与 RE2 不同
+        raise UnsupportedSyntax("ignorecase")
+    if op is C.LITERAL:
+        return _re2_class(False, [(av, av)])
+    if op is C.NOT_LITERAL:
+        return _re2_class(True, [(av, av)])
+    if op is C.ANY:
+        return r"(?s:.)" if flags & re.DOTALL else r"[^\n]"
+    # \d、\w、\s 在 re 中按 Unicode 判定，与 RE2 不同，只有 re.ASCII 下才能展开为区间
+    parts = class_parts(av, bool(flags & re.ASCII))
+    if parts is None or parts[2]:
+        raise UnsupportedSyntax("category")
+    return _re2_class(parts[0], parts[1])
+
+
+def _translate(items, flags: int) -> str:
+    out = []
+    for op, av in items:
+        if op in (C.LITERAL, C.NOT_LITERAL, C.IN, C.ANY):
+            out.append(_translate_atom(op, av, flags))
+        elif op is C.SUBPATTERN:
+            group, add_flags, del_flags, body = av
+            out.append(f"(?:{_translate(body, (flags | add_flags) & ~del_flags)})")
+        elif op is C.BRANCH:
+            out.append("(?:" + "|".join(_translate(branch, flags) for branch in av[1]) + ")")
+        elif op in (C.MAX_REPEAT, C.MIN_REPEAT):
+            lo, hi, body = av
+            out.append(f"(?:{_translate(body, flags)})" + _re2_repeat(lo, hi, op is C.MIN_REPEAT))
+        elif op is C.AT and av in _BOUNDARIES and flags & re.ASCII:
+            # re.ASCII 下 \b 的单词字符与 RE2 一致（均为 [0-9A-Za-z_]）
+            out.append(_BOUNDARIES[av])
+        elif op is C.AT and av in (C.AT_BEGINNING, C.AT_BEGINNING_STRING):
+            # 非多行模式下 ^ 即字符串开头
+            out.append(r"\A")
+        elif op is C.AT and av is C.AT_END_STRING:
+            out.append(r"\z")
+        else:
+            # 反向引用、环视、占有量词、原子组、中间的 $ / 多行锚点、Unicode 语义的 \b 等
+            raise UnsupportedSyntax(str(op))
+    return "".join(out)
+
+
+def _nested_risk(items, under_unbounded: bool) -> bool:
+    for op, av in items:
+        if op in REPEATS:
+            lo, hi, body = av
+            if under_unbounded and lo != hi:
+                return True
+            if _nested_risk(body, under_unbounded or hi == C.MAXREPEAT):
+                return True
+        elif op is C.SUBPATTERN:
+            if _nested_risk(av[-1], under_unbounded):
+                return True
+        elif op is C.BRANCH:
+            if under_unbounded or any(_nested_risk(branch, False) for branch in av[1]):
+                return True
+        elif op in (C.ASSERT, C.ASSERT_NOT):
+            if _nested_risk(av[1], under_unbounded):
+                return True
+    return False
+
+
+@lru_cache(maxsize=4096)
+def backtracking_risk(pattern: str) -> bool:
+    """模式是否可能指数级回溯：无上界重复内嵌套变长重复或分支，如 ``(a+)+``、``(a|ab)*``"""
+    try:
+        return _nested_risk(sre_parse.parse(pattern), False)
+    except (re.error, OverflowError):
+        return False
+
+
+@lru_cache(maxsize=4096)
+def translate_to_re2(pattern: str) -> str | None:
+    """把模式改写为对任意输入都与 re 等价的 RE2 模式（用于 fullmatch），不支持时返回 None
+
+    含 Unicode 语义的 \\d、\\w、\\s、\\b 或忽略大小写的模式（未设 re.ASCII 时）无法等价改写。
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+        if parsed.state.flags & re.MULTILINE:
+            return None
+        # fullmatch 下首尾锚点无意义，去掉后 $ 的“末尾换行前”语义也不再涉及
+        return _translate(parse_pattern(pattern), parsed.state.flags)
+    except (re.error, UnsupportedSyntax, OverflowError, TypeError):
+        return None
+
+
+class CompiledRule:
+    """按规则选择引擎的 fullmatch 匹配器
+
+    选用 RE2 时所有取值都交给 RE2（线性时间，不会灾难性回溯）；模式无法与 re 等价改写时
+    拒绝使用 RE2 并记录警告，engine 报告为 re，而不是对部分取值静默回退到 re。
+    """
+
+    def __init__(self, pattern: str, engine: str = "auto"):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown regex engine: {engine}")
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self._re2 = None
+        if re2 is not None and (engine == "re2" or (engine == "auto" and backtracking_risk(pattern))):
+            translated = translate_to_re2(pattern)
+            if translated is not None:
+                try:
+                    self._re2 = re2.compile(translated)
+                except Exception as e:
+                    logger.warning(f"RE2 rejected translated pattern {pattern!r}: {e}")
+            else:
+                logger.warning(f"Pattern {pattern!r} cannot run on RE2 with re semantics, using re")
+        self.engine = "re2" if self._re2 is not None else "re"
+
+    def fullmatch(self, text: str) -> bool:
+        if self._re2 is not None:
+            try:
+                return self._re2.fullmatch(text) is not None
+            except UnicodeEncodeError:
+                return self._re2.fullmatch(_SURROGATES.sub(chr(_SURROGATE_STAND_IN), text)) is not None
+        return self.regex.fullmatch(text) is not None
+
+
+@lru_cache(maxsize=1024)
+def compile_rule(pattern: str, engine: str = "auto") -> CompiledRule:
+    return CompiledRule(pattern, engine)
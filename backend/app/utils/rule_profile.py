@@ -0,0 +1,176 @@
+import json
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from app.config import settings
+from app.utils.matching import ColumnMatcher
+from app.utils.patterns import generate_samples
+from app.utils.regex_engine import backtracking_risk
+
+# 每批测量的取值个数；吞吐量按累计至少 THROUGHPUT_SECONDS 的批次计算
+THROUGHPUT_BATCH = 10000
+THROUGHPUT_SECONDS = 0.1
+# 对抗输入的重复段长度，逐级加长直到单次匹配超过 SUBMISSION_PROFILE_WORST_CASE_MS
+ADVERSARIAL_LENGTHS = (8, 12, 16, 20, 24, 28, 32, 64, 256, 1024, 4096)
+# 每个长度重复测量，取中位数，排除调度、GC 等偶发抖动
+TIMING_REPEATS = 3
+# 连续 EXPONENTIAL_STEPS 级（每级 +4 个字符）耗时都增长超过 EXPONENTIAL_GROWTH 倍且已超过 1ms 时视为指数回溯，不再加长
+EXPONENTIAL_GROWTH = 4.0
+EXPONENTIAL_STEPS = 2
+# 定宽快速路径是线性时间（逐位置查表，非 ASCII 行的 re 也只匹配定宽模式），耗时波动不会被判为指数回溯；
+# RE2 同样按实测判定，不因引擎名豁免
+LINEAR_ENGINES = ("numpy",)
+# 对抗输入末尾的失配字符，迫使回溯引擎穷举所有拆分方式；含非 ASCII 字符，覆盖非 ASCII 取值的匹配路径
+_FAIL_SUFFIXES = ("!", "\x00", "é")
+_MUTATIONS = "x-9 _.%é"
+
+
+def _matches(matcher: ColumnMatcher, value: str) -> bool:
+    return bool(matcher.match([value])[0])
+
+
+def _mutations(samples: list[str], matcher: ColumnMatcher, rng: random.Random, count: int) -> list[str]:
+    """改动、插入或删除一个字符得到的不匹配输入"""
+    values = []
+    for _ in range(count * 4):
+        if len(values) >= count:
+            break
+        value = rng.choice(samples) if samples else ""
+        position = rng.randrange(len(value) + 1)
+        choice = rng.random()
+        if choice < 0.4:
+            value = value[:position] + rng.choice(_MUTATIONS) + value[position + 1:]
+        elif choice < 0.8:
+            value = value[:position] + rng.choice(_MUTATIONS) + value[position:]
+        else:
+            value = value[:position] + value[position + 1:]
+        if not _matches(matcher, value):
+            values.append(value)
+    return values
+
+
+def _adversarial_seeds(samples: list[str], matcher: ColumnMatcher, limit: int = 12) -> list[tuple[str, str, str]]:
+    """(前缀, 重复字符, 失配后缀)：在匹配样本的某处把一个字符重复多次，再以不匹配的字符结尾"""
+    seeds = []
+    for sample in samples[:limit]:
+        for position in {0, len(sample) // 2}:
+            if position >= len(sample):
+                continue
+            suffix = next(
+                (s for s in _FAIL_SUFFIXES if not _matches(matcher, sample[:position] + sample[position] * 8 + s)),
+                None
+            )
+            if suffix is not None:
+                seeds.append((sample[:position], sample[position], suffix))
+    return list(dict.fromkeys(seeds))
+
+
+def _throughput(matcher: ColumnMatcher, values: list[str]) -> int | None:
+    if not values:
+        return None
+    batch = (values * (THROUGHPUT_BATCH // len(values) + 1))[:THROUGHPUT_BATCH]
+    matched, elapsed = 0, 0.0
+    while elapsed < THROUGHPUT_SECONDS:
+        start = time.perf_counter()
+        matcher.match(batch)
+        elapsed += time.perf_counter() - start
+        matched += len(batch)
+    return int(matched / elapsed)
+
+
+def _time_one(matcher: ColumnMatcher, value: str, timer=time.perf_counter) -> float:
+    """单次匹配耗时（毫秒），取 TIMING_REPEATS 次测量的中位数"""
+    timings = []
+    for _ in range(TIMING_REPEATS):
+        start = timer()
+        matcher.match([value])
+        timings.append((timer() - start) * 1000)
+    return statistics.median(timings)
+
+
+def _worst_case(matcher: ColumnMatcher, seeds, timer=time.perf_counter) -> dict:
+    limit = settings.SUBMISSION_PROFILE_WORST_CASE_MS
+    linear = matcher.engine in LINEAR_ENGINES
+    worst = {"ms": 0.0, "length": 0, "input": ""}
+    exponential = False
+    for prefix, char, suffix in seeds:
+        previous, growth_steps = None, 0
+        for length in ADVERSARIAL_LENGTHS:
+            value = prefix + char * length + suffix
+            elapsed = _time_one(matcher, value, timer)
+            if elapsed > worst["ms"]:
+                worst = {"ms": round(elapsed, 3), "length": len(value), "input": value[:80]}
+            growing = (previous is not None and length - previous[0] == 4
+                       and previous[1] > 0 and elapsed > previous[1] * EXPONENTIAL_GROWTH)
+            growth_steps = growth_steps + 1 if growing else 0
+            if not linear and growth_steps >= EXPONENTIAL_STEPS and elapsed > 1:
+                exponential = True
+                break
+            if elapsed > limit:
+                break
+            previous = (length, elapsed)
+        if worst["ms"] > limit:
+            break
+    return {**worst, "exponential": exponential}
+
+
+def profile_pattern(pattern: str, engine: str = "auto", seed: int = 0, timer=time.perf_counter) -> dict:
+    """对模式做离线性能分析：匹配/不匹配输入的吞吐量（取值/秒）与对抗输入下的最坏单次耗时
+
+    使用与校验相同的匹配器（定宽快速路径、re 或 RE2），结果反映规则上线后的实际表现。
+    样本本身就可能触发灾难性回溯，在 worker 中应通过 profile_pattern_isolated 调用。
+    timer 用于最坏情况计时，测试时可替换。
+    """
+    try:
+        matcher = ColumnMatcher(pattern, engine)
+    except re.error as e:
+        return {"error": f"Invalid regex: {e}"}
+    matching = generate_samples(pattern, 200, seed=seed, max_extra=8)
+    seeds = _adversarial_seeds(matching, matcher)
+    # 先测最坏情况（逐级加长，有上限）；已确认指数回溯时，随机改动的样本同样可能跑不完，不再测不匹配吞吐量
+    worst_case = _worst_case(matcher, seeds, timer)
+    non_matching = [] if worst_case["exponential"] else _mutations(matching, matcher, random.Random(seed), 200)
+    return {
+        "engine": matcher.engine,
+        "backtracking_risk": backtracking_risk(pattern),
+        "throughput": {
+            "matching": _throughput(matcher, matching),
+            "non_matching": _throughput(matcher, non_matching),
+        },
+        "worst_case": worst_case,
+        "inputs": {"matching": len(matching), "non_matching": len(non_matching), "adversarial": len(seeds)},
+        "profiled_at": datetime.utcnow().isoformat(),
+    }
+
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
+def profile_pattern_isolated(pattern: str, engine: str = "auto") -> dict:
+    """在子进程中分析，超过 SUBMISSION_PROFILE_TIMEOUT_SECONDS 即终止（回溯中的 re 无法被中断）"""
+    timeout = settings.SUBMISSION_PROFILE_TIMEOUT_SECONDS
+    try:
+        completed = subprocess.run(
+            [sys.executable, "-m", "app.utils.rule_profile", pattern, engine],
+            cwd=BACKEND_DIR, capture_output=True, text=True, timeout=timeout, check=True
+        )
+    except subprocess.TimeoutExpired:
+        return {
+            "error": f"Profiling did not finish within {timeout}s, the pattern likely backtracks catastrophically",
+            "timed_out": True,
+            "profiled_at": datetime.utcnow().isoformat(),
+        }
+    except subprocess.CalledProcessError as e:
+        lines = (e.stderr or "").strip().splitlines()
+        return {"error": lines[-1] if lines else "Profiling failed"}
+    return json.loads(completed.stdout)
+
+
+if __name__ == "__main__":
+    print(json.dumps(profile_pattern(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else "auto")))
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import math
+import time
+from collections import Counter
+from statistics import NormalDist
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from app.utils.file_parsers import native_value
+from app.utils.matching import ColumnMatcher
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 返回的不合格样例条数，与完整校验一致
+MAX_INVALID_SAMPLES = 10
+# 分层抽样时缺失的分层取值
+MISSING_STRATUM = ""
+
+
+def wilson_interval(rate: float, n: float, confidence: float = 0.95) -> tuple[float, float]:
+    """比例的 Wilson 置信区间；n 可以是有效样本量（非整数）"""
+    if n <= 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    denominator = 1 + z * z / n
+    center = (rate + z * z / (2 * n)) / denominator
+    half = z / denominator * math.sqrt(rate * (1 - rate) / n + z * z / (4 * n * n))
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def estimate_rate(strata: Iterable[tuple[int, int, int]], confidence: float = 0.95) -> dict:
+    """由各层 (总行数, 抽样数, 不合格数) 估计整体不合格率
+
+    按层权重加权得到点估计，方差含有限总体校正；区间用 Wilson 公式，样本量取
+    设计效应折算后的有效样本量，简单随机抽样即只有一层的特例。全部行都被抽中时区间退化为点。
+    """
+    strata = [(rows, sampled, invalid) for rows, sampled, invalid in strata if sampled]
+    total = sum(rows for rows, _, _ in strata)
+    sampled = sum(n for _, n, _ in strata)
+    if not total:
+        return {"rate": 0.0, "interval": [0.0, 1.0]}
+    rate, variance = 0.0, 0.0
+    for rows, n, invalid in strata:
+        weight = rows / total
+        stratum_rate = invalid / n
+        rate += weight * stratum_rate
+        if n > 1:
+            variance += weight * weight * (1 - n / rows) * stratum_rate * (1 - stratum_rate) / (n - 1)
+    if sampled >= total:
+        return {"rate": rate, "interval": [rate, rate]}
+    if variance > 0:
+        effective = rate * (1 - rate) / variance
+    else:
+        # 样本中全部合格（或全部不合格）时无法估计方差，按简单随机抽样折算有限总体校正
+        effective = sampled * (total - 1) / (total - sampled)
+    low, high = wilson_interval(rate, effective, confidence)
+    return {"rate": rate, "interval": [low, high]}
+
+
+class ReservoirSampler:
+    """流式的简单随机 / 分层抽样
+
+    每行分配一个均匀随机键，保留键最小的 size 行（bottom-k），任意前缀都是该层的简单随机样本，
+    因此无需预知总行数。分层时每层各保留 size 行并统计层内总行数，读完后按层大小比例分配样本量
+    （每层至少 1 行），取各层键最小的若干行。
+    """
+
+    def __init__(self, size: int, stratified: bool = False, max_strata: int = 1000, seed: Optional[int] = None):
+        import numpy as np
+
+        self.size = size
+        self.stratified = stratified
+        self.max_strata = max_strata
+        self.rows = 0
+        self.stratum_rows: Counter = Counter()
+        self._rng = np.random.default_rng(seed)
+        self._kept: Optional[pd.DataFrame] = None
+
+    def add(self, values: pd.Series, strata: Optional[pd.Series] = None) -> None:
+        import pandas as pd
+
+        chunk = pd.DataFrame({
+            "row": range(self.rows, self.rows + len(values)),
+            "value": values.to_numpy(),
+            "key": self._rng.random(len(values)),
+        })
+        if self.stratified:
+            chunk["stratum"] = strata.fillna(MISSING_STRATUM).astype(str).to_numpy()
+            self.stratum_rows.update(chunk["stratum"].value_counts().to_dict())
+            if len(self.stratum_rows) > self.max_strata:
+                raise ValueError(f"More than {self.max_strata} strata, choose a coarser strata column")
+        self.rows += len(values)
+        if not self.stratified and self._kept is not None and len(self._kept) >= self.size:
+            # 已满的蓄水池只可能被键更小的行替换
+            chunk = chunk[chunk["key"] < self._kept["key"].max()]
+        kept = chunk if self._kept is None else pd.concat([self._kept, chunk], ignore_index=True)
+        if self.stratified:
+            self._kept = kept.sort_values("key").groupby("stratum", sort=False).head(self.size)
+        elif len(kept) > self.size:
+            self._kept = kept.nsmallest(self.size, "key")
+        else:
+            self._kept = kept
+
+    def sample(self) -> pd.DataFrame:
+        """最终样本：row（文件中的行号，从 0 开始）、value，分层时另有 stratum"""
+        import pandas as pd
+
+        if self._kept is None:
+            return pd.DataFrame({"row": [], "value": [], "stratum": []})
+        kept = self._kept.sort_values("key")
+        if self.stratified:
+            quota = {
+                stratum: max(1, round(self.size * rows / self.rows))
+                for stratum, rows in self.stratum_rows.items()
+            }
+            kept = kept[kept.groupby("stratum", sort=False).cumcount() < kept["stratum"].map(quota)]
+        else:
+            kept = kept.assign(stratum=MISSING_STRATUM)
+        return kept.sort_values("row").drop(columns="key").reset_index(drop=True)
+
+
+def _column(chunk: pd.DataFrame, column: Optional[str]) -> str:
+    if column is None:
+        if not len(chunk.columns):
+            raise ValueError("File has no columns")
+        return chunk.columns[0]
+    if column not in chunk.columns:
+        raise ValueError(f"Unknown column: {column}")
+    return column
+
+
+def validate_fail_fast(chunks: Iterable[pd.DataFrame], matcher: ColumnMatcher, column: Optional[str] = None,
+                       max_violations: int = 1) -> tuple[dict, int, float]:
+    """逐块校验，累计发现 max_violations 个不合格值即停止读取文件
+
+    返回 (结果, 参与匹配的行数, 匹配耗时)。
+    """
+    rows, invalid, match_seconds = 0, [], 0.0
+    complete = True
+    for chunk in chunks:
+        column = _column(chunk, column)
+        start = time.perf_counter()
+        mask = matcher.match(chunk[column])
+        match_seconds += time.perf_counter() - start
+        for position in (~mask).nonzero()[0][:max_violations - len(invalid)]:
+            invalid.append({"row": rows + int(position), "value": native_value(chunk[column].iloc[position])})
+        rows += len(chunk)
+        if len(invalid) >= max_violations:
+            complete = False
+            break
+    result = {
+        "mode": "fail_fast",
+        "passed": not invalid,
+        "column": column,
+        "rows_checked": rows,
+        "complete": complete,
+        "invalid_count": len(invalid),
+        "invalid_samples": invalid[:MAX_INVALID_SAMPLES],
+    }
+    return result, rows, match_seconds
+
+
+def validate_sample(chunks: Iterable[pd.DataFrame], matcher: ColumnMatcher, column: Optional[str] = None,
+                    size: int = 1000, strata_column: Optional[str] = None, confidence: float = 0.95,
+                    max_strata: int = 1000, seed: Optional[int] = None) -> tuple[dict, int, float]:
+    """只校验抽中的行，给出整体不合格率的估计与置信区间；返回值同 validate_fail_fast"""
+    sampler = ReservoirSampler(size, stratified=strata_column is not None, max_strata=max_strata, seed=seed)
+    for chunk in chunks:
+        column = _column(chunk, column)
+        strata = chunk[_column(chunk, strata_column)] if strata_column is not None else None
+        sampler.add(chunk[column], strata)
+
+    sample = sampler.sample()
+    start = time.perf_counter()
+    mask = matcher.match(sample["value"])
+    match_seconds = time.perf_counter() - start
+    sample["invalid"] = ~mask
+
+    per_stratum = sample.groupby("stratum", sort=False).agg(sampled=("row", "size"), invalid=("invalid", "sum"))
+    counts = sampler.stratum_rows if sampler.stratified else {MISSING_STRATUM: sampler.rows}
+    estimate = estimate_rate(
+        ((counts[stratum], int(row.sampled), int(row.invalid)) for stratum, row in per_stratum.iterrows()),
+        confidence
+    )
+    invalid_rows = sample[sample["invalid"]].head(MAX_INVALID_SAMPLES)
+    result = {
+        "mode": "sample",
+        "strategy": "stratified" if sampler.stratified else "random",
+        "column": column,
+        "rows": sampler.rows,
+        "sample_size": len(sample),
+        "invalid_in_sample": int(sample["invalid"].sum()),
+        "estimated_invalid_rate": estimate["rate"],
+        "confidence": confidence,
+        "interval": estimate["interval"],
+        "estimated_invalid_count": round(estimate["rate"] * sampler.rows),
+        "invalid_samples": [
+            {"row": int(row), "value": native_value(value)} for row, value in zip(invalid_rows["row"], invalid_rows["value"])
+        ],
+    }
+    if sampler.stratified:
+        result["strata_column"] = strata_column
+        result["strata"] = [
+            {"stratum": stratum, "rows": counts[stratum], "sampled": int(row.sampled), "invalid": int(row.invalid)}
+            for stratum, row in per_stratum.iterrows()
+        ]
+    return result, len(sample), match_seconds
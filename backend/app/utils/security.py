@@ -1,19 +1,40 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
 from sqlmodel import Session, select
-from app.database import get_db
-from app.models import User, TokenData
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.database import engine, get_db
+from app.models import User
 from app.config import settings
+from app.utils.cache import TTLCache
+import asyncio
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
+
+# 已认证用户缓存，按令牌 subject（邮箱）索引，存放与会话分离的 User 副本
+principal_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAX_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
+# bcrypt 校验是 CPU 密集操作，放到独立的有界线程池中，避免登录高峰阻塞事件循环
+_password_executor: ThreadPoolExecutor | None = None
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    global _password_executor
+    if _password_executor is None:
+        _password_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+        )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, verify_password, plain_password, hashed_password)
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -27,29 +48,76 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def get_user(db: Session, email: str) -> User | None:
+    return db.exec(select(User).where(User.email == email)).first()
+
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> User | None:
+    user = (await db.exec(select(User).where(User.email == email))).first()
+    if not user:
+        return None
+    if not await verify_password_async(password, user.hashed_password):
+        return None
+    return user
+
+def invalidate_principal(email: str) -> None:
+    """用户信息变更后调用，使缓存中的旧副本失效"""
+    principal_cache.pop(email)
+
+def _token_subject(token: str) -> str | None:
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+def load_principal(email: str, db: Session | None = None) -> User | None:
+    """缓存未命中时查询用户表并写入缓存（同步阻塞，异步代码中应放到线程池执行）"""
+    if db is None:
+        with Session(engine) as session:
+            db_user = get_user(session, email)
+    else:
+        db_user = get_user(db, email)
+    if db_user is None:
+        return None
+    user = User(**db_user.model_dump())
+    principal_cache.set(email, user)
+    return user
+
+def get_principal(token: str, db: Session | None = None) -> User | None:
+    """校验 JWT 并返回对应用户（优先取缓存），令牌无效或用户不存在时返回 None"""
+    email = _token_subject(token)
+    if email is None:
+        return None
+    user = principal_cache.get(email)
+    return user if user is not None else load_principal(email, db)
+
+async def get_principal_async(token: str, db: Session | None = None) -> User | None:
+    """get_principal 的异步版本：缓存命中直接返回，未命中时在线程池中查询，不阻塞事件循环"""
+    email = _token_subject(token)
+    if email is None:
+        return None
+    user = principal_cache.get(email)
+    return user if user is not None else await run_in_threadpool(load_principal, email, db)
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
-    
-    user = db.exec(select(User).where(User.email == token_data.email)).first()
+    user = await get_principal_async(token, db)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
+async def get_optional_user(
+    token: str | None = Depends(optional_oauth2_scheme)
+) -> User | None:
+    """允许匿名访问的接口使用：携带有效令牌时返回用户，否则返回 None"""
+    return await get_principal_async(token) if token else None
+
 async def get_current_admin(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -0,0 +1,150 @@
+import csv
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+from app.config import settings
+
+# 术语前后不能紧邻单词字符；与 make_regex 的 \b 不同，以标点结尾的术语（如 "... (H5N1)"）也能命中
+_LEFT_BOUNDARY = r"(?<!\w)"
+_RIGHT_BOUNDARY = r"(?!\w)"
+_WHITESPACE = " "
+
+
+def normalize_term(text: str) -> str:
+    """匹配键：小写并把连续空白折叠为单个空格"""
+    return _WHITESPACE.join(text.lower().split())
+
+
+class _TrieNode:
+    __slots__ = ("children", "terminal")
+
+    def __init__(self):
+        self.children: dict[str, "_TrieNode"] = {}
+        self.terminal = False
+
+
+def _atom(char: str) -> str:
+    return r"\s+" if char == _WHITESPACE else re.escape(char)
+
+
+def _trie_pattern(node: _TrieNode) -> str:
+    """将字典树转换为正则：公共前缀只出现一次，同一位置的候选按首字符分支，无需逐个尝试"""
+    branches, single_chars = [], []
+    for char in sorted(node.children):
+        child = node.children[char]
+        if not child.children and char != _WHITESPACE:
+            single_chars.append(re.escape(char))
+        else:
+            branches.append(_atom(char) + _trie_pattern(child))
+    if single_chars:
+        branches.append(single_chars[0] if len(single_chars) == 1 else f"[{''.join(single_chars)}]")
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    if node.terminal:
+        # 贪婪可选：优先匹配更长的术语，边界不满足时回退到较短的术语
+        pattern = f"(?:{pattern})?"
+    return pattern
+
+
+@dataclass
+class TermMatch:
+    term: str
+    labels: list[tuple[str, str]]  # (来源, 原始术语)
+    start: int
+    end: int
+
+
+@dataclass
+class TagSummary:
+    rows: int = 0
+    tagged_rows: int = 0
+    term_counts: Counter = field(default_factory=Counter)
+    samples: list[dict] = field(default_factory=list)
+
+
+class TermMatcher:
+    """大小写不敏感的词典匹配器：全部术语编译为一个字典树正则，单次扫描命中所有术语
+
+    同一位置有多个术语时取最长的；术语内部的空白可匹配任意长度的空白。
+    """
+
+    def __init__(self, entries: Iterable[tuple[str, str]]):
+        self.labels: dict[str, list[tuple[str, str]]] = {}
+        root = _TrieNode()
+        for label, source in entries:
+            key = normalize_term(label)
+            if not key:
+                continue
+            if key not in self.labels:
+                node = root
+                for char in key:
+                    node = node.children.setdefault(char, _TrieNode())
+                node.terminal = True
+                self.labels[key] = []
+            self.labels[key].append((source, label))
+        body = _trie_pattern(root)
+        self.regex = re.compile(f"{_LEFT_BOUNDARY}{body}{_RIGHT_BOUNDARY}" if body else r"(?!)", re.IGNORECASE)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def find(self, text: str) -> list[TermMatch]:
+        matches = []
+        for match in self.regex.finditer(text):
+            key = normalize_term(match.group())
+            matches.append(TermMatch(key, self.labels.get(key, []), match.start(), match.end()))
+        return matches
+
+    def tag_values(self, values: Iterable, max_samples: int = 10) -> TagSummary:
+        """逐行标注：统计命中行数与各术语出现次数，保留前 max_samples 个命中样例"""
+        summary = TagSummary()
+        finditer = self.regex.finditer
+        counts = summary.term_counts
+        for index, value in enumerate(values):
+            summary.rows += 1
+            if value is None:
+                continue
+            text = value if isinstance(value, str) else str(value)
+            found = [normalize_term(m.group()) for m in finditer(text)]
+            if not found:
+                continue
+            summary.tagged_rows += 1
+            counts.update(found)
+            if len(summary.samples) < max_samples:
+                summary.samples.append({"row": index, "value": text, "terms": found})
+        return summary
+
+
+def load_kg_terms(kg_dir: Path, sources: Optional[Iterable[str]] = None) -> list[tuple[str, str]]:
+    """从知识图谱导出的 nodes.csv 读取 (术语, 来源)"""
+    wanted = set(sources) if sources else None
+    with open(Path(kg_dir) / "nodes.csv", newline="", encoding="utf-8") as f:
+        return [
+            (row["label"], row["source"])
+            for row in csv.DictReader(f)
+            if wanted is None or row["source"] in wanted
+        ]
+
+
+_matchers: dict[tuple, tuple[float, TermMatcher]] = {}
+_matchers_lock = threading.Lock()
+
+
+def get_term_matcher(sources: Optional[Iterable[str]] = None) -> TermMatcher:
+    """按来源组合缓存匹配器；nodes.csv 更新（修改时间变化）后重建"""
+    path = Path(settings.KG_DIR) / "nodes.csv"
+    key = (str(path), tuple(sorted(sources)) if sources else None)
+    mtime = path.stat().st_mtime
+    cached = _matchers.get(key)
+    if cached is None or cached[0] != mtime:
+        with _matchers_lock:
+            cached = _matchers.get(key)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, TermMatcher(load_kg_terms(settings.KG_DIR, sources)))
+                _matchers[key] = cached
+    return cached[1]
@@ -1,18 +1,52 @@
 import os
 from celery import Celery
+from celery.signals import worker_init
 from dotenv import load_dotenv
 
 load_dotenv()
 
-celery = Celery(__name__)
+celery = Celery(__name__, include=["app.tasks"])
 celery.conf.broker_url = os.getenv("CELERY_BROKER_URL")
 celery.conf.result_backend = os.getenv("CELERY_RESULT_BACKEND")
 
+# 任务参数与结果使用 msgpack + 压缩，体积明显小于默认 JSON；保留 json 以兼容升级期间的旧消息
+celery.conf.task_serializer = "msgpack"
+celery.conf.result_serializer = "msgpack"
+celery.conf.accept_content = ["msgpack", "json"]
+celery.conf.result_accept_content = ["msgpack", "json"]
+celery.conf.task_compression = os.getenv("CELERY_COMPRESSION", "zlib") or None
+celery.conf.result_compression = os.getenv("CELERY_COMPRESSION", "zlib") or None
+
+# 结果在 Redis 中的保留时间（秒）；客户端取回后立即删除，未取回的由 TTL 兜底回收
+celery.conf.result_expires = int(os.getenv("CELERY_RESULT_EXPIRES", "3600"))
+
+# 校验任务默认进入 interactive 通道（validation-queue），大文件由 API 显式投递到 validation-bulk-queue，
+# 两个队列由不同的 worker 消费，避免大任务阻塞小任务
 celery.conf.task_routes = {
     "app.tasks.run_weekly_crawl": "crawl-queue",
     "app.tasks.validate_data_task": "validation-queue",
+    # 批量校验的每个文件一条任务，由 API 投递到 bulk 通道
+    "app.tasks.validate_file_task": "validation-bulk-queue",
+    # full 模式的大文件暂存到磁盘后只投递路径，同样走 bulk 通道
+    "app.tasks.validate_upload_task": "validation-bulk-queue",
+    # 重叠报告与性能分析都会执行提交者的正则（在有时限的子进程中），与大文件校验一起由 bulk worker 处理，
+    # 不占用 interactive 通道
+    "app.tasks.overlap_report_task": "validation-bulk-queue",
+    "app.tasks.profile_submission_task": "validation-bulk-queue",
 }
+# 长任务场景下每个进程只预取一条消息，避免空闲 worker 抢不到已被预取的任务
+celery.conf.worker_prefetch_multiplier = 1
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    """设置 CELERY_METRICS_PORT 时在 worker 中暴露 Prometheus 指标（任务耗时等）"""
+    port = os.getenv("CELERY_METRICS_PORT")
+    if port:
+        from prometheus_client import start_http_server
+        from app.utils.metrics import build_registry
+
+        start_http_server(int(port), registry=build_registry())
 
 @celery.task
 def debug_task():
-return "Celery is working!"
+    return "Celery is working!"
@@ -0,0 +1,109 @@
+# backend/scripts/benchmarks/bench_regex_engines.py
+"""对比 re、RE2 与定宽快速路径在种子规则上的吞吐量，以及病态模式下的最坏耗时
+
+用法: python scripts/benchmarks/bench_regex_engines.py [--values 200000] [--repeat 3]
+"""
+
+import argparse
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from app.utils.matching import ColumnMatcher
+from app.utils.patterns import generate_samples
+from app.utils.regex_engine import CompiledRule, re2
+
+INIT_SQL = Path(__file__).resolve().parents[3] / "db" / "init.sql"
+
+# 种子规则之外的典型变长规则
+EXTRA_PATTERNS = [
+    r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$",
+    r"^\w+(?:\s\w+)*$",
+]
+# (模式, 构造病态输入的函数)：匹配失败前 re 需要指数/多项式次回溯
+PATHOLOGICAL = [
+    (r"^(a+)+$", lambda n: "a" * n + "!"),
+    (r"^(\w+\s?)*$", lambda n: "a" * n + "!"),
+    (r"^(a|aa)+$", lambda n: "a" * n + "!"),
+]
+
+
+def load_seed_patterns(path: Path = INIT_SQL) -> list[str]:
+    """读取 init.sql 中 INSERT INTO rule 的模式列"""
+    sql = path.read_text(encoding="utf-8")
+    block = sql[sql.index("INSERT INTO rule"):]
+    block = block[:block.index(";")]
+    return [value.replace("''", "'") for value in re.findall(r"\(\s*'((?:[^']|'')*)'", block)]
+
+
+def make_values(pattern: str, count: int, seed: int = 0) -> list[str]:
+    """约 80% 满足模式的样本，其余为随机改动一个字符的样本"""
+    rng = random.Random(seed)
+    samples = generate_samples(pattern, 200, seed=seed, max_extra=8) or ["x"]
+    values = []
+    for _ in range(count):
+        value = rng.choice(samples)
+        if rng.random() < 0.2 and value:
+            position = rng.randrange(len(value))
+            value = value[:position] + rng.choice("x-9 é") + value[position + 1:]
+        values.append(value)
+    return values
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--values", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if re2 is None:
+        print("google-re2 is not installed; RE2 columns are skipped")
+    print(f"Throughput on {args.values} values, million values/s (median of {args.repeat} runs)")
+    print(f"  {'pattern':<52}{'re':>8}{'re2':>8}{'column':>8}  path")
+    for pattern in load_seed_patterns() + EXTRA_PATTERNS:
+        values = make_values(pattern, args.values)
+        compiled = re.compile(pattern)
+        rates = {"re": timed(lambda: [compiled.fullmatch(v) for v in values], args.repeat)}
+        if re2 is not None:
+            rule = CompiledRule(pattern, "re2")
+            if rule.engine == "re2":
+                rates["re2"] = timed(lambda: [rule.fullmatch(v) for v in values], args.repeat)
+        matcher = ColumnMatcher(pattern)
+        rates["column"] = timed(lambda: matcher.match(values), args.repeat)
+        row = "".join(
+            f"{args.values / rates[name] / 1e6:8.2f}" if name in rates else f"{'-':>8}"
+            for name in ("re", "re2", "column")
+        )
+        print(f"  {pattern:<52}{row}  {matcher.engine}")
+
+    print("Worst case, ms per value")
+    for pattern, make_input in PATHOLOGICAL:
+        compiled = re.compile(pattern)
+        rule = CompiledRule(pattern, "re2") if re2 is not None else None
+        for n in (16, 20, 22):
+            text = make_input(n)
+            line = f"  {pattern:<18} n={n:<6} re {timed(lambda: compiled.fullmatch(text), 1) * 1000:10.2f}"
+            if rule is not None and rule.engine == "re2":
+                line += f"   re2 {timed(lambda: rule.fullmatch(text), 1) * 1000:8.3f}"
+            print(line)
+        if rule is not None and rule.engine == "re2":
+            text = make_input(100000)
+            print(f"  {pattern:<18} n=100000 re2 {timed(lambda: rule.fullmatch(text), 1) * 1000:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# backend/scripts/benchmarks/bench_serialization.py
+"""对比 /rules 大列表的序列化耗时与压缩后体积
+
+用法: python scripts/benchmarks/bench_serialization.py [--rules 10000] [--repeat 5]
+"""
+
+import argparse
+import gzip
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import orjson
+from app.models import RuleRead
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_rules(count: int) -> list[dict]:
+    return [
+        {
+            "id": i,
+            "pattern": rf"^[A-Z]{{2}}\d{{{4 + i % 6}}}$",
+            "description": f"Identifier format #{i} for clinical trial data exchange",
+            "data_type": ("date", "identifier", "code", "free_text")[i % 4],
+            "region": ("FDA", "EMA", "NMPA", "PMDA")[i % 4],
+            "reference_url": "https://example.org/guidance",
+            "created_at": "2024-01-01T00:00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rules = make_rules(args.rules)
+    serializers = {
+        "pydantic + json": lambda: json.dumps([RuleRead.model_validate(r).model_dump(mode="json") for r in rules]),
+        "json.dumps": lambda: json.dumps(rules),
+        "orjson.dumps": lambda: orjson.dumps(rules),
+    }
+    print(f"{args.rules} rules, median of {args.repeat} runs")
+    for name, fn in serializers.items():
+        print(f"  {name:<18}{timed(fn, args.repeat):10.1f} ms")
+
+    body = orjson.dumps(rules)
+    compressors = {"gzip (level 6)": lambda: gzip.compress(body, 6)}
+    if brotli is not None:
+        compressors["br (quality 4)"] = lambda: brotli.compress(body, quality=4)
+    print(f"  {'raw':<18}{len(body):10d} bytes")
+    for name, fn in compressors.items():
+        print(f"  {name:<18}{len(fn()):10d} bytes {timed(fn, args.repeat):8.1f} ms")
+
+if __name__ == "__main__":
+    main()
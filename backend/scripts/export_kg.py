@@ -1,9 +1,16 @@
 # backend/scripts/export_kg.py
 
+import argparse
+import csv
+import gzip
+import hashlib
+import importlib.util
+import json
 import os
 import re
-import json
-import pandas as pd
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, "..", ".."))
@@ -11,7 +18,14 @@ REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, "..", ".."))
 DATA_DIR = os.path.join(REPO_ROOT, "backend", "data")
 OUT_DIR = os.path.join(REPO_ROOT, "backend", "bioregex_kg")
 
-os.makedirs(OUT_DIR, exist_ok=True)
+# Bump when parsing or output format changes so that every source is rebuilt
+EXPORT_VERSION = 2
+
+NODE_FIELDS = ["id", "label", "source", "regex"]
+EDGE_FIELDS = ["source", "target", "relation"]
+
+# Rows buffered before each Parquet row group is flushed
+PARQUET_BATCH_SIZE = 10000
 
 # ---------------------------
 # Helpers
@@ -28,14 +42,27 @@ def make_regex(term: str) -> str:
     safe = re.escape(term)
     return rf"(?i)\b{safe}\b"
 
-def write_csv(path, rows, header):
-    pd.DataFrame(rows, columns=header).to_csv(path, index=False)
+def file_sha256(path):
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def iter_ndjson_gz(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
 
 # ---------------------------
 # Data parsers
 # ---------------------------
 
 def parse_fda_terms(csv_file):
+    import pandas as pd
+
     if not os.path.exists(csv_file):
         print(f"[WARN] FDA file missing")
         return []
@@ -53,6 +80,8 @@ def parse_fda_terms(csv_file):
     return df[col].dropna().astype(str).unique().tolist()
 
 def parse_ema_terms(xlsx_file):
+    import pandas as pd
+
     if not os.path.exists(xlsx_file):
         print(f"[WARN] EMA file not found: {xlsx_file}")
         return []
@@ -73,6 +102,8 @@ def parse_ema_terms(xlsx_file):
     return df[col].dropna().astype(str).unique().tolist()
 
 def parse_cms_terms(csv_file):
+    import pandas as pd
+
     if not os.path.exists(csv_file):
         print(f"[WARN] CMS file missing")
         return []
@@ -90,6 +121,8 @@ def parse_cms_terms(csv_file):
     return df[col].dropna().astype(str).unique().tolist()
 
 def parse_hipaa_terms(csv_file):
+    import pandas as pd
+
     if not os.path.exists(csv_file):
         print(f"[WARN] HIPAA file missing")
         return []
@@ -106,43 +139,192 @@ def parse_hipaa_terms(csv_file):
 
     return df[col].dropna().astype(str).unique().tolist()
 
+# Source name -> (input file, parser)
+SOURCES = {
+    "fda_drug_names": ("fda_drugs.csv", parse_fda_terms),
+    "ema_medicine_names": ("ema_human_medicines.xlsx", parse_ema_terms),
+    "cms_hospital_names": ("cms_hospitals.csv", parse_cms_terms),
+    "hipaa_breach_types": ("hipaa_breaches.csv", parse_hipaa_terms),
+}
+
 # ---------------------------
-# Build KG
+# Per-source export
 # ---------------------------
 
-def build_kg():
-    sources = {
-        "fda_drug_names": parse_fda_terms(os.path.join(DATA_DIR, "fda_drugs.csv")),
-        "ema_medicine_names": parse_ema_terms(os.path.join(DATA_DIR, "ema_human_medicines.xlsx")),
-        "cms_hospital_names": parse_cms_terms(os.path.join(DATA_DIR, "cms_hospitals.csv")),
-        "hipaa_breach_types": parse_hipaa_terms(os.path.join(DATA_DIR, "hipaa_breaches.csv")),
+class ParquetSink:
+    """Streams rows into a Parquet file in row groups; no-op when pyarrow is not installed"""
+
+    def __init__(self, path, fields):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.writer = None
+            return
+        self.pa = pa
+        self.fields = fields
+        self.schema = pa.schema([(name, pa.string()) for name in fields])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        self.batch = []
+
+    def write(self, row):
+        if self.writer is None:
+            return
+        self.batch.append(row)
+        if len(self.batch) >= PARQUET_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.writer is not None and self.batch:
+            columns = {name: [row[name] for row in self.batch] for name in self.fields}
+            self.writer.write_table(self.pa.table(columns, schema=self.schema))
+            self.batch = []
+
+    def close(self):
+        if self.writer is not None:
+            self.flush()
+            self.writer.close()
+
+def source_paths(out_dir, src):
+    return {
+        "nodes": os.path.join(out_dir, "parts", f"{src}.nodes.ndjson.gz"),
+        "edges": os.path.join(out_dir, "parts", f"{src}.edges.ndjson.gz"),
+        # One file per source; read the whole set with pyarrow.dataset.dataset(out_dir + "/parquet/nodes")
+        "nodes_parquet": os.path.join(out_dir, "parquet", "nodes", f"{src}.parquet"),
+        "edges_parquet": os.path.join(out_dir, "parquet", "edges", f"{src}.parquet"),
     }
 
-    nodes, edges = [], []
+def export_source(src, input_path, out_dir):
+    """Parse one source and stream its nodes/edges to gzipped NDJSON and Parquet parts.
 
-    for src, terms in sources.items():
-        if not terms:
-            print(f"[WARN] No terms for {src}; no regex nodes created.")
-            continue
+    Runs in a worker process; files are written under temporary names and renamed
+    at the end so an interrupted run never leaves a half-written part behind.
+    """
+    _, parser = SOURCES[src]
+    started = time.perf_counter()
+    terms = parser(input_path)
+    if not terms:
+        print(f"[WARN] No terms for {src}; no regex nodes created.")
 
+    paths = source_paths(out_dir, src)
+    tmp = {key: f"{path}.tmp" for key, path in paths.items()}
+    os.makedirs(os.path.dirname(paths["nodes"]), exist_ok=True)
+    node_parquet = ParquetSink(tmp["nodes_parquet"], NODE_FIELDS)
+    edge_parquet = ParquetSink(tmp["edges_parquet"], EDGE_FIELDS)
+    count = 0
+    with gzip.open(tmp["nodes"], "wt", encoding="utf-8") as nodes_out, \
+            gzip.open(tmp["edges"], "wt", encoding="utf-8") as edges_out:
         for t in terms:
             regex = make_regex(t)
             if not regex:
                 continue
             node_id = f"{src}:{t}"
-            nodes.append({"id": node_id, "label": t, "source": src, "regex": regex})
-            edges.append({"source": src, "target": node_id, "relation": "HAS_TERM"})
+            node = {"id": node_id, "label": t, "source": src, "regex": regex}
+            edge = {"source": src, "target": node_id, "relation": "HAS_TERM"}
+            nodes_out.write(json.dumps(node, ensure_ascii=False) + "\n")
+            edges_out.write(json.dumps(edge, ensure_ascii=False) + "\n")
+            node_parquet.write(node)
+            edge_parquet.write(edge)
+            count += 1
+    node_parquet.close()
+    edge_parquet.close()
+
+    for key, path in paths.items():
+        if os.path.exists(tmp[key]):
+            os.replace(tmp[key], path)
+    return {"nodes": count, "edges": count, "seconds": round(time.perf_counter() - started, 3)}
+
+# ---------------------------
+# Build KG
+# ---------------------------
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, "manifest.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        manifest = json.load(f)
+    return manifest if manifest.get("version") == EXPORT_VERSION else {}
+
+def parquet_available():
+    """pyarrow is optional (scripts/requirements.txt); check without importing it"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+def is_current(entry, input_hash, out_dir, src):
+    # Parquet parts only count when this run could write them; a source exported
+    # before pyarrow was installed is rebuilt to add them
+    keys = ("nodes", "edges", "nodes_parquet", "edges_parquet") if parquet_available() else ("nodes", "edges")
+    return (
+        entry is not None
+        and entry.get("sha256") == input_hash
+        and all(os.path.exists(source_paths(out_dir, src)[key]) for key in keys)
+    )
+
+def assemble_outputs(out_dir, sources):
+    """Combine per-source parts into the top-level artifacts without loading them into memory"""
+    for kind in ("nodes", "edges"):
+        # Concatenated gzip members form a valid gzip stream
+        with open(os.path.join(out_dir, f"{kind}.ndjson.gz"), "wb") as out:
+            for src in sources:
+                with open(source_paths(out_dir, src)[kind], "rb") as part:
+                    shutil.copyfileobj(part, out)
+
+    # CSV and compact graph.json are kept for existing consumers and CI checks
+    for kind, fields in (("nodes", NODE_FIELDS), ("edges", EDGE_FIELDS)):
+        with open(os.path.join(out_dir, f"{kind}.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for src in sources:
+                writer.writerows(iter_ndjson_gz(source_paths(out_dir, src)[kind]))
+
+    with open(os.path.join(out_dir, "graph.json"), "w", encoding="utf-8") as f:
+        for kind, opening in (("nodes", '{"nodes":['), ("edges", '],"edges":[')):
+            f.write(opening)
+            first = True
+            for src in sources:
+                for row in iter_ndjson_gz(source_paths(out_dir, src)[kind]):
+                    f.write(("" if first else ",") + json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+                    first = False
+        f.write("]}")
+
+def build_kg(data_dir=DATA_DIR, out_dir=OUT_DIR, workers=None, force=False):
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    entries = manifest.get("sources", {})
+
+    hashes = {src: file_sha256(os.path.join(data_dir, filename)) for src, (filename, _) in SOURCES.items()}
+    changed = [
+        src for src in SOURCES
+        if force or not is_current(entries.get(src), hashes[src], out_dir, src)
+    ]
+    for src in SOURCES:
+        if src not in changed:
+            print(f"[SKIP] {src} unchanged")
+
+    if changed:
+        max_workers = workers or min(len(changed), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                src: pool.submit(export_source, src, os.path.join(data_dir, SOURCES[src][0]), out_dir)
+                for src in changed
+            }
+            for src, future in futures.items():
+                stats = future.result()
+                entries[src] = {"input": SOURCES[src][0], "sha256": hashes[src], **stats}
+                print(f"[OK] {src}: {stats['nodes']} nodes in {stats['seconds']}s")
 
-    # Write CSVs
-    write_csv(os.path.join(OUT_DIR, "nodes.csv"), nodes, ["id", "label", "source", "regex"])
-    write_csv(os.path.join(OUT_DIR, "edges.csv"), edges, ["source", "target", "relation"])
+        assemble_outputs(out_dir, list(SOURCES))
 
-    # JSON export
-    graph = {"nodes": nodes, "edges": edges}
-    with open(os.path.join(OUT_DIR, "graph.json"), "w") as f:
-        json.dump(graph, f, indent=2)
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump({"version": EXPORT_VERSION, "sources": entries}, f, indent=2, sort_keys=True)
 
-    print(f"[DONE] Wrote {os.path.join(OUT_DIR, 'nodes.csv')}, {os.path.join(OUT_DIR, 'edges.csv')}, {os.path.join(OUT_DIR, 'graph.json')}")
+    print(f"[DONE] {len(changed)} of {len(SOURCES)} sources rebuilt into {out_dir}")
+    return changed
 
 if __name__ == "__main__":
-    build_kg()
+    parser = argparse.ArgumentParser(description="Export the BioRegex knowledge graph")
+    parser.add_argument("--workers", type=int, default=None, help="parallel source parsers (default: one per changed source)")
+    parser.add_argument("--force", action="store_true", help="rebuild every source even if its input is unchanged")
+    args = parser.parse_args()
+    build_kg(workers=args.workers, force=args.force)
@@ -7,6 +7,7 @@ sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 from app.models import User, UserCreate
 from app.database import get_engine
+from app.crud import rebuild_rule_indexes
 from sqlmodel import Session, SQLModel, select
 # 从 User 类导入密码哈希方法（或从 security.py 导入）
 from app.models import User  # 确保能访问 User.create_password_hash
@@ -45,6 +46,10 @@ def init_db():
         else:
             print("管理员账户已存在")
 
+        # 为 SQL 脚本导入的历史规则补建关联分组索引与模式指纹
+        count = rebuild_rule_indexes(session)
+        print(f"已重建 {count} 条规则的索引")
+
 if __name__ == "__main__":
     print("Starting database initialization...")
     init_db()
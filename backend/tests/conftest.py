@@ -0,0 +1,23 @@
+import os
+from pathlib import Path
+
+# 测试默认使用本地 SQLite，CI 中可通过环境变量覆盖
+TEST_DB_PATH = Path("/tmp/bioregex-test.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{TEST_DB_PATH}")
+# 测试环境没有 broker，提交分析任务由相关用例显式触发
+os.environ.setdefault("SUBMISSION_PROFILING", "false")
+os.environ.setdefault("OVERLAP_REFRESH", "false")
+
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def create_test_tables():
+    """每次测试会话前重建表结构"""
+    from sqlmodel import SQLModel
+    from app.database import engine, create_db_and_tables
+
+    import app.models  # noqa: F401
+    SQLModel.metadata.drop_all(engine)
+    create_db_and_tables()
+    yield
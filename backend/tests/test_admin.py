@@ -0,0 +1,256 @@
+from fastapi.testclient import TestClient
+from starlette.concurrency import run_in_threadpool
+from sqlmodel import Session
+from sqlalchemy import event
+from app.main import app
+from app.database import engine, get_db
+from app.models import Rule, RuleCreate, RuleSubmission
+from app.utils.security import create_access_token
+from app.utils.profiling import SamplingProfiler, current_profiler
+from app import crud
+from .utils import create_test_user
+import asyncio
+import threading
+import time
+import pytest
+
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="function")
+def test_session():
+    with Session(engine) as session:
+        yield session
+        session.rollback()
+
+
+@pytest.fixture(scope="function")
+def override_dependency(test_session):
+    def get_test_db():
+        yield test_session
+
+    app.dependency_overrides[get_db] = get_test_db
+    yield
+    app.dependency_overrides.clear()
+
+
+def admin_headers(session: Session) -> dict:
+    admin = create_test_user(session, email="admin@test.com", is_admin=True)
+    token = create_access_token({"sub": admin.email})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def submit(session: Session, pattern: str, user_id: int) -> RuleSubmission:
+    submission = RuleSubmission(
+        pattern=pattern,
+        description="Test submission",
+        data_type="Patient ID",
+        region="FDA",
+        submitted_by_id=user_id
+    )
+    session.add(submission)
+    session.commit()
+    session.refresh(submission)
+    return submission
+
+
+def test_pending_submissions_overlap_report(override_dependency, test_session, monkeypatch):
+    from app.tasks import overlap_report_task
+
+    # 每批只读一条候选规则，确认翻页后仍能比较全部候选
+    monkeypatch.setattr(crud, "OVERLAP_CANDIDATE_BATCH", 1)
+    monkeypatch.setattr(crud.settings, "OVERLAP_REFRESH", True)
+    refreshed = []
+    monkeypatch.setattr(overlap_report_task, "apply_async", lambda args, **kwargs: refreshed.append(args[0]))
+    headers = admin_headers(test_session)
+    submitter = create_test_user(test_session, email="submitter@test.com")
+    exact = crud.create_rule(test_session, RuleCreate(
+        pattern=r"^[A-Z]{2}\d{6}$", description="Two letters", data_type="Patient ID", region="FDA"
+    ))
+    broad = crud.create_rule(test_session, RuleCreate(
+        pattern=r"^[A-Z0-9]{8}$", description="Any eight", data_type="Patient ID", region="FDA"
+    ))
+    unrelated = crud.create_rule(test_session, RuleCreate(
+        pattern=r"^\d{3}$", description="Three digits", data_type="Site", region="FDA"
+    ))
+    case_insensitive = crud.create_rule(test_session, RuleCreate(
+        pattern=r"(?i)^[A-Z]{2}\d{6}$", description="Any case", data_type="Patient ID", region="FDA"
+    ))
+    submission = submit(test_session, r"[A-Z][A-Z](\d{6})", submitter.id)
+
+    # 报告由后台任务计算并存储，任务完成前列表中为空
+    response = client.get("/admin/submissions/pending", headers=headers)
+    assert response.status_code == 200, response.text
+    item = next(s for s in response.json() if s["id"] == submission.id)
+    assert item["submitted_by"]["email"] == "submitter@test.com"
+    assert item["overlap_report"] is None
+
+    overlap_report_task.run(submission.id)
+    test_session.expire_all()
+    response = client.get("/admin/submissions/pending", headers=headers)
+    item = next(s for s in response.json() if s["id"] == submission.id)
+    report = item["overlap_report"]
+    # 内联标志不同的规则不算重复
+    assert report["duplicate_of"] == [exact.id]
+    relations = {o["rule_id"]: o["relation"] for o in report["overlaps"]}
+    assert relations[broad.id] == "subsumed_by"
+    assert relations[case_insensitive.id] == "subsumed_by"
+    assert unrelated.id not in relations
+    assert not report["stale"] and not report["timed_out"]
+
+    # 规则目录变更后报告过期：列表标记 stale 并投递重新计算
+    later = crud.create_rule(test_session, RuleCreate(
+        pattern=r"^[A-Z]{2}[0-9]{6}$", description="Later", data_type="Patient ID", region="FDA"
+    ))
+    response = client.get("/admin/submissions/pending", headers=headers)
+    item = next(s for s in response.json() if s["id"] == submission.id)
+    assert item["overlap_report"]["stale"] is True
+    assert submission.id in refreshed
+
+    overlap_report_task.run(submission.id)
+    test_session.expire_all()
+    response = client.get("/admin/submissions/pending", headers=headers)
+    report = next(s for s in response.json() if s["id"] == submission.id)["overlap_report"]
+    assert not report["stale"]
+    assert later.id in {o["rule_id"] for o in report["overlaps"]}
+
+
+def test_overlap_candidates_use_prefix_and_edge_characters(test_session, monkeypatch):
+    rules = {
+        pattern: crud.create_rule(test_session, RuleCreate(
+            pattern=pattern, description="Candidate", data_type="Trial ID", region="FDA"
+        )).id
+        for pattern in (r"^NCT\d{8}$", r"^EU-\d{8}$", r"^\d{11}$", r"^[A-Z]+\d*$", r"^[A-Z]{3}\d{8}x$")
+    }
+    pattern = r"^NCT[0-9]{8}$"
+    candidates, truncated = crud.overlap_candidates(test_session, pattern, "")
+    found = {rule_id for rule_id, _ in candidates} & set(rules.values())
+    # 前缀 EU- 不兼容，\d 开头、x 结尾的首末字符分类不相交
+    assert found == {rules[r"^NCT\d{8}$"], rules[r"^[A-Z]+\d*$"]}
+    assert not truncated
+
+    monkeypatch.setattr(crud.settings, "OVERLAP_MAX_CANDIDATES", 1)
+    candidates, truncated = crud.overlap_candidates(test_session, r".*", "")
+    assert len(candidates) == 1 and truncated
+
+
+def test_overlap_report_times_out_on_backtracking(test_session, monkeypatch):
+    monkeypatch.setattr(crud.settings, "OVERLAP_TIMEOUT_SECONDS", 1)
+    crud.create_rule(test_session, RuleCreate(
+        pattern=r"^EU-\d{3}-\d{4}-\d{4}\.$", description="Trial", data_type="Trial ID", region="EMA"
+    ))
+    start = time.perf_counter()
+    report = crud.get_overlap_report(test_session, r"^(?:(?:.*)*)*x!$")
+    assert report["timed_out"] is True and report["overlaps"] == []
+    assert time.perf_counter() - start < 10
+
+
+def test_batch_review_single_transaction(override_dependency, test_session):
+    headers = admin_headers(test_session)
+    submitter = create_test_user(test_session, email="batch@test.com")
+    first = submit(test_session, r"^BAT\d{4}$", submitter.id)
+    second = submit(test_session, r"^BAT[A-Z]{4}$", submitter.id)
+    third = submit(test_session, r"^REJ\d{2}$", submitter.id)
+
+    commits = []
+
+    def count_commit(session):
+        commits.append(session)
+
+    locked = []
+
+    def record_locks(state):
+        if state.is_select and state.statement.column_descriptions[0]["entity"] is RuleSubmission:
+            locked.append(state.statement._for_update_arg is not None)
+
+    event.listen(test_session, "after_commit", count_commit)
+    event.listen(test_session, "do_orm_execute", record_locks)
+    try:
+        response = client.post("/admin/submissions/review", headers=headers, json={"items": [
+            {"id": first.id, "action": "approve"},
+            {"id": second.id, "action": "approve", "notes": "ok"},
+            {"id": third.id, "action": "reject", "notes": "duplicate"},
+            {"id": 999999, "action": "approve"},
+        ]})
+    finally:
+        event.remove(test_session, "after_commit", count_commit)
+        event.remove(test_session, "do_orm_execute", record_locks)
+    assert response.status_code == 200, response.text
+    assert len(commits) == 1
+    # 审核读取的提交行加了行锁，防止并发批准重复生成规则
+    assert any(locked)
+
+    outcomes = response.json()
+    assert [o["status"] for o in outcomes] == ["approved", "approved", "rejected", "not_found"]
+    for submission in (first, second):
+        test_session.refresh(submission)
+        assert submission.status == "approved"
+        rule = test_session.get(Rule, submission.rule_id)
+        assert rule.pattern == submission.pattern
+    assert outcomes[0]["rule_id"] == first.rule_id
+
+    # 已审核的提交不会重复生成规则
+    response = client.post(f"/admin/submissions/{first.id}/approve", headers=headers)
+    assert response.status_code == 409
+
+
+def test_admin_request_profiling(override_dependency, test_session):
+    headers = admin_headers(test_session)
+    response = client.get("/rules/", headers={**headers, "X-Profile": "1"})
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+
+    profiles = client.get("/admin/profiles", headers=headers).json()
+    assert any(p["id"] == profile_id and p["path"] == "/rules/" for p in profiles)
+
+    folded = client.get(f"/admin/profiles/{profile_id}", headers=headers)
+    assert folded.status_code == 200
+    for line in folded.text.splitlines():
+        stack, _, count = line.rpartition(" ")
+        assert stack and int(count) > 0
+
+    # 非管理员的分析请求被忽略
+    user = create_test_user(test_session, email="noprofile@test.com")
+    token = create_access_token({"sub": user.email})
+    response = client.get("/rules/", params={"_profile": "1"}, headers={"Authorization": f"Bearer {token}"})
+    assert "X-Profile-Id" not in response.headers
+
+
+def _busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def request_work():
+    _busy(0.2)
+
+
+def unrelated_work():
+    _busy(0.2)
+
+
+def test_profiler_samples_only_request_threads():
+    async def other_request():
+        unrelated_work()
+
+    async def profiled_request():
+        profiler = SamplingProfiler(0.002).start()
+        token = current_profiler.set(profiler)
+        try:
+            # 另一个线程与事件循环上的另一个任务同时运行，都不应出现在结果中
+            thread = threading.Thread(target=unrelated_work)
+            thread.start()
+            await run_in_threadpool(request_work)
+            thread.join()
+            await asyncio.create_task(other_request())
+            request_work()
+        finally:
+            current_profiler.reset(token)
+            profiler.stop()
+        return profiler.folded()
+
+    folded = asyncio.run(profiled_request())
+    assert "request_work" in folded
+    assert "unrelated_work" not in folded
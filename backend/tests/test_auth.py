@@ -0,0 +1,62 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from sqlalchemy import event
+from app.main import app
+from app.database import engine, get_db
+from app.utils.security import principal_cache
+from .utils import create_test_user
+import asyncio
+import pytest
+
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="function")
+def test_session():
+    with Session(engine) as session:
+        yield session
+        session.rollback()
+
+
+@pytest.fixture(scope="function")
+def override_dependency(test_session):
+    def get_test_db():
+        yield test_session
+
+    app.dependency_overrides[get_db] = get_test_db
+    yield
+    app.dependency_overrides.clear()
+
+
+def test_login_and_cached_principal(override_dependency, test_session):
+    user = create_test_user(test_session, email="auth@test.com", is_admin=True)
+    response = client.post("/auth/login", data={"username": user.email, "password": "test-pass-123"})
+    assert response.status_code == 200, response.text
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    assert client.post("/auth/login", data={"username": user.email, "password": "wrong"}).status_code == 401
+
+    principal_cache.clear()
+    user_queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if "WHERE user.email" in statement.replace('"', ""):
+            try:
+                asyncio.get_running_loop()
+                on_loop = True
+            except RuntimeError:
+                on_loop = False
+            user_queries.append(on_loop)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        for _ in range(3):
+            assert client.get("/admin/submissions/pending", headers=headers).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    # 只有首次请求需要查询用户表
+    assert len(user_queries) == 1
+    # 缓存未命中时的查询在线程池中执行，不阻塞事件循环
+    assert user_queries == [False]
+    assert principal_cache.get(user.email).is_admin
@@ -0,0 +1,258 @@
+import io
+import json
+import tarfile
+import zipfile
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+import pytest
+
+from app.config import settings
+from app.database import engine
+from app.main import app
+from app.models import Rule
+from app.tasks import validate_file_task
+from app.utils import admission, batch
+
+client = TestClient(app)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+    def decr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) - 1
+        return self.values[key]
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append(lambda: getattr(self.client, name)(*args, **kwargs))
+
+    def expire(self, key, seconds):
+        self.commands.append(lambda: True)
+
+    def execute(self):
+        return [command() for command in self.commands]
+
+
+class FakeGroupResult:
+    saved = {}
+
+    def __init__(self, id, values):
+        self.id = id
+        self.values = values
+        self.forgotten = False
+
+    def save(self):
+        FakeGroupResult.saved[self.id] = self
+
+    def ready(self):
+        return True
+
+    @property
+    def results(self):
+        return [FakeChild(value) for value in self.values]
+
+    def forget(self):
+        self.forgotten = True
+
+
+class FakeChild:
+    def __init__(self, value):
+        self.value = value
+
+    def get(self, propagate=True):
+        return self.value
+
+
+@pytest.fixture
+def batch_env(monkeypatch, tmp_path):
+    """任务在投递时同步执行，Redis 与结果后端替换为内存实现"""
+    from celery.canvas import group
+    from celery.result import GroupResult
+
+    with Session(engine) as session:
+        subject = Rule(pattern=r"[A-Z]{2}\d{3}", description="subject", data_type="identifier", region="FDA")
+        term = Rule(pattern=r"[A-Z ]+", description="term", data_type="term", region="FDA")
+        session.add(subject)
+        session.add(term)
+        session.commit()
+        rules = (subject.id, term.id)
+
+    redis = FakeRedis()
+    monkeypatch.setattr(settings, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(admission, "get_redis", lambda: redis)
+    monkeypatch.setattr(batch, "get_redis", lambda: redis)
+    monkeypatch.setattr(admission, "queue_depths", lambda queues: {q: 0 for q in queues})
+    dispatched = []
+
+    def apply_async(self, task_id=None, **options):
+        dispatched.extend(sig.options["queue"] for sig in self.tasks)
+        return FakeGroupResult(task_id, [sig.type.run(*sig.args, **sig.kwargs) for sig in self.tasks])
+
+    monkeypatch.setattr(group, "apply_async", apply_async)
+    monkeypatch.setattr(GroupResult, "restore", classmethod(lambda cls, id, app=None: FakeGroupResult.saved.get(id)))
+    yield rules, redis, dispatched, tmp_path
+
+    with Session(engine) as session:
+        for rule_id in rules:
+            session.delete(session.get(Rule, rule_id))
+        session.commit()
+
+
+def zip_bytes(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def tar_bytes(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def test_batch_validates_archive_members_with_profiles(batch_env):
+    (subject, term), redis, dispatched, staging = batch_env
+    archive = zip_bytes({
+        "study/dm.csv": b"USUBJID,AGE\nAB001,30\nAB002,41\n",
+        "study/ae.csv": b"USUBJID,AETERM\nAB001,HEADACHE\nbad,nausea\n",
+        "study/readme.txt": b"not data",
+        "__MACOSX/._dm.csv": b"",
+    })
+    lb = tar_bytes({"lb.csv": b"USUBJID\nAB001\nXX9\n"})
+    profile = {
+        "dm.csv": [subject],
+        "ae*.csv": [{"rule_id": subject, "column": "usubjid"}, {"rule_id": term, "column": "aeterm"}],
+        "lb.csv": [subject],
+    }
+    response = client.post(
+        "/validate/batch",
+        data={"profile": json.dumps(profile)},
+        files=[("files", ("transfer.zip", archive, "application/zip")),
+               ("files", ("lab.tar.gz", lb, "application/gzip"))],
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["files"] == 3
+    assert body["skipped"] == ["transfer.zip/study/readme.txt"]
+    assert dispatched == [admission.BULK_QUEUE] * 3
+    # 每个文件校验后即删除暂存文件，最后一个文件结束后归还在途名额并删除目录
+    assert not (staging / "batches" / body["job_id"]).exists()
+    assert admission.INFLIGHT_KEY.format(owner="ip:testclient") not in redis.values
+
+    report = client.get(f"/validate/batch/{body['job_id']}").json()
+    assert report["status"] == "completed"
+    summary = report["report"]
+    assert (summary["files"], summary["passed"], summary["failed"], summary["errors"]) == (3, 1, 2, 0)
+    assert summary["skipped"] == ["transfer.zip/study/readme.txt"]
+    results = {r["file"]: r for r in summary["results"]}
+    ae = results["transfer.zip/study/ae.csv"]
+    assert [(c["rule_id"], c["column"], c["invalid_count"]) for c in ae["checks"]] == [
+        (subject, "usubjid", 1), (term, "aeterm", 1)
+    ]
+    assert ae["checks"][0]["invalid_samples"] == [{"row": 1, "value": "bad"}]
+    assert results["lab.tar.gz/lb.csv"]["checks"][0]["invalid_samples"] == [{"row": 1, "value": "XX9"}]
+    assert results["transfer.zip/study/dm.csv"]["checks"][0]["column"] == "usubjid"
+    assert summary["rows"] == 6
+    assert FakeGroupResult.saved[body["job_id"]].forgotten
+
+
+def test_batch_rejects_bad_requests(batch_env, monkeypatch):
+    (subject, _), redis, dispatched, _ = batch_env
+    csv = ("dm.csv", b"USUBJID\nAB001\n", "text/csv")
+
+    def post(profile, files=(csv,)):
+        return client.post("/validate/batch", data={"profile": profile}, files=[("files", f) for f in files])
+
+    assert post("not json").status_code == 400
+    assert post(json.dumps({"dm.csv": ["one"]})).status_code == 400
+    assert post(json.dumps({"dm.csv": [999999]})).status_code == 404
+    assert post(json.dumps({"ae.csv": [subject]})).status_code == 400
+    assert post(json.dumps({"*": [subject]}), [("broken.zip", b"not a zip", "application/zip")]).status_code == 400
+
+    monkeypatch.setattr(settings, "VALIDATION_BATCH_MAX_BYTES", 10)
+    response = post(json.dumps({"*": [subject]}), [("big.zip", zip_bytes({"dm.csv": b"x" * 100}), "application/zip")])
+    assert response.status_code == 400
+    assert "bytes" in response.json()["detail"]
+
+    # 被拒绝的请求不占用在途名额，也不投递任务
+    assert redis.values.get(admission.INFLIGHT_KEY.format(owner="ip:testclient"), 0) == 0
+    assert dispatched == []
+
+
+def test_batch_file_errors_are_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "get_redis", lambda: FakeRedis())
+    path = tmp_path / "0000_dm.csv"
+    path.write_bytes(b"USUBJID\nAB001\n")
+    checks = [{"rule_id": 1, "pattern": r"[A-Z]{2}\d{3}", "engine": "auto", "column": "missing"}]
+    result = validate_file_task.run("job", str(path), "dm.csv", checks)
+    assert result["file"] == "dm.csv"
+    assert "missing" in result["error"]
+    assert not path.exists()
+
+    # API 与 worker 未共享 UPLOAD_DIR 时暂存文件不存在
+    result = validate_file_task.run("job", str(tmp_path / "0001_lb.csv"), "lb.csv", checks)
+    assert result == {"file": "lb.csv", "error": "Staged file not found on the worker"}
+
+
+def test_batch_result_is_msgpack_serializable(tmp_path, monkeypatch):
+    import numpy as np
+    import pandas as pd
+    from kombu import serialization
+    from app.utils import file_parsers
+
+    # SAS / Excel 分块读出 numpy 数值与 Timestamp
+    chunk = pd.DataFrame({
+        "visit": pd.to_datetime(["2024-02-03 10:30", None]),
+        "dose": np.array([2.0, np.nan]),
+    })
+    monkeypatch.setattr(file_parsers, "iter_file_chunks", lambda upload, chunk_rows, columns: iter([chunk]))
+    monkeypatch.setattr(batch, "get_redis", lambda: FakeRedis())
+    path = tmp_path / "0000_vs.sas7bdat"
+    path.write_bytes(b"")
+    checks = [
+        {"rule_id": 1, "pattern": r"[A-Z]{2}\d{3}", "engine": "auto", "column": "visit"},
+        {"rule_id": 2, "pattern": r"[A-Z]{2}\d{3}", "engine": "auto", "column": "dose"},
+    ]
+    result = validate_file_task.run("job", str(path), "vs.sas7bdat", checks)
+    assert [check["invalid_samples"] for check in result["checks"]] == [
+        [{"row": 0, "value": "2024-02-03T10:30:00"}, {"row": 1, "value": None}],
+        [{"row": 0, "value": 2.0}, {"row": 1, "value": None}],
+    ]
+    content_type, encoding, payload = serialization.dumps(result, serializer="msgpack")
+    assert serialization.loads(payload, content_type, encoding, accept=[content_type]) == result
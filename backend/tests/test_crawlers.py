@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlmodel import Session, select
+
+from app import crud
+from app.config import settings
+from app.database import engine
+from app.models import CrawlState, Rule
+from app.utils import crawlers
+from app.utils.crawlers import AsyncCrawler, ValidatorCache
+
+LISTING = """
+<ul>
+  <li class="fda-guidance-list-item"><h3><a href="/doc/1">Dates in submissions</a></h3><span class="date">March 1, 2024</span></li>
+  <li class="fda-guidance-list-item"><h3><a href="/doc/2">Patient identifiers</a></h3><span class="date">April 2, 2024</span></li>
+</ul>
+"""
+DOCUMENTS = {
+    "/doc/1": "Dates must be formatted as 2024-01-31 in all datasets.",
+    "/doc/2": "Subject IDs look like ABC12345.",
+}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """模拟监管站点：文档支持 ETag，/flaky 前两次返回 503"""
+
+    requests = []
+    active = 0
+    max_active = 0
+    flaky_failures = 2
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.requests.append((self.path, self.headers.get("If-None-Match")))
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        try:
+            time.sleep(0.05)
+            if self.path == "/listing":
+                self._send(200, LISTING)
+            elif self.path in DOCUMENTS or self.path.startswith("/slow/"):
+                body = DOCUMENTS.get(self.path, "slow")
+                etag = f'"{crawlers.content_hash(body)[:12]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, "", etag)
+                else:
+                    self._send(200, body, etag)
+            elif self.path == "/flaky":
+                with cls.lock:
+                    cls.flaky_failures -= 1
+                    failing = cls.flaky_failures >= 0
+                self._send(503, "busy") if failing else self._send(200, "recovered")
+            else:
+                self._send(404, "missing")
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def _send(self, status, body, etag=None):
+        data = body.encode()
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        if status != 304:
+            self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_server():
+    StandInHandler.requests = []
+    StandInHandler.max_active = 0
+    StandInHandler.flaky_failures = 2
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_conditional_get_skips_unchanged_documents(stand_in_server):
+    cache = ValidatorCache()
+
+    async def run():
+        async with AsyncCrawler(cache=cache, per_host_rate=0) as crawler:
+            first = await crawler.fetch(f"{stand_in_server}/doc/1")
+            second = await crawler.fetch(f"{stand_in_server}/doc/1")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.status_code == 200 and first.text == DOCUMENTS["/doc/1"]
+    assert second.not_modified
+    assert StandInHandler.requests[-1] == ("/doc/1", first.etag)
+
+
+def test_retries_with_backoff(stand_in_server):
+    async def run():
+        async with AsyncCrawler(cache=ValidatorCache(), per_host_rate=0, backoff=0.01) as crawler:
+            return await crawler.fetch(f"{stand_in_server}/flaky"), await crawler.fetch(f"{stand_in_server}/missing")
+
+    recovered, missing = asyncio.run(run())
+    assert recovered.text == "recovered"
+    assert [path for path, _ in StandInHandler.requests].count("/flaky") == 3
+    # 404 不重试
+    assert missing.status_code == 404
+    assert [path for path, _ in StandInHandler.requests].count("/missing") == 1
+
+
+def test_concurrency_and_per_host_rate(stand_in_server):
+    urls = [f"{stand_in_server}/slow/{i}" for i in range(12)]
+
+    async def run(**options):
+        async with AsyncCrawler(cache=ValidatorCache(), **options) as crawler:
+            start = time.perf_counter()
+            results = await crawler.fetch_all(urls)
+            return results, time.perf_counter() - start
+
+    results, _ = asyncio.run(run(concurrency=3, per_host_rate=0))
+    assert all(r.status_code == 200 for r in results)
+    assert StandInHandler.max_active == 3
+
+    _, elapsed = asyncio.run(run(concurrency=12, per_host_rate=40))
+    # 12 个请求按每秒 40 个的间隔发出，至少需要 11 个间隔
+    assert elapsed >= 11 / 40
+
+
+def test_incremental_crawl_against_stand_in(stand_in_server, monkeypatch):
+    monkeypatch.setattr(settings, "FDA_GUIDANCE_URL", f"{stand_in_server}/listing")
+    monkeypatch.setattr(settings, "CRAWL_PER_HOST_RATE", 0)
+    monkeypatch.setattr(settings, "CRAWL_BATCH_SIZE", 1)
+    monkeypatch.setitem(DOCUMENTS, "/doc/2", DOCUMENTS["/doc/2"])
+    try:
+        new_rules = crawlers.crawl_fda()
+        assert {(r.data_type, r.reference_url) for r in new_rules} == {
+            ("DATE", f"{stand_in_server}/doc/1"),
+            ("PATIENT_ID", f"{stand_in_server}/doc/2"),
+        }
+
+        # 第二次运行：条件请求命中 304，不再生成规则
+        assert crawlers.crawl_fda() == []
+        assert StandInHandler.requests[-1][1] is not None
+
+        # 文档更新后只补充新出现的模式
+        DOCUMENTS["/doc/2"] += " Visits on 2024-02-01."
+        new_rules = crawlers.crawl_fda()
+        assert [(r.data_type, r.reference_url) for r in new_rules] == [("DATE", f"{stand_in_server}/doc/2")]
+
+        with Session(engine) as session:
+            states = crud.get_crawl_states(session, [f"{stand_in_server}/doc/1", f"{stand_in_server}/doc/2"])
+            assert states[f"{stand_in_server}/doc/2"].last_changed is not None
+            assert states[f"{stand_in_server}/doc/1"].content_hash == crawlers.content_hash(DOCUMENTS["/doc/1"])
+    finally:
+        with Session(engine) as session:
+            for rule in session.exec(select(Rule).where(Rule.reference_url.startswith(stand_in_server))).all():
+                crud.delete_rule(session, rule.id)
+            for state in session.exec(select(CrawlState).where(CrawlState.url.startswith(stand_in_server))).all():
+                session.delete(state)
+            session.commit()
@@ -0,0 +1,56 @@
+import gzip
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "export_kg.py"
+spec = importlib.util.spec_from_file_location("export_kg", SCRIPT)
+export_kg = importlib.util.module_from_spec(spec)
+sys.modules["export_kg"] = export_kg  # 进程池按模块名反序列化 export_source
+spec.loader.exec_module(export_kg)
+
+
+def write_inputs(data_dir: Path, drugs):
+    (data_dir / "fda_drugs.csv").write_text("id,generic_name\n" + "".join(f"{i},{d}\n" for i, d in enumerate(drugs)))
+    (data_dir / "hipaa_breaches.csv").write_text("Name,Type of Breach\nA,Theft\nB,Hacking/IT Incident\n")
+
+
+def test_incremental_export(tmp_path):
+    data_dir, out_dir = tmp_path / "data", tmp_path / "kg"
+    data_dir.mkdir()
+    write_inputs(data_dir, ["ASPIRIN", "IBUPROFEN"])
+
+    assert set(export_kg.build_kg(data_dir, out_dir, workers=2)) == set(export_kg.SOURCES)
+    graph = json.loads((out_dir / "graph.json").read_text())
+    assert {n["label"] for n in graph["nodes"]} == {"ASPIRIN", "IBUPROFEN", "Theft", "Hacking/IT Incident"}
+    assert len(graph["edges"]) == 4
+    assert (out_dir / "nodes.csv").read_text().count("\n") == 5
+
+    # 未变化的输入全部跳过
+    assert export_kg.build_kg(data_dir, out_dir) == []
+
+    # 只重建变化的来源，合并输出仍包含全部来源
+    write_inputs(data_dir, ["ASPIRIN", "IBUPROFEN", "PARACETAMOL"])
+    assert export_kg.build_kg(data_dir, out_dir) == ["fda_drug_names"]
+    with gzip.open(out_dir / "nodes.ndjson.gz", "rt") as f:
+        labels = [json.loads(line)["label"] for line in f]
+    assert sorted(labels) == sorted(["ASPIRIN", "IBUPROFEN", "PARACETAMOL", "Theft", "Hacking/IT Incident"])
+    manifest = json.loads((out_dir / "manifest.json").read_text())
+    assert manifest["sources"]["fda_drug_names"]["nodes"] == 3
+
+
+def test_missing_parquet_outputs_trigger_rebuild(tmp_path, monkeypatch):
+    data_dir, out_dir = tmp_path / "data", tmp_path / "kg"
+    data_dir.mkdir()
+    write_inputs(data_dir, ["ASPIRIN"])
+    export_kg.build_kg(data_dir, out_dir, workers=1)
+
+    # 安装 pyarrow 之后，缺少 Parquet 输出的来源需要重建
+    monkeypatch.setattr(export_kg, "parquet_available", lambda: True)
+    (out_dir / "parquet" / "nodes" / "fda_drug_names.parquet").unlink(missing_ok=True)
+    assert "fda_drug_names" in export_kg.build_kg(data_dir, out_dir, workers=1)
+
+    # 未安装 pyarrow 时只检查 NDJSON 输出
+    monkeypatch.setattr(export_kg, "parquet_available", lambda: False)
+    assert export_kg.build_kg(data_dir, out_dir) == []
@@ -0,0 +1,100 @@
+import random
+import re
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import crud
+from app.catalog import rule_catalog
+from app.database import engine
+from app.main import app
+from app.models import RuleCreate
+from app.utils.crawlers import FDA_PATTERNS, extract_regex_from_text
+from app.utils.extraction import MultiPatternExtractor
+
+
+client = TestClient(app)
+
+
+def chunked(text, rng):
+    start = 0
+    while start < len(text):
+        size = rng.randint(1, 40)
+        yield text[start:start + size]
+        start += size
+
+
+def test_streaming_matches_whole_document():
+    patterns = dict(FDA_PATTERNS, WORD=r"\bfoo\w*", REPEAT=r"(?P<x>ab)(?P=x)")
+    extractor = MultiPatternExtractor(patterns, max_offsets=10 ** 6)
+    rng = random.Random(7)
+    for _ in range(100):
+        text = "".join(rng.choice("ABC0123456789- foo\nab") for _ in range(rng.randint(0, 2000)))
+        whole = extractor.extract(text)
+        streamed = extractor.extract_stream(chunked(text, rng))
+        assert streamed.counts == whole.counts
+        assert streamed.offsets == whole.offsets
+        # 含反向引用的模式单独扫描，结果与 re.finditer 一致
+        assert whole.offsets["REPEAT"] == [m.span() for m in re.finditer(patterns["REPEAT"], text)]
+
+
+def test_full_document_is_scanned():
+    text = "x" * 50_000 + " Visit date 2024-03-01, subject ABC12345."
+    found = {p["data_type"]: p for p in extract_regex_from_text(text, "FDA")}
+    assert set(found) == {"DATE", "PATIENT_ID"}
+    assert found["DATE"]["count"] == 1
+    assert found["DATE"]["offsets"] == [(50_012, 50_022)]
+
+
+def test_offsets_are_capped_but_counts_are_not():
+    extractor = MultiPatternExtractor({"DIGIT": r"\d"}, max_offsets=3)
+    result = extractor.extract("1 2 3 4 5")
+    assert result.counts == {"DIGIT": 5}
+    assert result.offsets["DIGIT"] == [(0, 1), (2, 3), (4, 5)]
+
+
+def test_extract_endpoint_against_catalog():
+    with Session(engine) as session:
+        rule_id = crud.create_rule(session, RuleCreate(
+            pattern=r"^NCT\d{8}$", description="trial id", data_type="trial_id", region="FDA"
+        )).id
+    # 其他用例在回滚的事务中刷新过目录，版本号可能与本次提交后的相同，先让快照失效
+    rule_catalog.version = None
+    try:
+        document = "Registered as NCT01234567.\nNCT07654321\n" * 3
+        response = client.post(
+            "/validate/extract", data={"source": "catalog"},
+            files={"file": ("guidance.txt", document.encode(), "text/plain")},
+        )
+        assert response.status_code == 200
+        matches = {m["name"]: m for m in response.json()["matches"]}
+        # 目录规则去掉锚点后在全文中查找
+        assert matches[f"rule:{rule_id}"]["count"] == 6
+
+        response = client.post(
+            "/validate/extract", data={"source": "PMDA"},
+            files={"file": ("guidance.txt", b"text", "text/plain")},
+        )
+        assert response.status_code == 400
+    finally:
+        with Session(engine) as session:
+            crud.delete_rule(session, rule_id)
+
+
+def test_unbounded_matches_are_not_split_at_chunk_boundaries():
+    extractor = MultiPatternExtractor({"A": r"\d+"}, max_match_length=4)
+    text = "ab1234567890cd"
+    whole = extractor.extract(text)
+    assert whole.offsets == {"A": [(2, 12)]}
+    assert extractor.extract_stream([text[:8], text[8:]]).offsets == whole.offsets
+    assert extractor.extract_stream(text).offsets == whole.offsets
+
+    patterns = {"DIGITS": r"\d+", "WORD": r"\bfoo\w*", "CODE": r"[A-C]{2}\d{2,}"}
+    combined = MultiPatternExtractor(patterns, max_offsets=10 ** 6, max_match_length=4)
+    independent = MultiPatternExtractor(patterns, independent=True, max_offsets=10 ** 6, max_match_length=4)
+    rng = random.Random(11)
+    for _ in range(100):
+        text = "".join(rng.choice("ABC0123456789 foo") for _ in range(rng.randint(0, 1000)))
+        expected = {name: [m.span() for m in re.finditer(pattern, text)] for name, pattern in patterns.items()}
+        assert independent.extract_stream(chunked(text, rng)).offsets == expected
+        assert combined.extract_stream(chunked(text, rng)).offsets == combined.extract(text).offsets
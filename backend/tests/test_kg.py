@@ -0,0 +1,97 @@
+import csv
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.kg import KnowledgeGraph, kg_store
+from app.main import app
+
+
+client = TestClient(app)
+
+
+def write_export(kg_dir, terms, mtime=None):
+    """按 export_kg.py 的格式写出 nodes.csv / edges.csv"""
+    with open(kg_dir / "nodes.csv", "w", newline="") as nodes_file, \
+            open(kg_dir / "edges.csv", "w", newline="") as edges_file:
+        nodes = csv.writer(nodes_file)
+        edges = csv.writer(edges_file)
+        nodes.writerow(["id", "label", "source", "regex"])
+        edges.writerow(["source", "target", "relation"])
+        for source, label in terms:
+            nodes.writerow([f"{source}:{label}", label, source, ""])
+            edges.writerow([source, f"{source}:{label}", "HAS_TERM"])
+    if mtime is not None:
+        for name in ("nodes.csv", "edges.csv"):
+            os.utime(kg_dir / name, (mtime, mtime))
+
+
+@pytest.fixture
+def kg_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "KG_DIR", tmp_path)
+    monkeypatch.setattr(settings, "KG_RELOAD_CHECK_SECONDS", 0)
+    monkeypatch.setattr(kg_store, "_graph", None)
+    write_export(tmp_path, [
+        ("fda_drug_names", "NAPROXEN"),
+        ("fda_drug_names", "Naproxen Sodium"),
+        ("fda_drug_names", "IBUPROFEN"),
+        ("ema_medicine_names", "Nasonex"),
+    ], mtime=1_000_000)
+    return tmp_path
+
+
+def test_adjacency_index():
+    graph = KnowledgeGraph(
+        [{"id": "a", "label": "Alpha", "source": "s"}, {"id": "b", "label": "Beta", "source": "s"}],
+        [
+            {"source": "hub", "target": "a", "relation": "HAS_TERM"},
+            {"source": "hub", "target": "b", "relation": "HAS_TERM"},
+            {"source": "a", "target": "b", "relation": "SYNONYM"},
+        ],
+    )
+    assert len(graph) == 3 and graph.edge_count == 3
+    total, neighbors = graph.neighbors("hub")
+    assert total == 2 and [n["id"] for n in neighbors] == ["a", "b"]
+    assert [n["id"] for n in graph.neighbors("b", direction="in")[1]] == ["hub", "a"]
+    assert graph.neighbors("a", relation="SYNONYM")[1][0]["id"] == "b"
+    assert graph.neighbors("a", relation="MISSING") == (0, [])
+    assert graph.neighbors("missing") is None
+    assert graph.get("hub")["source"] is None
+
+
+def test_kg_endpoints_and_hot_swap(kg_dir):
+    response = client.get("/kg/terms", params={"prefix": "NAP"})
+    assert [term["label"] for term in response.json()] == ["NAPROXEN", "Naproxen Sodium"]
+    response = client.get("/kg/terms", params={"prefix": "na", "source": "ema_medicine_names"})
+    assert [term["label"] for term in response.json()] == ["Nasonex"]
+
+    assert client.get("/kg/sources").json() == {"fda_drug_names": 3, "ema_medicine_names": 1}
+    response = client.get("/kg/sources/fda_drug_names/terms", params={"limit": 1, "offset": 1})
+    assert response.json()["total"] == 3
+    assert response.json()["terms"][0]["label"] == "Naproxen Sodium"
+
+    response = client.get("/kg/nodes/fda_drug_names/neighbors", params={"limit": 2})
+    assert response.json()["total"] == 3 and len(response.json()["neighbors"]) == 2
+    response = client.get("/kg/nodes/fda_drug_names:IBUPROFEN/neighbors", params={"direction": "in"})
+    assert response.json()["neighbors"][0]["id"] == "fda_drug_names"
+    assert client.get("/kg/nodes/fda_drug_names:IBUPROFEN").json()["label"] == "IBUPROFEN"
+    assert client.get("/kg/nodes/unknown").status_code == 404
+
+    # 新导出落地后，下一次请求即切换到新图
+    before = kg_store.get()
+    write_export(kg_dir, [("fda_drug_names", "ASPIRIN")], mtime=2_000_000)
+    assert client.get("/kg/stats").json()["nodes"] == 2
+    assert kg_store.get() is not before
+    assert client.get("/kg/terms", params={"prefix": "nap"}).json() == []
+
+    # 导出损坏时保留旧图
+    (kg_dir / "edges.csv").write_text("broken\n")
+    assert client.get("/kg/terms", params={"prefix": "asp"}).json()[0]["label"] == "ASPIRIN"
+
+
+def test_kg_missing_export(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "KG_DIR", tmp_path)
+    monkeypatch.setattr(kg_store, "_graph", None)
+    assert client.get("/kg/stats").status_code == 503
@@ -0,0 +1,55 @@
+import random
+import re
+
+import pytest
+
+from app.utils.matching import ColumnMatcher
+from app.utils.patterns import fixed_width_tables
+
+
+FIXED_WIDTH_PATTERNS = [
+    r"^[A-Z]{3}\d{5}$",
+    r"^\d{4}-\d{2}-\d{2}$",
+    r"^EU-\d{3}-\d{4}-\d{4}$",
+    r"(?i)ab[^c]\w",
+    r"\s\S.\D",
+    r"(?s)..",
+    r"(?i:[a-c])\W(?:x\d){2}",
+    r"",
+]
+# 含非 ASCII 数字、大小写特殊字符（KELVIN SIGN）、换行与 \0，覆盖回退路径与边界情况
+ALPHABET = "0123456789ABCDEFabcdefx-_ \n\x00éK٣"
+
+
+@pytest.mark.parametrize("pattern", FIXED_WIDTH_PATTERNS)
+def test_fixed_width_matches_re(pattern):
+    matcher = ColumnMatcher(pattern)
+    assert matcher.fixed_width
+    width = len(matcher.tables)
+    rng = random.Random(pattern)
+    values = ["".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, width + 2))) for _ in range(3000)]
+    values += ["".join(rng.choice(ALPHABET) for _ in range(width)) for _ in range(3000)]
+    values += [None, float("nan"), 12345678]
+
+    compiled = re.compile(pattern)
+    expected = [compiled.fullmatch(str(value)) is not None for value in values]
+    assert matcher.match(values).tolist() == expected
+
+
+@pytest.mark.parametrize("pattern", [r"\d+", r"(a|bc)", r"(x)\1", r"\bab", r"a(?=b)b", r"\d{2,3}"])
+def test_other_patterns_fall_back_to_re(pattern):
+    assert fixed_width_tables(pattern) is None
+    matcher = ColumnMatcher(pattern)
+    values = ["12", "123", "bc", "xx", "ab", "1234"]
+    assert matcher.match(values).tolist() == [re.fullmatch(pattern, v) is not None for v in values]
+
+
+def test_task_uses_fullmatch():
+    import pandas as pd
+    from app.tasks import validate_data_task
+
+    data_json = pd.DataFrame({"code": ["ABC12345", "ABC123456", "abc12345"]}).to_json(orient="split")
+    result = validate_data_task.run(r"[A-Z]{3}\d{5}", data_json)
+    # 任务与同步路径一致使用 fullmatch，前缀匹配的 "ABC123456" 不再视为通过
+    assert result["invalid_count"] == 2
+    assert [row["code"] for row in result["invalid_samples"]] == ["ABC123456", "abc12345"]
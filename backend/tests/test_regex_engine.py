@@ -0,0 +1,114 @@
+import random
+import re
+import time
+from pathlib import Path
+
+import pytest
+from pydantic import ValidationError
+
+from app.models import RuleCreate, RuleUpdate
+from app.utils.matching import ColumnMatcher
+from app.utils.patterns import generate_samples
+from app.utils.regex_engine import CompiledRule, backtracking_risk, translate_to_re2
+
+INIT_SQL = Path(__file__).resolve().parents[2] / "db" / "init.sql"
+
+
+def seed_patterns() -> list[str]:
+    sql = INIT_SQL.read_text(encoding="utf-8")
+    block = sql[sql.index("INSERT INTO rule"):]
+    return re.findall(r"\(\s*'((?:[^']|'')*)'", block[:block.index(";")])
+
+
+DIFFERENTIAL_PATTERNS = seed_patterns() + [
+    r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$",
+    r"^\w+(?:\s\w+)*$",
+    r"(?i)^(?:mr|mrs|dr)\.?\s+[a-z]+$",
+    r"\bNCT\d{8}\b",
+    r"^\s*(\d+|[a-f]+)*?\s*$",
+    r"^[^\W\d_]+-\D{2,4}.$",
+    r"(?s)a.{0,3}z",
+    r"(?i:[k-m]\S)+x?",
+    r"^(a+)+$",
+    r"(?i)^[a-z]+$",
+    r"(?a)^\w+(?:\s\w+)*\b$",
+    r"^[^é]+ß?[\u0600-\u06ff]*$",
+    r"^[\ud800-\udfff]$",
+]
+# 含非 ASCII 字符（包括忽略大小写时规则特殊的 İ、ı、ſ、开尔文符号），确认结果与 re 完全一致
+ALPHABET = "abkmxzAKMNZ019_-.@ \t\n\x0b\x1cé٣KİıſΣς"
+
+
+def differential_inputs(pattern: str, rng: random.Random) -> list[str]:
+    values = generate_samples(pattern, 30, max_extra=4)
+    for value in list(values):
+        for _ in range(3):
+            position = rng.randrange(len(value) + 1)
+            values.append(value[:position] + rng.choice(ALPHABET) + value[position + 1:])
+    values += ["".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 12))) for _ in range(300)]
+    return values + ["", "\n", "a\ud800", "\U0010ffff"]
+
+
+@pytest.mark.parametrize("pattern", DIFFERENTIAL_PATTERNS)
+def test_re2_matches_re(pattern):
+    pytest.importorskip("re2")
+    rule = CompiledRule(pattern, "re2")
+    # Unicode 语义的 \d、\w、\s、\b 与忽略大小写无法等价改写，拒绝 RE2 而不是按取值回退
+    assert rule.engine == ("re2" if translate_to_re2(pattern) is not None else "re")
+    compiled = re.compile(pattern)
+    for value in differential_inputs(pattern, random.Random(pattern)):
+        assert rule.fullmatch(value) == (compiled.fullmatch(value) is not None), (pattern, value)
+
+
+@pytest.mark.parametrize("pattern", [
+    r"(x)\1", r"a(?=b)b", r"a$b", r"(?m)^a", r"a{2000}", r"(?>a+)b", r"^\d+$", r"(?i)^a+$", r"\bx",
+])
+def test_unsupported_syntax_falls_back_to_re(pattern):
+    assert translate_to_re2(pattern) is None
+    rule = CompiledRule(pattern, "re2")
+    assert rule.engine == "re"
+    assert rule.fullmatch("xx") == (re.fullmatch(pattern, "xx") is not None)
+
+
+def test_auto_uses_re2_only_for_backtracking_risk():
+    pytest.importorskip("re2")
+    assert backtracking_risk(r"^(a+)+$") and backtracking_risk(r"(a|ab)*c")
+    assert not backtracking_risk(r"^[A-Z]{3}\d{5}$") and not backtracking_risk(r"(\d{2})+")
+    assert CompiledRule(r"^(a+)+$").engine == "re2"
+    assert CompiledRule(r"^[a-z]+@[a-z]+$").engine == "re"
+    assert CompiledRule(r"^(a+)+$", "re").engine == "re"
+
+    # 线性时间：re 在此输入上需要数十秒
+    matcher = ColumnMatcher(r"^(a+)+$")
+    start = time.perf_counter()
+    assert matcher.match(["a" * 40 + "!", "a" * 40]).tolist() == [False, True]
+    assert time.perf_counter() - start < 1
+
+
+def test_re2_handles_non_ascii_values_in_linear_time():
+    pytest.importorskip("re2")
+    rule = CompiledRule(r"^(a+)+$", "re2")
+    assert rule.engine == "re2"
+    start = time.perf_counter()
+    assert not rule.fullmatch("a" * 40 + "é")
+    assert not rule.fullmatch("a" * 40 + "\ud800")
+    assert time.perf_counter() - start < 1
+
+
+def test_rule_engine_field_is_validated():
+    rule = RuleCreate(pattern=r"^\d+$", description="Digits", data_type="Code", region="FDA")
+    assert rule.engine == "auto"
+    with pytest.raises(ValidationError):
+        RuleCreate(pattern=r"^\d+$", description="Digits", data_type="Code", region="FDA", engine="pcre")
+    assert RuleUpdate(engine="re2").engine == "re2"
+    with pytest.raises(ValidationError):
+        RuleUpdate(engine="pcre")
+
+
+def test_re2_engine_refused_without_exact_translation():
+    with pytest.raises(ValidationError):
+        RuleCreate(pattern=r"^\d+$", description="Digits", data_type="Code", region="FDA", engine="re2")
+    with pytest.raises(ValidationError):
+        RuleUpdate(pattern=r"^\w+$", engine="re2")
+    rule = RuleCreate(pattern=r"^[0-9]+$", description="Digits", data_type="Code", region="FDA", engine="re2")
+    assert rule.engine == "re2"
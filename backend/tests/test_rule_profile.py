@@ -0,0 +1,167 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+import pytest
+
+from app.config import settings
+from app.database import engine, get_db
+from app.main import app
+from app.utils import regex_engine
+from app.utils import rule_profile
+from app.utils.matching import ColumnMatcher
+from app.utils.patterns import generate_samples
+from app.utils.rule_profile import _adversarial_seeds, _worst_case, profile_pattern, profile_pattern_isolated
+from app.utils.security import create_access_token
+from .utils import create_test_user
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="function")
+def test_session():
+    with Session(engine) as session:
+        yield session
+        session.rollback()
+
+
+@pytest.fixture(scope="function")
+def override_dependency(test_session):
+    def get_test_db():
+        yield test_session
+
+    app.dependency_overrides[get_db] = get_test_db
+    yield
+    app.dependency_overrides.clear()
+
+
+def test_profile_fixed_width_pattern():
+    profile = profile_pattern(r"^[A-Z]{2}\d{6}$")
+    assert profile["engine"] == "numpy"
+    assert profile["backtracking_risk"] is False
+    assert profile["throughput"]["matching"] > 0
+    assert profile["throughput"]["non_matching"] > 0
+    assert profile["worst_case"]["exponential"] is False
+    assert profile["inputs"]["matching"] > 0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeMatcher:
+    """按取值长度推进假时钟的匹配器，cost(长度, 第几次调用) 返回毫秒"""
+
+    def __init__(self, engine, cost, clock):
+        self.engine = engine
+        self.cost = cost
+        self.clock = clock
+        self.calls = 0
+
+    def match(self, values):
+        self.calls += 1
+        self.clock.now += self.cost(len(values[0]), self.calls) / 1000
+        return [False]
+
+
+SEEDS = [("", "a", "!")]
+
+
+def test_worst_case_flags_sustained_exponential_growth():
+    clock = FakeClock()
+    matcher = FakeMatcher("re", lambda n, call: 0.001 * 2 ** n, clock)
+    worst = _worst_case(matcher, SEEDS, timer=clock)
+    assert worst["exponential"] is True
+    # 8、12 之后在 16 处连续两级增长 16 倍即停止加长
+    assert worst["length"] == 17
+    assert worst["input"] == "a" * 16 + "!"
+
+
+def test_worst_case_ignores_timing_noise():
+    clock = FakeClock()
+    # 线性耗时，长度 12 的第一次测量偶发 50ms 抖动：中位数排除
+    spiky = FakeMatcher("re", lambda n, call: 50 if call == 4 else 0.01 * n, clock)
+    assert _worst_case(spiky, SEEDS, timer=clock)["exponential"] is False
+
+    # 只有一级跳变（如缓存失效）不算指数增长
+    step = FakeMatcher("re", lambda n, call: 0.01 if n < 20 else 5, clock)
+    assert _worst_case(step, SEEDS, timer=clock)["exponential"] is False
+
+
+def test_worst_case_never_exponential_for_fixed_width():
+    clock = FakeClock()
+    matcher = FakeMatcher("numpy", lambda n, call: 0.001 * 2 ** min(n, 20), clock)
+    assert _worst_case(matcher, SEEDS, timer=clock)["exponential"] is False
+
+
+def test_worst_case_measures_re2_like_re():
+    clock = FakeClock()
+    matcher = FakeMatcher("re2", lambda n, call: 0.001 * 2 ** n, clock)
+    assert _worst_case(matcher, SEEDS, timer=clock)["exponential"] is True
+
+
+def test_adversarial_seeds_fall_back_to_non_ascii_suffix():
+    matcher = ColumnMatcher(r"^[^é]+$")
+    seeds = _adversarial_seeds(generate_samples(r"^[^é]+$", 20, seed=0), matcher)
+    assert seeds and all(suffix == "é" for _, _, suffix in seeds)
+
+
+def test_profile_skips_non_matching_after_exponential(monkeypatch):
+    monkeypatch.setattr(rule_profile, "_worst_case", lambda matcher, seeds, timer: {
+        "ms": 150.0, "length": 17, "input": "a" * 16 + "!", "exponential": True
+    })
+    profile = profile_pattern(r"^(a+)+$", engine="re")
+    assert profile["backtracking_risk"] is True
+    assert profile["worst_case"]["exponential"] is True
+    assert profile["throughput"]["non_matching"] is None
+
+
+@pytest.mark.skipif(regex_engine.re2 is None, reason="google-re2 not installed")
+def test_profile_re2_bounds_worst_case():
+    profile = profile_pattern(r"^(a+)+$", engine="re2")
+    assert profile["engine"] == "re2"
+    assert profile["worst_case"]["exponential"] is False
+    assert profile["worst_case"]["ms"] < settings.SUBMISSION_PROFILE_WORST_CASE_MS
+
+
+def test_profile_isolated_invalid_pattern():
+    assert "error" in profile_pattern_isolated("(unclosed")
+
+
+def test_profile_isolated_timeout(monkeypatch):
+    monkeypatch.setattr(settings, "SUBMISSION_PROFILE_TIMEOUT_SECONDS", 0.01)
+    profile = profile_pattern_isolated(r"^\d{3}$")
+    assert profile["timed_out"] is True
+
+
+def test_submission_profile_shown_in_pending(override_dependency, test_session, monkeypatch):
+    from app.tasks import overlap_report_task, profile_submission_task
+
+    queued = []
+    monkeypatch.setattr(settings, "SUBMISSION_PROFILING", True)
+    monkeypatch.setattr(overlap_report_task, "apply_async", lambda args, **kwargs: None)
+    monkeypatch.setattr(profile_submission_task, "apply_async", lambda args, **kwargs: queued.append(args))
+
+    user = create_test_user(test_session, email="profiled@test.com")
+    token = create_access_token({"sub": user.email})
+    response = client.post(
+        "/submissions/",
+        data={"pattern": r"^PRF\d{4}$", "description": "Profiled", "data_type": "Lot", "region": "EMA"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200, response.text
+    submission_id = response.json()["id"]
+    assert queued == [(submission_id,)]
+
+    result = profile_submission_task.run(submission_id)
+    assert result["submission_id"] == submission_id
+
+    admin = create_test_user(test_session, email="profile-admin@test.com", is_admin=True)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': admin.email})}"}
+    response = client.get("/admin/submissions/pending", headers=headers)
+    assert response.status_code == 200, response.text
+    item = next(s for s in response.json() if s["id"] == submission_id)
+    assert item["perf_profile"]["engine"] == "numpy"
+    assert item["perf_profile"]["throughput"]["matching"] > 0
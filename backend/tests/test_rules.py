@@ -4,7 +4,12 @@ from app.main import app
 from app.database import engine, get_db
 from app.models import Rule
 from .utils import create_test_user, create_test_token
+from app.utils.security import create_access_token
+from app.utils.metrics import observe_validation
 import pytest
+import json
+import csv
+import io
 
 
 client = TestClient(app)
@@ -71,3 +76,185 @@ def test_create_rule(override_dependency, test_session):
     db_rule = test_session.exec(statement).first()
     assert db_rule is not None
     assert db_rule.pattern == rule_data["pattern"]
+
+
+def test_rules_conditional_get(override_dependency, test_session):
+    response = client.get("/rules/")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    cached = client.get("/rules/", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    rule_data = {
+        "pattern": r"^\d{6}$",
+        "description": "ETag test rule",
+        "data_type": "Site ID",
+        "region": "FDA"
+    }
+    created = client.post("/rules/", json=rule_data).json()
+
+    # 规则变更后目录版本递增，旧 ETag 失效
+    response = client.get("/rules/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert created["id"] in [r["id"] for r in response.json()]
+
+    detail = client.get(f"/rules/{created['id']}")
+    assert detail.status_code == 200
+    assert client.get(
+        f"/rules/{created['id']}", headers={"If-None-Match": detail.headers["ETag"]}
+    ).status_code == 304
+
+
+def test_related_rules_by_pattern_equivalence(override_dependency, test_session):
+    first = client.post("/rules/", json={
+        "pattern": r"^\d{4}-\d{2}$", "description": "Year-month", "data_type": "Visit Month", "region": "FDA"
+    }).json()
+    second = client.post("/rules/", json={
+        "pattern": r"[\d]{4}-(\d\d)", "description": "Year-month (EMA)", "data_type": "Month", "region": "EMA"
+    }).json()
+
+    response = client.get(f"/rules/{first['id']}/related", params={"kind": "pattern"})
+    assert response.status_code == 200
+    assert {r["id"] for r in response.json()} == {first["id"], second["id"]}
+
+    # 修改模式后增量更新分组
+    client.put(f"/rules/{second['id']}", json={"pattern": r"^\d{6}$"})
+    related = client.get(f"/rules/{first['id']}/related", params={"kind": "pattern"}).json()
+    assert [r["id"] for r in related] == [first["id"]]
+
+    # \d 为 Unicode 语义，不能切换到 re2
+    assert client.put(f"/rules/{second['id']}", json={"engine": "re2"}).status_code == 422
+
+    related = client.get(f"/rules/{second['id']}/related", params={"kind": "region"}).json()
+    assert all(r["region"] == "EMA" for r in related)
+
+    assert client.delete(f"/rules/{first['id']}").status_code == 200
+    assert client.get(f"/rules/{first['id']}/related").status_code == 404
+
+
+def test_pattern_fingerprint_keeps_inline_flags():
+    from app.utils.patterns import pattern_fingerprint
+
+    assert pattern_fingerprint(r"^\d{4}$") == pattern_fingerprint(r"[\d]\d{3}")
+    # Unicode 语义下 \d 还匹配其他数字（如 '١٢٣٤'），只在 re.ASCII 下与 [0-9] 等价
+    assert pattern_fingerprint(r"^\d{4}$") != pattern_fingerprint(r"[0-9]{4}")
+    assert pattern_fingerprint(r"\w+") != pattern_fingerprint(r"[0-9A-Za-z_]+")
+    assert pattern_fingerprint(r"(?a)\d{4}") == pattern_fingerprint(r"(?a)[0-9]{4}")
+    assert pattern_fingerprint(r"[^\d]") == pattern_fingerprint(r"\D")
+    assert pattern_fingerprint("(?i)abc") == pattern_fingerprint("(?i)^abc$")
+    for flagged, plain in [("(?i)abc", "abc"), ("(?s).", "."), ("(?x)a b", "ab"), ("(?i:ab)c", "abc"), ("(?i:a)b", "(?i)ab")]:
+        assert pattern_fingerprint(flagged) != pattern_fingerprint(plain), flagged
+
+
+def test_bulk_import_and_export(override_dependency, test_session):
+    admin_user = create_test_user(test_session, email="import@test.com", is_admin=True)
+    token = create_access_token({"sub": admin_user.email})
+    lines = [
+        json.dumps({"pattern": r"^IMP\d{3}$", "description": "Import A", "data_type": "Lot", "region": "FDA"}),
+        json.dumps({"pattern": r"^IMP[A-Z]{2}$", "description": "Import B", "data_type": "Lot", "region": "EMA"}),
+        json.dumps({"pattern": "", "description": "Empty pattern", "data_type": "Lot", "region": "FDA"}),
+        "{not json",
+    ]
+    response = client.post(
+        "/rules/import",
+        files={"file": ("rules.jsonl", "\n".join(lines).encode(), "application/x-ndjson")},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["imported"] == 2
+    assert [e["row"] for e in report["errors"]] == [3, 4]
+
+    exported = client.get("/rules/export", params={"format": "csv"})
+    assert exported.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(exported.text)))
+    assert {r"^IMP\d{3}$", r"^IMP[A-Z]{2}$"} <= {row["pattern"] for row in rows}
+
+    exported = client.get("/rules/export")
+    records = [json.loads(line) for line in exported.text.splitlines()]
+    assert any(r["description"] == "Import A" for r in records)
+
+
+def test_csv_import_round_trip(override_dependency, test_session, monkeypatch):
+    from app.routers import rules as rules_router
+
+    # 每行一批，覆盖边读边写的多批路径
+    monkeypatch.setattr(rules_router, "IMPORT_BATCH_SIZE", 1)
+    admin_user = create_test_user(test_session, email="csv-import@test.com", is_admin=True)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': admin_user.email})}"}
+    source = [
+        {"pattern": r"^CSV\d{3}$", "description": "CSV, with comma", "data_type": "Lot", "region": "FDA", "engine": "re"},
+        {"pattern": r"^CSV[A-Z]{2}$", "description": "CSV \"quoted\"", "data_type": "Lot", "region": "EMA"},
+    ]
+    for rule in source:
+        assert client.post("/rules/", json=rule).status_code == 201
+
+    exported = client.get("/rules/export", params={"format": "csv"}).text
+    rows = [row for row in csv.DictReader(io.StringIO(exported)) if row["pattern"].startswith("^CSV")]
+    assert len(rows) == 2
+    body = io.StringIO()
+    writer = csv.DictWriter(body, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+
+    response = client.post(
+        "/rules/import",
+        files={"file": ("rules.csv", body.getvalue().encode(), "text/csv")},
+        headers=headers
+    )
+    assert response.status_code == 200, response.text
+    assert response.json() == {"received": 2, "imported": 2, "failed": 0, "errors": []}
+
+    imported = test_session.exec(select(Rule).where(Rule.pattern.in_([r["pattern"] for r in source]))).all()
+    fields = ("pattern", "description", "data_type", "region", "engine", "reference_url")
+    expected = {(r["pattern"], r["description"], r["data_type"], r["region"], r.get("engine", "auto"), None) for r in source}
+    assert {tuple(getattr(rule, f) for f in fields) for rule in imported} == expected
+    assert len(imported) == 4
+
+
+def test_metrics_endpoint(override_dependency, test_session):
+    client.get("/rules/")
+    client.get("/rules/999999")
+    observe_validation("inline", "re", 3, 0.01, rule_id=1)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    assert 'bioregex_http_request_duration_seconds_count{method="GET",route="/rules/",status="200"}' in body
+    # 按路由模板而非实际路径打标签
+    assert 'route="/rules/{rule_id}",status="404"' in body
+    assert 'bioregex_db_pool_connections{engine="sync",state="checkedout"}' in body
+    assert "bioregex_celery_queue_depth" in body
+    # 规则耗时直方图不按 rule_id 打标签，避免基数随规则数增长
+    assert 'bioregex_rule_match_seconds_count{engine="re",mode="inline"}' in body
+    assert "rule_id=" not in body
+
+
+def test_export_compression_negotiation(override_dependency, test_session):
+    # 保证导出内容超过压缩阈值（1024 字节）
+    for i in range(20):
+        rule = {"pattern": rf"^GZ{i:02d}\d{{4}}$", "description": f"Compression test rule {i} " + "x" * 60,
+                "data_type": "Lot", "region": "FDA"}
+        assert client.post("/rules/", json=rule).status_code == 201
+
+    response = client.get("/rules/export?format=jsonl", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.content) >= 1024
+    # httpx 自动解压，内容仍是逐行 JSON
+    for line in response.text.splitlines():
+        json.loads(line)
+
+    response = client.get("/rules/export?format=jsonl", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+
+def test_choose_encoding():
+    from app.utils.compression import brotli, choose_encoding
+
+    assert choose_encoding("gzip;q=1.0, br;q=0") == "gzip"
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip, br") == ("br" if brotli is not None else "gzip")
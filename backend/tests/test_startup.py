@@ -0,0 +1,42 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# 冷启动导入预算（秒），慢速 CI 机器可通过环境变量放宽
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "2.0"))
+
+# 只应在对应功能首次使用时加载的重依赖
+HEAVY_MODULES = ("pandas", "pyreadstat", "lxml", "magic", "celery.result")
+
+
+def import_in_subprocess(module: str) -> dict:
+    """在全新解释器中导入模块，返回耗时与已加载的重依赖"""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules],"
+        " 'api_loaded': 'app.main' in sys.modules}))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=os.environ.copy(),
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_api_import_is_lazy_and_within_budget():
+    result = import_in_subprocess("app.main")
+    assert result["loaded"] == []
+    assert result["seconds"] < STARTUP_BUDGET_SECONDS
+
+
+def test_worker_import_does_not_build_api():
+    result = import_in_subprocess("app.tasks")
+    assert result["loaded"] == []
+    assert not result["api_loaded"]
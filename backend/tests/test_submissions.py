@@ -0,0 +1,106 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from sqlalchemy import event
+from datetime import datetime, timedelta
+from app.main import app
+from app.database import engine, get_db
+from app.models import RuleSubmission
+from app.utils.security import create_access_token
+from .utils import create_test_user
+import pytest
+
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="function")
+def test_session():
+    with Session(engine) as session:
+        yield session
+        session.rollback()
+
+
+@pytest.fixture(scope="function")
+def override_dependency(test_session):
+    def get_test_db():
+        yield test_session
+
+    app.dependency_overrides[get_db] = get_test_db
+    yield
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def query_counter():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_list_submissions_without_n_plus_one(override_dependency, test_session, query_counter):
+    reviewer = create_test_user(test_session, email="reviewer@test.com", is_admin=True)
+    base = datetime(2026, 1, 1)
+    for i in range(6):
+        submitter = create_test_user(test_session, email=f"paged{i}@test.com")
+        test_session.add(RuleSubmission(
+            pattern=rf"^PG{i}\d{{3}}$",
+            description=f"Paged submission {i}",
+            data_type="Page",
+            region="FDA",
+            status="paged",
+            submitted_at=base + timedelta(minutes=i // 2),  # 相同时间戳靠 id 区分
+            submitted_by_id=submitter.id,
+            reviewed_by_id=reviewer.id
+        ))
+    test_session.commit()
+    test_session.expunge_all()
+
+    query_counter.clear()
+    response = client.get("/submissions/", params={"status": "paged", "limit": 4})
+    assert response.status_code == 200, response.text
+    # 一条列表查询 + 提交人、审核人各一条预加载查询，与行数无关
+    assert len(query_counter) <= 3, query_counter
+
+    first_page = response.json()
+    assert len(first_page) == 4
+    assert all(item["reviewed_by"]["email"] == "reviewer@test.com" for item in first_page)
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get("/submissions/", params={"status": "paged", "limit": 4, "cursor": cursor})
+    second_page = response.json()
+    assert len(second_page) == 2
+    assert "X-Next-Cursor" not in response.headers
+
+    descriptions = [item["description"] for item in first_page + second_page]
+    assert descriptions == [f"Paged submission {i}" for i in reversed(range(6))]
+
+    assert client.get("/submissions/", params={"cursor": "bogus"}).status_code == 400
+
+
+def test_create_submission_async_session(override_dependency, test_session, monkeypatch):
+    from app.tasks import overlap_report_task
+
+    queued = []
+    monkeypatch.setattr(overlap_report_task, "apply_async", lambda args, **kwargs: queued.append(args))
+    user = create_test_user(test_session, email="async@test.com")
+    token = create_access_token({"sub": user.email})
+    response = client.post(
+        "/submissions/",
+        data={"pattern": r"^ASY\d{4}$", "description": "Async", "data_type": "Lot", "region": "EMA"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["status"] == "pending"
+    assert body["submitted_by"]["email"] == "async@test.com"
+    assert queued == [(body["id"],)]
+
+    health = client.get("/health").json()
+    assert health["status"] == "healthy"
+    assert "checkedout" in health["pool"]["sync"]
+    assert "async" in health["pool"]
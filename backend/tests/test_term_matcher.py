@@ -0,0 +1,56 @@
+import csv
+
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.utils.term_matcher import TermMatcher
+
+
+client = TestClient(app)
+
+
+def test_trie_matcher_semantics():
+    matcher = TermMatcher([
+        ("Acute Care", "cms"),
+        ("Acute Care Hospitals", "cms"),
+        ("Theft", "hipaa"),
+        ("C++", "misc"),
+        ("Adjupanrix (H5N1)", "ema"),
+        ("theft", "other"),
+    ])
+    assert len(matcher) == 5
+    found = [(m.term, m.start, m.end) for m in matcher.find("THEFT at acute   care hospitals; C++ and adjupanrix (h5n1)")]
+    assert found == [
+        ("theft", 0, 5),
+        # 同一位置取最长术语，术语内空白可匹配任意长度空白
+        ("acute care hospitals", 9, 31),
+        ("c++", 33, 36),
+        ("adjupanrix (h5n1)", 41, 58),
+    ]
+    # 单词边界
+    assert matcher.find("thefts, acutecare") == []
+    assert matcher.labels["theft"] == [("hipaa", "Theft"), ("other", "theft")]
+
+
+def test_tag_terms_endpoint(tmp_path, monkeypatch):
+    with open(tmp_path / "nodes.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "label", "source", "regex"])
+        writer.writerow(["fda:NAPROXEN", "NAPROXEN", "fda_drug_names", ""])
+        writer.writerow(["fda:IBUPROFEN", "IBUPROFEN", "fda_drug_names", ""])
+        writer.writerow(["cms:Acute Care", "Acute Care", "cms_hospital_names", ""])
+    monkeypatch.setattr(settings, "KG_DIR", tmp_path)
+
+    body = "aeterm\nrash after naproxen\nibuprofen and Naproxen\n\nheadache\nacute care visit\n"
+    response = client.post(
+        "/validate/terms",
+        data={"sources": "fda_drug_names"},
+        files={"file": ("ae.csv", body.encode(), "text/csv")},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["column"] == "aeterm"
+    assert data["tagged_rows"] == 2
+    assert {t["term"]: t["count"] for t in data["terms"]} == {"naproxen": 2, "ibuprofen": 1}
+    assert data["samples"][1] == {"row": 1, "value": "ibuprofen and Naproxen", "terms": ["ibuprofen", "naproxen"]}
@@ -0,0 +1,367 @@
+from fastapi.testclient import TestClient
+from kombu import serialization
+from sqlmodel import Session
+from app.main import app
+from app.config import settings
+from app.database import engine
+from app.models import Rule
+from app.tasks import validate_data_task, validate_upload_task
+from app.routers import validation
+from app.utils import admission
+from celery_app import celery
+import asyncio
+import pytest
+
+
+client = TestClient(app)
+
+
+def test_task_payloads_use_compact_serializer():
+    assert validate_data_task.app is celery
+    assert celery.conf.task_serializer == "msgpack"
+    assert celery.conf.result_serializer == "msgpack"
+    assert celery.conf.result_expires > 0
+
+    result = {
+        "passed": False,
+        "invalid_count": 2,
+        "invalid_samples": [{"subjid": f"XX{i:05d}", "value": None} for i in range(10)],
+    }
+    _, _, msgpack_body = serialization.dumps(result, serializer="msgpack")
+    _, _, json_body = serialization.dumps(result, serializer="json")
+    assert len(msgpack_body) < len(json_body)
+    assert serialization.loads(msgpack_body, "application/x-msgpack", "binary", accept={"application/x-msgpack"}) == result
+
+
+class FakeResult:
+    forgotten = []
+
+    def __init__(self, task_id, ready=True):
+        self.task_id = task_id
+        self._ready = ready
+
+    def ready(self):
+        return self._ready
+
+    def get(self, propagate=True):
+        return {"passed": True, "invalid_count": 0, "invalid_samples": []}
+
+    def forget(self):
+        FakeResult.forgotten.append(self.task_id)
+
+
+def test_result_is_forgotten_after_fetch(monkeypatch):
+    monkeypatch.setattr(validate_data_task, "AsyncResult", lambda task_id: FakeResult(task_id))
+    response = client.get("/validate/result/abc")
+    assert response.json()["status"] == "completed"
+    assert FakeResult.forgotten == ["abc"]
+
+    monkeypatch.setattr(validate_data_task, "AsyncResult", lambda task_id: FakeResult(task_id, ready=False))
+    assert client.get("/validate/result/def").json() == {"status": "pending"}
+    assert FakeResult.forgotten == ["abc"]
+
+
+class FakeRedis:
+    """只实现准入控制用到的命令"""
+
+    def __init__(self):
+        self.values = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+    def decr(self, key):
+        self.values[key] = self.values.get(key, 0) - 1
+        return self.values[key]
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def incr(self, key):
+        self.commands.append(lambda: self.client.incr(key))
+
+    def expire(self, key, seconds):
+        self.commands.append(lambda: True)
+
+    def execute(self):
+        return [command() for command in self.commands]
+
+
+class FakeAsyncResult:
+    def __init__(self, id):
+        self.id = id
+
+
+@pytest.fixture
+def queued_validation(monkeypatch, tmp_path):
+    """把 inline 阈值调低，使小文件也走队列，并替换掉 Redis 与任务投递；bulk 通道的文件暂存到临时目录"""
+    with Session(engine) as session:
+        rule = Rule(pattern=r"[A-Z]{2}\d{3}", description="queue test", data_type="identifier", region="FDA")
+        session.add(rule)
+        session.commit()
+        session.refresh(rule)
+
+    redis = FakeRedis()
+    depths = {admission.INTERACTIVE_QUEUE: 0, admission.BULK_QUEUE: 0}
+    sent = []
+    monkeypatch.setattr(settings, "VALIDATION_INLINE_MAX_ROWS", 2)
+    monkeypatch.setattr(settings, "VALIDATION_BULK_MIN_ROWS", 5)
+    monkeypatch.setattr(settings, "VALIDATION_MAX_INFLIGHT_PER_USER", 2)
+    monkeypatch.setattr(admission, "get_redis", lambda: redis)
+    monkeypatch.setattr(admission, "queue_depths", lambda queues: {q: depths[q] for q in queues})
+    monkeypatch.setattr(settings, "UPLOAD_DIR", tmp_path)
+    for task in (validate_data_task, validate_upload_task):
+        monkeypatch.setattr(
+            task, "apply_async",
+            lambda args, kwargs, queue: sent.append((kwargs["owner"], queue, args)) or FakeAsyncResult(f"task-{len(sent)}")
+        )
+    yield rule, redis, depths, sent
+
+    with Session(engine) as session:
+        session.delete(session.get(Rule, rule.id))
+        session.commit()
+
+
+def upload(rule_id, rows):
+    body = "subjid\n" + "".join(f"AB{i:03d}\n" for i in range(rows))
+    return client.post(
+        "/validate/",
+        data={"rule_id": rule_id},
+        files={"file": ("data.csv", body.encode(), "text/csv")},
+    )
+
+
+def test_validation_lanes_and_admission(queued_validation):
+    rule, redis, depths, sent = queued_validation
+
+    assert upload(rule.id, 3).json()["queue"] == admission.INTERACTIVE_QUEUE
+    assert upload(rule.id, 6).json()["queue"] == admission.BULK_QUEUE
+    assert [queue for _, queue, _ in sent] == [admission.INTERACTIVE_QUEUE, admission.BULK_QUEUE]
+    # bulk 通道只投递暂存文件的路径，不携带整表数据
+    job_id, path, name, pattern = sent[1][2]
+    assert name == "data.csv" and open(path).read().count("\n") == 7
+
+    # 每用户在途上限
+    response = upload(rule.id, 3)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == str(settings.VALIDATION_RETRY_AFTER_SECONDS)
+
+    # 任务结束归还名额后可再次提交
+    owner = sent[0][0]
+    admission.release_validation(owner)
+    assert upload(rule.id, 3).status_code == 200
+
+    # 队列积压超限
+    admission.release_validation(owner)
+    depths[admission.INTERACTIVE_QUEUE] = settings.VALIDATION_MAX_QUEUE_DEPTH
+    response = upload(rule.id, 3)
+    assert response.status_code == 429
+    assert "queue is full" in response.json()["detail"]
+    assert redis.values[admission.INFLIGHT_KEY.format(owner=owner)] == 1
+
+
+def test_large_upload_is_staged_without_parsing(queued_validation, monkeypatch):
+    rule, redis, depths, sent = queued_validation
+    monkeypatch.setattr(settings, "VALIDATION_BULK_MIN_BYTES", 10)
+
+    async def parse_file(file):
+        raise AssertionError("large uploads must not be parsed in the API")
+
+    admitted_on_loop = []
+
+    def admit_validation(owner, queue):
+        try:
+            asyncio.get_running_loop()
+            admitted_on_loop.append(True)
+        except RuntimeError:
+            admitted_on_loop.append(False)
+        return admission.admit_validation(owner, queue)
+
+    monkeypatch.setattr(validation, "parse_file", parse_file)
+    monkeypatch.setattr(validation, "admit_validation", admit_validation)
+    response = upload(rule.id, 3)
+    assert response.status_code == 200, response.text
+    assert response.json()["queue"] == admission.BULK_QUEUE
+    # Redis 访问在线程池中执行，不阻塞事件循环
+    assert admitted_on_loop == [False]
+
+    job_id, path, name, pattern = sent[0][2]
+    owner = sent[0][0]
+    kwargs = {"rule_id": rule.id, "owner": owner, "engine": rule.engine}
+    result = validate_upload_task.run(job_id, path, name, pattern, **kwargs)
+    assert result == {"passed": True, "invalid_count": 0, "invalid_samples": [], "rows": 3}
+    # 暂存目录删除，在途名额归还
+    assert not (settings.UPLOAD_DIR / "batches" / job_id).exists()
+    assert admission.INFLIGHT_KEY.format(owner=owner) not in redis.values
+
+
+@pytest.fixture
+def streaming_rule():
+    with Session(engine) as session:
+        rule = Rule(pattern=r"[A-Z]{2}\d{3}", description="streaming test", data_type="identifier", region="FDA")
+        session.add(rule)
+        session.commit()
+        session.refresh(rule)
+    yield rule
+    with Session(engine) as session:
+        session.delete(session.get(Rule, rule.id))
+        session.commit()
+
+
+def upload_rows(rule_id, rows, **data):
+    body = "Site ID,SUBJID\n" + "".join(f"{site},{value}\n" for site, value in rows)
+    return client.post(
+        "/validate/",
+        data={"rule_id": rule_id, **data},
+        files={"file": ("data.csv", body.encode(), "text/csv")},
+    )
+
+
+def test_fail_fast_stops_at_first_violations(streaming_rule, monkeypatch):
+    monkeypatch.setattr(settings, "VALIDATION_STREAM_CHUNK_ROWS", 10)
+    rows = [("S1", f"AB{i:03d}") for i in range(100)]
+    rows[15] = ("S1", "bad")
+    rows[17] = ("S1", "007")
+    rows[80] = ("S1", "late")
+
+    body = upload_rows(streaming_rule.id, rows, mode="fail_fast", column="subjid", max_violations=2).json()
+    assert body["passed"] is False
+    assert body["complete"] is False
+    assert body["rows_checked"] == 20
+    # 按原始文本校验，前导零不会因类型推断丢失
+    assert body["invalid_samples"] == [{"row": 15, "value": "bad"}, {"row": 17, "value": "007"}]
+
+    clean = upload_rows(streaming_rule.id, rows[:15], mode="fail_fast", column="subjid").json()
+    assert clean["passed"] is True
+    assert clean["complete"] is True
+    assert clean["rows_checked"] == 15
+
+    # 未指定列时与完整校验一样取首列
+    first = upload_rows(streaming_rule.id, rows[:15], mode="fail_fast").json()
+    assert first["column"] == "site_id"
+    assert first["invalid_samples"] == [{"row": 0, "value": "S1"}]
+
+
+def test_sample_estimates_invalid_rate(streaming_rule, monkeypatch):
+    monkeypatch.setattr(settings, "VALIDATION_STREAM_CHUNK_ROWS", 500)
+    # 每 10 行一个不合格值，真实不合格率 10%
+    rows = [("S1", "bad" if i % 10 == 0 else f"AB{i % 1000:03d}") for i in range(5000)]
+
+    body = upload_rows(streaming_rule.id, rows, mode="sample", column="subjid", sample_size=400, seed=7).json()
+    assert body["strategy"] == "random"
+    assert body["rows"] == 5000
+    assert body["sample_size"] == 400
+    low, high = body["interval"]
+    assert low < 0.1 < high
+    assert low <= body["estimated_invalid_rate"] <= high
+    assert all(sample["value"] == "bad" for sample in body["invalid_samples"])
+
+    # 样本量不小于行数时即全量校验，区间退化为点
+    exact = upload_rows(streaming_rule.id, rows[:100], mode="sample", column="subjid", sample_size=200).json()
+    assert exact["estimated_invalid_rate"] == 0.1
+    assert exact["interval"] == [0.1, 0.1]
+
+
+def test_stratified_sample_covers_every_stratum(streaming_rule, monkeypatch):
+    monkeypatch.setattr(settings, "VALIDATION_STREAM_CHUNK_ROWS", 300)
+    # 小中心 S9 全部不合格，简单随机抽样很可能抽不到
+    rows = [("S1", f"AB{i % 1000:03d}") for i in range(3000)] + [("S9", "bad") for _ in range(5)]
+
+    body = upload_rows(
+        streaming_rule.id, rows, mode="sample", column="subjid", strata_column="site_id", sample_size=100, seed=1
+    ).json()
+    assert body["strategy"] == "stratified"
+    strata = {s["stratum"]: s for s in body["strata"]}
+    assert strata["S1"] == {"stratum": "S1", "rows": 3000, "sampled": 100, "invalid": 0}
+    assert strata["S9"]["sampled"] == 1 and strata["S9"]["invalid"] == 1
+    assert body["estimated_invalid_rate"] == pytest.approx(5 / 3005)
+
+
+def test_streaming_mode_errors(streaming_rule):
+    rows = [("S1", "AB001")]
+    assert upload_rows(streaming_rule.id, rows, mode="everything").status_code == 400
+    response = upload_rows(streaming_rule.id, rows, mode="fail_fast", column="missing")
+    assert response.status_code == 400
+    assert "missing" in response.json()["detail"]
+    response = upload_rows(streaming_rule.id, rows, mode="sample", sample_size=settings.VALIDATION_SAMPLE_MAX_SIZE + 1)
+    assert response.status_code == 400
+
+
+def test_wilson_interval_without_violations():
+    from app.utils.sampling import estimate_rate, wilson_interval
+
+    low, high = wilson_interval(0.0, 1000)
+    assert low == pytest.approx(0.0)
+    assert 0.003 < high < 0.004
+    # 有限总体校正：抽样比例越高区间越窄
+    assert estimate_rate([(2000, 1000, 0)])["interval"][1] < high
+    assert estimate_rate([(1000, 1000, 0)])["interval"] == [0.0, 0.0]
+
+
+def test_inline_samples_are_json_safe(streaming_rule, monkeypatch):
+    import numpy as np
+    import pandas as pd
+    from app.routers import validation
+
+    df = pd.DataFrame({
+        "subjid": ["AB001", "bad", "x"],
+        "visit": pd.to_datetime(["2024-01-01 00:00", "2024-02-03 10:30", None]),
+        "dose": np.array([1.5, 2.0, np.nan]),
+        "count": np.array([1, 2, 3], dtype=np.int64),
+    })
+
+    async def fake_parse(file):
+        return df
+
+    # SAS / Excel 解析出的日期为 Timestamp
+    monkeypatch.setattr(validation, "parse_file", fake_parse)
+    response = upload_rows(streaming_rule.id, [])
+    assert response.status_code == 200, response.text
+    assert response.json()["invalid_samples"] == [
+        {"subjid": "bad", "visit": "2024-02-03T10:30:00", "dose": 2.0, "count": 2},
+        {"subjid": "x", "visit": None, "dose": None, "count": 3},
+    ]
+
+
+def test_streaming_samples_are_native_values():
+    import numpy as np
+    import orjson
+    import pandas as pd
+    from app.utils.matching import ColumnMatcher
+    from app.utils.sampling import validate_fail_fast, validate_sample
+
+    # SAS / Excel 分块读出的是 numpy 数值与 Timestamp，而非原始文本
+    chunk = pd.DataFrame({
+        "visit": pd.to_datetime(["2024-01-01 00:00", "2024-02-03 10:30", None]),
+        "dose": np.array([1.5, 2.0, np.nan]),
+    })
+    matcher = ColumnMatcher(r"AB\d{3}")
+
+    result, _, _ = validate_fail_fast(iter([chunk]), matcher, "visit", max_violations=3)
+    assert result["invalid_samples"] == [
+        {"row": 0, "value": "2024-01-01T00:00:00"},
+        {"row": 1, "value": "2024-02-03T10:30:00"},
+        {"row": 2, "value": None},
+    ]
+    orjson.dumps(result)
+
+    result, _, _ = validate_sample(iter([chunk]), matcher, "dose", size=10, seed=0)
+    assert [sample["value"] for sample in result["invalid_samples"]] == [1.5, 2.0, None]
+    assert all(type(sample["value"]) in (float, type(None)) for sample in result["invalid_samples"])
+    orjson.dumps(result)
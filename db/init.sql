@@ -15,8 +15,13 @@ CREATE TABLE IF NOT EXISTS rule (
     data_type VARCHAR(100) NOT NULL,
     region VARCHAR(50) NOT NULL,
     reference_url TEXT,
+    engine VARCHAR(8) NOT NULL DEFAULT 'auto',
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
+-- 已有数据库补充匹配引擎列
+ALTER TABLE rule ADD COLUMN IF NOT EXISTS engine VARCHAR(8) NOT NULL DEFAULT 'auto';
+-- 爬虫按来源文档批量查重
+CREATE INDEX IF NOT EXISTS ix_rule_reference_url ON rule (reference_url);
 
 -- 创建规则提交表
 CREATE TABLE IF NOT EXISTS rule_submission (
@@ -32,8 +37,64 @@ CREATE TABLE IF NOT EXISTS rule_submission (
     rule_id INTEGER REFERENCES rule(id),
     submitted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     reviewed_at TIMESTAMP,
-    review_notes TEXT
+    review_notes TEXT,
+    perf_profile JSON,
+    overlap_report JSON
 );
+-- 已有数据库补充性能分析与重叠报告列
+ALTER TABLE rule_submission ADD COLUMN IF NOT EXISTS perf_profile JSON;
+ALTER TABLE rule_submission ADD COLUMN IF NOT EXISTS overlap_report JSON;
+
+CREATE INDEX IF NOT EXISTS ix_rulesubmission_status_submitted_at ON rule_submission (status, submitted_at);
+
+-- 创建规则关联分组索引表
+CREATE TABLE IF NOT EXISTS rulegroupmember (
+    id SERIAL PRIMARY KEY,
+    rule_id INTEGER NOT NULL REFERENCES rule(id),
+    kind VARCHAR(20) NOT NULL,
+    key VARCHAR(255) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_rulegroupmember_rule_id ON rulegroupmember (rule_id);
+CREATE INDEX IF NOT EXISTS ix_rulegroupmember_kind_key ON rulegroupmember (kind, key);
+
+-- 创建规则模式指纹表（查重与重叠检测）
+CREATE TABLE IF NOT EXISTS rulefingerprint (
+    rule_id INTEGER PRIMARY KEY REFERENCES rule(id),
+    fingerprint VARCHAR(40) NOT NULL,
+    min_length INTEGER NOT NULL,
+    max_length INTEGER NOT NULL,
+    prefix VARCHAR(32) NOT NULL DEFAULT '',
+    first_chars INTEGER NOT NULL DEFAULT 63,
+    last_chars INTEGER NOT NULL DEFAULT 63
+);
+-- 已有库补列后需运行 scripts/init_db.py 重建索引，默认值对应“不做筛选”
+ALTER TABLE rulefingerprint ADD COLUMN IF NOT EXISTS prefix VARCHAR(32) NOT NULL DEFAULT '';
+ALTER TABLE rulefingerprint ADD COLUMN IF NOT EXISTS first_chars INTEGER NOT NULL DEFAULT 63;
+ALTER TABLE rulefingerprint ADD COLUMN IF NOT EXISTS last_chars INTEGER NOT NULL DEFAULT 63;
+CREATE INDEX IF NOT EXISTS ix_rulefingerprint_fingerprint ON rulefingerprint (fingerprint);
+CREATE INDEX IF NOT EXISTS ix_rulefingerprint_min_length ON rulefingerprint (min_length);
+CREATE INDEX IF NOT EXISTS ix_rulefingerprint_prefix ON rulefingerprint (prefix);
+
+-- 创建爬虫增量状态表
+CREATE TABLE IF NOT EXISTS crawlstate (
+    url VARCHAR(2000) PRIMARY KEY,
+    source VARCHAR(50) NOT NULL,
+    etag VARCHAR(255),
+    last_modified VARCHAR(64),
+    content_hash VARCHAR(64),
+    last_seen TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_changed TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_crawlstate_source ON crawlstate (source);
+
+-- 创建规则目录版本表（规则缓存失效计数器）
+CREATE TABLE IF NOT EXISTS catalogversion (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO catalogversion (id, version) VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
 
 -- 创建管理员用户
 INSERT INTO "user" (email, full_name, is_admin, hashed_password)